@@ -0,0 +1,320 @@
+"""
+Пакетная обработка папок с видео и изображениями без интерфейса.
+
+    python batch.py flights/ --mode aerial --output results/
+    python batch.py "flights/**/*.mp4" --workers 4 --no-media
+
+Файлы распределяются по пулу процессов, модель загружается один раз на
+процесс. Для каждого файла пишутся размеченное видео/изображение и/или
+детекции (.jsonl или .parquet) в папку --output с сохранением структуры
+подпапок. Итог по каждому файлу дописывается в manifest.jsonl той же папки:
+при повторном запуске уже обработанные файлы (с тем же размером, временем
+изменения и настройками) пропускаются, так что прерванный прогон можно
+просто запустить снова. С --cache детекции кадров запоминаются в кэше на
+диске (detcache.py) – повторная обработка тех же файлов с другими
+настройками вывода не запускает модель.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import config
+from export import DetectionExporter
+from largeimage import open_image, process_large_image
+from models import get_model
+from parallel import init_worker
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".wmv")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".jp2")
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def collect_files(inputs, recursive=True):
+    """
+    Файлы для обработки: папки (с подпапками при recursive), glob-шаблоны и
+    отдельные файлы. Возвращает [(путь, относительный путь в выводе)].
+    """
+    extensions = VIDEO_EXTENSIONS + IMAGE_EXTENSIONS
+    files = []
+    for spec in inputs:
+        if os.path.isdir(spec):
+            root = spec
+            pattern = os.path.join(spec, "**", "*") if recursive else os.path.join(spec, "*")
+            paths = glob.glob(pattern, recursive=recursive)
+        else:
+            paths = glob.glob(spec, recursive=True)
+            # у шаблона корень – общая папка найденных файлов
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) \
+                if paths else ""
+        for path in sorted(paths):
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in extensions:
+                files.append((os.path.abspath(path),
+                              os.path.relpath(os.path.abspath(path), os.path.abspath(root))))
+    # один файл, попавший под несколько шаблонов, обрабатывается один раз
+    seen = set()
+    return [(p, rel) for p, rel in files if not (p in seen or seen.add(p))]
+
+
+class Manifest:
+    """
+    Журнал прогона: одна строка JSON на обработанный файл (последняя запись
+    по пути – актуальная). Файл считается готовым, если он не менялся, был
+    обработан с теми же настройками и все его результаты на месте.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # недописанная строка прерванного прогона
+                        continue
+                    self.entries[entry["source"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path, options):
+        entry = self.entries.get(path)
+        if entry is None or entry.get("status") != "done" or entry.get("options") != options:
+            return False
+        stat = os.stat(path)
+        if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+            return False
+        return all(os.path.exists(p) for p in entry.get("outputs", []))
+
+    def record(self, entry):
+        self.entries[entry["source"]] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # после каждого файла – на диск: прогон могут прервать в любой момент
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _detect_frames(frames, mode, tiled, cascade):
+    from process import detect_batch, detect_frame
+    if tiled or cascade:
+        return [detect_frame(frame, mode, tiled=tiled, cascade=cascade) for frame in frames]
+    return detect_batch(frames, mode)
+
+
+def process_file(path, rel, options):
+    """
+    Обработать один файл в процессе пула. Возвращает запись манифеста
+    (без размера и времени изменения – их добавляет основной процесс).
+    """
+    from process import process_video, draw_detections, detect_frame
+    started = time.perf_counter()
+    mode, media, export_format = options["mode"], options["media"], options["detections"]
+    out_dir = os.path.join(options["output"], os.path.dirname(rel))
+    os.makedirs(out_dir, exist_ok=True)
+    name = os.path.basename(rel)
+    stem = os.path.splitext(name)[0]
+    export_path = os.path.join(out_dir, f"{stem}_detections.{export_format}") \
+        if export_format else None
+    outputs = []
+    found = 0
+
+    def detect(frames):
+        nonlocal found
+        dets = _detect_frames(frames, mode, options["tiled"], options["cascade"])
+        found += sum(len(d) for d in dets)
+        return dets
+
+    if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+        media_path = os.path.join(out_dir, f"processed_{name}")
+        process_video(path, mode, detect=detect, workers=1, export_path=export_path,
+                      output_path=media_path, write_video=media)
+        if media:
+            outputs.append(media_path)
+        kind = "video"
+    else:
+        reader = open_image(path)
+        try:
+            large = reader.width * reader.height >= config.get("batch_large_pixels")
+            frame = None if large else reader.read(0, 0, reader.width, reader.height)
+        finally:
+            reader.close()
+        if large:
+            # ортофотоплан: потоком тайлов, без загрузки снимка целиком
+            # превью – "размеченное изображение" такого снимка
+            detections_path, preview_path, found = process_large_image(
+                path, out_dir, mode=mode, export_format=export_format, write_preview=media)
+            outputs += [p for p in (detections_path, preview_path) if p]
+            export_path = None
+        else:
+            dets = detect_frame(frame, mode, tiled=options["tiled"], frame_index=0,
+                                cascade=options["cascade"])
+            found = len(dets)
+            if media:
+                media_path = os.path.join(out_dir, f"processed_{name}")
+                color = (0, 0, 255) if mode == "aerial" else (255, 0, 0)
+                if not cv2.imwrite(media_path, draw_detections(frame, dets, color)):
+                    raise ValueError(f"Не удалось записать {media_path}")
+                outputs.append(media_path)
+            if export_path:
+                with DetectionExporter(export_path) as exporter:
+                    exporter.write(dets)
+        kind = "image"
+    if export_path:
+        outputs.append(export_path)
+    return {"source": path, "kind": kind, "status": "done", "outputs": outputs,
+            "found": found, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def _init_batch_worker(threads, mode):
+    init_worker(threads)
+    # модель – один раз на процесс, до первого файла
+    try:
+        get_model("aerial" if mode == "aerial" else "normal")
+    except Exception:
+        # упавший инициализатор ломает весь пул; ошибка загрузки повторится
+        # на первом файле и попадёт в манифест с понятным текстом
+        pass
+
+
+def run_batch(inputs, output, mode="normal", workers=None, media=True, detections="jsonl",
+              tiled=False, cascade=False, recursive=True, retry_failed=True, on_result=None):
+    """
+    Обработать все файлы из inputs (папки, шаблоны, файлы) в пуле процессов.
+
+    :param output: Папка результатов, в ней же manifest.jsonl.
+    :param workers: Процессов (по умолчанию batch_workers); 1 – в текущем процессе.
+    :param media: Писать размеченные видео/изображения.
+    :param detections: Формат файлов детекций ("jsonl", "parquet") или None.
+    :param retry_failed: Повторять файлы, завершившиеся ошибкой в прошлый раз.
+    :param on_result: Колбэк (entry, done, total) после каждого файла.
+    :return: Словарь счётчиков: done, failed, skipped.
+    """
+    if not media and not detections:
+        raise ValueError("Нечего записывать: выключены и медиа, и детекции.")
+    workers = workers or config.get("batch_workers")
+    output = os.path.abspath(output)
+    os.makedirs(output, exist_ok=True)
+    options = {"mode": mode, "media": media, "detections": detections, "tiled": tiled,
+               "cascade": cascade}
+    manifest = Manifest(os.path.join(output, MANIFEST_NAME))
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    pending = []
+    for path, rel in collect_files(inputs, recursive):
+        previous = manifest.entries.get(path, {})
+        if manifest.is_done(path, options) or \
+                (not retry_failed and previous.get("status") == "failed"
+                 and previous.get("options") == options):
+            counts["skipped"] += 1
+        else:
+            pending.append((path, rel))
+
+    def finish(path, entry):
+        stat = os.stat(path)
+        entry.update(size=stat.st_size, mtime=stat.st_mtime, options=options)
+        manifest.record(entry)
+        counts[entry["status"]] += 1
+        if on_result is not None:
+            on_result(entry, counts["done"] + counts["failed"], len(pending))
+
+    def failed(path, e):
+        return {"source": path, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    task_options = dict(options, output=output)
+    try:
+        if workers <= 1 or len(pending) <= 1:
+            _init_batch_worker(os.cpu_count() or 1, mode)
+            for path, rel in pending:
+                try:
+                    entry = process_file(path, rel, task_options)
+                except Exception as e:
+                    entry = failed(path, e)
+                finish(path, entry)
+        else:
+            workers = min(workers, len(pending))
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_batch_worker,
+                                     initargs=(threads, mode)) as pool:
+                futures = {pool.submit(process_file, path, rel, task_options): path
+                           for path, rel in pending}
+                try:
+                    for future in as_completed(futures):
+                        path = futures[future]
+                        try:
+                            entry = future.result()
+                        except Exception as e:
+                            entry = failed(path, e)
+                        finish(path, entry)
+                except KeyboardInterrupt:
+                    # начатые файлы доделываются, остальные – при следующем запуске
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+    finally:
+        manifest.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="папки, glob-шаблоны или файлы")
+    parser.add_argument("--output", required=True, help="папка результатов и манифеста")
+    parser.add_argument("--mode", choices=("normal", "aerial"), default="normal")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="число процессов (по умолчанию batch_workers)")
+    parser.add_argument("--no-media", action="store_true",
+                        help="не писать размеченные видео/изображения")
+    parser.add_argument("--detections", choices=("jsonl", "parquet", "none"), default="jsonl")
+    parser.add_argument("--tiled", action="store_true", help="детекция по тайлам")
+    parser.add_argument("--cascade", action="store_true", help="каскад кандидатов")
+    parser.add_argument("--no-recursive", action="store_true", help="не заходить в подпапки")
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="не повторять файлы, завершившиеся ошибкой")
+    parser.add_argument("--cache", action="store_true",
+                        help="кэш детекций на диске: повторный запуск по тем же файлам "
+                             "без модели (detcache_enabled)")
+    args = parser.parse_args(argv)
+    if args.cache:
+        # через окружение – настройку видят и процессы пула
+        os.environ["RSAO_DETCACHE_ENABLED"] = "1"
+
+    def on_result(entry, done, total):
+        if entry["status"] == "done":
+            status = f"объектов {entry['found']}, {entry['seconds']:.1f} с"
+        else:
+            status = f"ошибка: {entry['error']}"
+        print(f"[{done}/{total}] {entry['source']}: {status}", flush=True)
+
+    try:
+        counts = run_batch(args.inputs, args.output, args.mode, args.workers,
+                           media=not args.no_media,
+                           detections=None if args.detections == "none" else args.detections,
+                           tiled=args.tiled, cascade=args.cascade,
+                           recursive=not args.no_recursive, retry_failed=not args.skip_failed,
+                           on_result=on_result)
+    except KeyboardInterrupt:
+        print("\nПрервано: готовые файлы записаны в манифест, повторный запуск продолжит.",
+              file=sys.stderr)
+        return 130
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Готово: {counts['done']}, ошибок: {counts['failed']}, "
+          f"пропущено (уже обработаны): {counts['skipped']}")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
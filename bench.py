@@ -0,0 +1,435 @@
+"""
+Безголовый бенчмарк стадий захват → инференс → отрисовка.
+
+Примеры:
+    python bench.py --source synthetic --stub-model --duration 10
+    python bench.py --source video:flight.mp4 --save-baseline bench_baseline.json
+    python bench.py --source mjpeg --stub-model --baseline bench_baseline.json
+
+Источники: synthetic (сгенерированные кадры с мелкими движущимися объектами),
+video:ПУТЬ (локальное видео по кругу), mjpeg (локальный MJPEG-сервер вместо
+телефона). --stub-model подменяет YOLO заглушкой с заданной задержкой, чтобы
+мерить сам конвейер отдельно от стоимости модели; работает на CPU без GPU.
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class SyntheticSource:
+    """Источник, совместимый с VideoSource: небо с шумом и несколько мелких движущихся объектов."""
+
+    def __init__(self, width=1280, height=720, fps=30.0, objects=8, object_size=6, seed=0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.object_size = object_size
+        rng = np.random.default_rng(seed)
+        self._background = np.clip(
+            rng.normal(170, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+        self._pos = rng.uniform((0, 0), (width, height), (objects, 2))
+        self._vel = rng.uniform(-4, 4, (objects, 2))
+        self._next = None
+
+    def _pace(self):
+        if not self.fps:
+            return
+        now = time.perf_counter()
+        if self._next is None:
+            self._next = now
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next + 1.0 / self.fps, now - 1.0 / self.fps)
+
+    def get_frame(self, out=None):
+        self._pace()
+        if out is None or out.shape != self._background.shape:
+            out = np.empty_like(self._background)
+        np.copyto(out, self._background)
+        self._pos = (self._pos + self._vel) % (self.width, self.height)
+        s = self.object_size
+        for x, y in self._pos.astype(int):
+            out[y:y + s, x:x + s] = (40, 40, 40)
+        return out
+
+    def release(self):
+        pass
+
+
+class LoopingVideoSource:
+    """Локальное видео по кругу (для воспроизводимых прогонов на реальных кадрах)."""
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError("Не удалось открыть видеофайл.")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if fps is None else fps
+        self._next = None
+
+    def get_frame(self, out=None):
+        if self.fps:
+            now = time.perf_counter()
+            if self._next is not None and self._next > now:
+                time.sleep(self._next - now)
+            self._next = max((self._next or now) + 1.0 / self.fps, now - 1.0 / self.fps)
+        ret, frame = self.cap.read(out) if out is not None else self.cap.read()
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class MJPEGServer:
+    """
+    Локальная замена IP Webcam: отдаёт /video как multipart/x-mixed-replace
+    из кадров source с частотой source.fps.
+    """
+
+    def __init__(self, source, host="127.0.0.1", port=0, quality=80):
+        self.source = source
+        self.quality = quality
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/video":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                try:
+                    while not server._stop.is_set():
+                        jpeg = server._next_jpeg()
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                         b"Content-Length: " + str(len(jpeg)).encode() +
+                                         b"\r\n\r\n" + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = "{}:{}".format(*self.httpd.server_address[:2])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _next_jpeg(self):
+        with self._lock:
+            frame = self.source.get_frame()
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return jpeg.tobytes()
+
+    @property
+    def url(self):
+        return f"http://{self.address}/video"
+
+    def close(self):
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _StubTensor:
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class StubBoxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = _StubTensor(xyxy)
+        self.cls = _StubTensor(cls)
+        self.conf = _StubTensor(conf)
+
+
+class StubResult:
+    """Результат ultralytics с готовыми боксами – для заглушек моделей."""
+
+    obb = None
+
+    def __init__(self, boxes, names):
+        self.boxes = boxes
+        self.names = names
+
+
+class StubModel:
+    """
+    Заглушка ultralytics.YOLO: отвечает через latency_ms (плюс per_mpix_ms
+    на мегапиксель входа) и возвращает boxes случайных мелких боксов.
+    """
+
+    names = {0: "object"}
+
+    def __init__(self, latency_ms=20.0, per_mpix_ms=0.0, boxes=5, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.per_mpix = per_mpix_ms / 1000.0
+        self.boxes = boxes
+        self._rng = np.random.default_rng(seed)
+
+    def __call__(self, source, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        mpix = sum(f.shape[0] * f.shape[1] for f in frames) / 1e6
+        time.sleep(self.latency + self.per_mpix * mpix)
+        results = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            xy = self._rng.uniform((0, 0), (max(w - 12, 1), max(h - 12, 1)), (self.boxes, 2))
+            xyxy = np.hstack([xy, xy + 10]).astype(np.float32)
+            results.append(StubResult(StubBoxes(xyxy, np.zeros(self.boxes, np.float32),
+                                                self._rng.uniform(0.3, 1.0, self.boxes)
+                                                .astype(np.float32)), self.names))
+        return results
+
+
+class StageTimer:
+    """Накопитель длительностей одной стадии."""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            data = np.array(self.samples) * 1000
+        if not len(data):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(data, [50, 95, 99])
+        return {"count": int(len(data)), "mean_ms": float(data.mean()),
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+class _TimedModel:
+    def __init__(self, model, timer):
+        self.model = model
+        self.timer = timer
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.model(*args, **kwargs)
+        finally:
+            self.timer.add(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def _install_model(args, timer):
+    from models import registry
+    if args.stub_model:
+        model = StubModel(args.stub_latency_ms, args.stub_per_mpix_ms)
+    else:
+        model = registry.get(args.model)
+    registry.register(args.model, _TimedModel(model, timer))
+
+
+def _make_source(args):
+    width, height = args.size
+    if args.source == "synthetic":
+        return SyntheticSource(width, height, fps=args.fps), None
+    if args.source.startswith("video:"):
+        return LoopingVideoSource(args.source[len("video:"):], fps=args.fps or None), None
+    if args.source == "mjpeg":
+        server = MJPEGServer(SyntheticSource(width, height, fps=args.fps))
+        from capture import VideoSource
+        return VideoSource("phone", server.address, 0, ""), server
+    raise ValueError(f"Неизвестный источник: {args.source}")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS – байты
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+def bench_frames(args):
+    """process_frame-подобный цикл без потоков: детекция и отрисовка по кадру."""
+    from process import detect_frame
+    from render import Renderer
+
+    infer, render_timer = StageTimer(), StageTimer()
+    _install_model(args, infer)
+    source, server = _make_source(args)
+    renderer = Renderer((0, 0, 255))
+    frames = 0
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < args.duration:
+            frame = source.get_frame()
+            if frame is None:
+                continue
+            dets = detect_frame(frame, mode=args.model, tiled=args.tiled, cache=False)
+            t = time.perf_counter()
+            renderer.render(frame, dets)
+            render_timer.add(time.perf_counter() - t)
+            frames += 1
+    finally:
+        source.release()
+        if server is not None:
+            server.close()
+    elapsed = time.perf_counter() - started
+    return {"throughput_fps": frames / elapsed, "frames": frames,
+            "stages": {"inference": infer.summary(), "render": render_timer.summary()},
+            "peak_rss_mb": _peak_rss_mb()}
+
+
+def bench_pipeline(args):
+    """Полный VideoProcessor: потоки захвата и обработки, очереди, трекер."""
+    from capture import VideoProcessor
+    from metrics import PipelineMetrics
+
+    infer = StageTimer()
+    _install_model(args, infer)
+    source, server = _make_source(args)
+    metrics = PipelineMetrics(window=100000)
+    processor = VideoProcessor(source, skip_factor=args.skip, target_size=(args.infer_size,) * 2,
+                               tiled=args.tiled, overlay=not args.no_overlay, metrics=metrics)
+
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < args.duration:
+            frame = processor.read(timeout=0.1)
+            if frame is None:
+                continue
+            # отображения нет – кадр "показан" в момент чтения
+            metrics.frame_displayed(frame)
+            processor.release(frame)
+    finally:
+        processor.stop()
+        if server is not None:
+            server.close()
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    stages = {name: {k: v for k, v in h.items() if k != "buckets"}
+              for name, h in snapshot["stages"].items()}
+    # время самой модели – отдельно от предобработки и масштабирования боксов
+    stages["model"] = infer.summary()
+    return {
+        "capture_fps": counters["captured"] / elapsed,
+        "output_fps": counters["displayed"] / elapsed,
+        "frames_captured": counters["captured"],
+        "frames_output": counters["displayed"],
+        "dropped_capture_queue": counters["dropped_capture_queue"],
+        "dropped_output_queue": counters["dropped_output_queue"],
+        "stages": stages,
+        "peak_rss_mb": _peak_rss_mb(),
+        "buffer_pool": processor.pool.stats(),
+    }
+
+
+def _flatten(report, prefix=""):
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(report, baseline, tolerance):
+    """Сравнить с базовым прогоном. Возвращает список регрессий."""
+    current, base = _flatten(report), _flatten(baseline)
+    regressions = []
+    for name in sorted(current.keys() & base.keys()):
+        if (name.endswith(".count") or name.endswith(".total")
+                or name.startswith(("config.", "buffer_pool.", "frames"))):
+            continue
+        old, new = base[name], current[name]
+        if old == 0:
+            continue
+        change = (new - old) / abs(old)
+        higher_is_better = name.endswith("_fps")
+        worse = -change if higher_is_better else change
+        mark = "РЕГРЕССИЯ" if worse > tolerance else ""
+        print(f"{name:45s} {old:12.2f} → {new:12.2f}  ({change * 100:+6.1f}%) {mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def _parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="synthetic",
+                        help="synthetic | video:ПУТЬ | mjpeg")
+    parser.add_argument("--mode", choices=["pipeline", "frames"], default="pipeline",
+                        help="pipeline – VideoProcessor с потоками, frames – покадровый цикл")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--size", type=_parse_size, default=(1280, 720), help="ШxВ синтетики")
+    parser.add_argument("--fps", type=float, default=30.0, help="частота источника (0 – без ограничения)")
+    parser.add_argument("--model", choices=["normal", "aerial"], default="normal")
+    parser.add_argument("--stub-model", action="store_true", help="заглушка вместо YOLO")
+    parser.add_argument("--stub-latency-ms", type=float, default=20.0)
+    parser.add_argument("--stub-per-mpix-ms", type=float, default=0.0)
+    parser.add_argument("--skip", type=int, default=3, help="интервал запуска детектора")
+    parser.add_argument("--infer-size", type=int, default=320)
+    parser.add_argument("--tiled", action="store_true")
+    parser.add_argument("--no-overlay", action="store_true")
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    parser.add_argument("--baseline", help="сравнить с сохранённым отчётом")
+    parser.add_argument("--save-baseline", help="сохранить отчёт как базовый")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="допустимое ухудшение относительно базового (доля)")
+    args = parser.parse_args(argv)
+
+    report = bench_pipeline(args) if args.mode == "pipeline" else bench_frames(args)
+    report["config"] = {"source": args.source, "mode": args.mode, "size": list(args.size),
+                        "stub_model": args.stub_model, "skip": args.skip,
+                        "infer_size": args.infer_size, "tiled": args.tiled,
+                        "host": socket.gethostname()}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
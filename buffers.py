@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Пул переиспользуемых буферов кадров.
+
+    acquire(shape) отдаёт свободный массив нужной формы (или создаёт новый),
+    release(buf) возвращает его в пул. Буфер в каждый момент принадлежит
+    одному потоку: поток, получивший кадр из очереди, либо передаёт его
+    дальше, либо освобождает. Свободных буферов одной формы хранится не
+    больше max_free – лишние отдаются сборщику мусора.
+    """
+
+    def __init__(self, max_free=4, dtype=np.uint8):
+        self.max_free = max_free
+        self.dtype = dtype
+        self._free = {}
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=self.dtype)
+
+    def release(self, buf):
+        if buf is None or buf.base is not None:
+            # представления чужой памяти (срезы, обёртки буферов mss) в пул не берём
+            return
+        with self._lock:
+            free = self._free.setdefault(buf.shape, [])
+            if len(free) < self.max_free and not any(b is buf for b in free):
+                free.append(buf)
+
+    def stats(self):
+        with self._lock:
+            return {"allocated": self.allocated, "reused": self.reused,
+                    "free": sum(len(v) for v in self._free.values())}
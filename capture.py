@@ -1,14 +1,29 @@
+import math
+import os
 import threading
 import queue
 import time
 import cv2
 import numpy as np
-from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import messagebox
 import mss
-import pygetwindow as gw
-from process import process_frame
+import config
+from export import DetectionExporter
+from process import detect_frame, detect_batch
+from detections import Detections
+from render import Renderer
+from tracking import Tracker
+from buffers import FramePool
+from scheduler import AdaptiveScheduler
+from metrics import PipelineMetrics, MetricsReporter
+from engine import InferenceEngine
+from inference_server import connect
+from motion import ChangeGate, SAME, FULL, outside_regions
+from tiling import merge_crops
+from mjpeg import MJPEGReader
+from display import DisplayWorker, DisplayPacer
+from recorder import ClipRecorder
 
 
 class VideoSource:
@@ -19,11 +34,18 @@ class VideoSource:
         self.window_title = window_title
         self.cap = None
         self.sct = None
+        self.reader = None
 
         if self.mode in ["phone", "pc"]:
             if self.mode == "phone":
-                url = f'http://{self.phone_ip}:8080/video'
-                self.cap = cv2.VideoCapture(url)
+                # порт по умолчанию – 8080 (IP Webcam), но можно указать "ip:порт"
+                host = self.phone_ip if ":" in self.phone_ip else f"{self.phone_ip}:8080"
+                url = f'http://{host}/video'
+                if config.get("phone_reader") == "mjpeg":
+                    # свой разбор MJPEG: только свежий кадр, без буфера OpenCV
+                    self.reader = MJPEGReader(url)
+                else:
+                    self.cap = cv2.VideoCapture(url)
             else:
                 self.cap = cv2.VideoCapture(0)
         elif self.mode in ["screen", "window"]:
@@ -34,25 +56,40 @@ class VideoSource:
                 except IndexError:
                     self.monitor = self.sct.monitors[0]
             elif self.mode == "window":
+                # pygetwindow есть только под Windows/macOS – импортируем по требованию
+                import pygetwindow as gw
                 windows = gw.getWindowsWithTitle(self.window_title)
                 if not windows:
                     raise ValueError("Окно с заданным названием не найдено!")
                 w = windows[0]
                 self.monitor = {'left': w.left, 'top': w.top, 'width': w.width, 'height': w.height}
 
-    def get_frame(self):
+    def get_frame(self, out=None):
+        """
+        Вернуть очередной кадр BGR или None. Если передан out – буфер нужной
+        формы (из FramePool), кадр пишется прямо в него.
+        """
+        if self.reader is not None:
+            return self.reader.read()
         if self.mode in ["phone", "pc"]:
-            ret, frame = self.cap.read()
+            ret, frame = self.cap.read(out) if out is not None else self.cap.read()
             if not ret:
                 return None
             return frame
         elif self.mode in ["screen", "window"]:
             screenshot = self.sct.grab(self.monitor)
-            frame = np.array(screenshot)
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-            return frame
+            # сырые байты mss оборачиваются без копирования, BGRA→BGR сразу в out
+            bgra = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+                screenshot.height, screenshot.width, 4)
+            return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+
+    def describe(self):
+        """Состояние потока для строки статуса (пусто, если источник не поток)."""
+        return self.reader.describe() if self.reader is not None else ""
 
     def release(self):
+        if self.reader is not None:
+            self.reader.release()
         if self.cap is not None:
             self.cap.release()
         if self.sct is not None:
@@ -60,10 +97,59 @@ class VideoSource:
 
 
 class VideoProcessor:
-    def __init__(self, source: VideoSource, skip_factor:int=2, target_size=(320,320)):
+    def __init__(self, source: VideoSource, skip_factor:int=2, target_size=(320,320),
+                 tiled: bool=False, exporter=None, display_size=None, overlay: bool=True,
+                 scheduler=None, metrics=None, engine=None, engine_wait=None, backend=None,
+                 gate=None, cascade=False, recorder=None, cache=False):
         self.source = source
+        # детектор запускается на каждом skip_factor-м кадре (или раньше,
+        # если треки устарели), на остальных боксы ведёт трекер
         self.skip_factor = skip_factor
         self.target_size = target_size
+        # в тайловом и каскадном режимах кадр обрабатывается в полном разрешении
+        self.tiled = tiled
+        self.cascade = cascade
+        self.tracker = Tracker()
+        # AdaptiveScheduler: если задан, интервал детектора и разрешение
+        # инференса берутся из него, а не из skip_factor/target_size
+        self.scheduler = scheduler
+        # DetectionExporter для потоковой записи детекций (необязательно)
+        self.exporter = exporter
+        # PipelineMetrics: длительности стадий и счётчики сбросов (None – выключено)
+        self.metrics = metrics
+        # InferenceEngine, общий для нескольких источников: детекция идёт в его
+        # батче вместе с кадрами других источников; режим движка (тайлы,
+        # каскад) должен совпадать с режимом источника
+        if engine is not None and (engine.tiled, engine.cascade) != (tiled, cascade):
+            raise ValueError("Режим InferenceEngine не совпадает с режимом источника")
+        if cascade and backend is not None:
+            raise ValueError("Каскадный режим работает только с локальной моделью")
+        if tiled and backend is not None and not backend.supports_tiled:
+            raise ValueError("Тайловый режим не поддерживается бэкендом Roboflow")
+        self.engine = engine
+        if engine is not None:
+            engine.register(self, engine_wait)
+        # клиент сервера инференса (inference_server.InferenceClient) вместо
+        # модели в этом процессе
+        self.backend = backend
+        # ChangeGate: кадры без изменений не обрабатываются, при частичных
+        # изменениях детектор запускается только на изменённых областях
+        self.gate = gate
+        self._gate_dets = None
+        self._idle = 0
+        # ClipRecorder: кольцевой буфер кадров и запись клипов по событию
+        self.recorder = recorder
+        # проверять кэш детекций на диске (для источников, где кадры повторяются)
+        self.cache = cache
+        self._wall_offset = time.time() - time.monotonic()
+        # кадр масштабируется до размера окна до отрисовки: подписи рисуются
+        # в экранном разрешении и не размываются последующим ресайзом
+        self.display_size = display_size
+        self.renderer = Renderer((255, 0, 0), overlay=overlay)
+        # буферы кадров переиспользуются: захват → обработка → показ → release()
+        self.pool = FramePool()
+        self._frame_shape = None
+        self._small = None
 
         # очереди длины 1 → всегда самый свежий кадр
         self.cap_queue = queue.Queue(maxsize=1)
@@ -74,79 +160,431 @@ class VideoProcessor:
         threading.Thread(target=self._process_loop, daemon=True).start()
 
     def _capture_loop(self):
+        metrics = self.metrics
+        idle_sleep = config.get("gate_idle_sleep_ms") / 1000.0
+        failures = 0
+        frame_index = 0
         while not self._stop.is_set():
-            frame = self.source.get_frame()
+            if self._idle:
+                # картинка давно не меняется – захват реже, до 10 шагов паузы
+                time.sleep(min(self._idle, 10) * idle_sleep)
+            buf = self.pool.acquire(self._frame_shape) if self._frame_shape else None
+            if metrics is not None:
+                read_started = time.monotonic()
+            frame = self.source.get_frame(buf)
+            if frame is not buf:
+                # первый кадр или источник сменил размер – буфер не подошёл
+                self.pool.release(buf)
             if frame is None:
+                if metrics is not None:
+                    metrics.count("capture_failed")
+                # источник не отдаёт кадры (обрыв, камера занята) – не крутимся
+                # вхолостую, пауза растёт до 0.5 с
+                failures += 1
+                self._stop.wait(min(0.5, 0.005 * 2 ** min(failures, 7)))
                 continue
-            # сохраняем только последний
-            if self.cap_queue.full():
-                try: self.cap_queue.get_nowait()
-                except queue.Empty: pass
-            self.cap_queue.put(frame)
+            failures = 0
+            self._frame_shape = frame.shape
+            captured_at = time.monotonic()
+            if metrics is not None:
+                metrics.observe("capture", captured_at - read_started)
+                metrics.count("captured")
+            if self.scheduler is not None:
+                self.scheduler.on_capture(captured_at)
+            if self.recorder is not None:
+                self.recorder.add_frame(frame, frame_index, captured_at)
+            # сохраняем только последний, вытесненный кадр возвращаем в пул
+            self._put_latest(self.cap_queue, (frame, frame_index, captured_at),
+                             "dropped_capture_queue")
+            frame_index += 1
+
+    def _put_latest(self, q, item, counter):
+        if q.full():
+            try:
+                dropped = q.get_nowait()
+                frame = dropped[0] if isinstance(dropped, tuple) else dropped
+                if self.metrics is not None:
+                    self.metrics.count(counter)
+                    self.metrics.frame_dropped(frame)
+                self.pool.release(frame)
+            except queue.Empty:
+                pass
+        q.put(item)
+
+    def _detect(self, frame):
+        if self.tiled or self.cascade:
+            if self.engine is not None:
+                dets = self.engine.detect_one(self, frame)
+                return Detections.empty() if dets is None else dets
+            if self.backend is not None:
+                return self.backend.detect(frame, tiled=True)
+            return detect_frame(frame, tiled=self.tiled, cascade=self.cascade, cache=self.cache)
+        # предобработка: детекция на уменьшенном кадре, боксы – в координаты исходного
+        target_size = self.target_size if self.scheduler is None else self.scheduler.target_size
+        # буфер уменьшенного кадра переиспользуется (cv2 пересоздаст его при смене размера)
+        self._small = cv2.resize(frame, target_size, dst=self._small)
+        if self.engine is not None:
+            dets = self.engine.detect_one(self, self._small)
+            if dets is None:
+                return Detections.empty()
+        elif self.backend is not None:
+            dets = self.backend.detect(self._small)
+        else:
+            dets = detect_frame(self._small, cache=self.cache)
+        return dets.scaled(frame.shape[1] / target_size[0], frame.shape[0] / target_size[1])
+
+    def _detect_regions(self, frame, regions):
+        # вырезки изменённых областей одним батчем; крупные уменьшаются до
+        # размера инференса, вход модели – по самой большой вырезке (кратно 32)
+        limit = max(self.target_size if self.scheduler is None else self.scheduler.target_size)
+        crops, offsets, scales = [], [], []
+        for x1, y1, x2, y2 in regions:
+            crop = frame[y1:y2, x1:x2]
+            h, w = crop.shape[:2]
+            scale = max(1.0, max(h, w) / limit)
+            if scale > 1.0:
+                crop = cv2.resize(crop, (max(1, round(w / scale)), max(1, round(h / scale))),
+                                  interpolation=cv2.INTER_AREA)
+            crops.append(crop)
+            offsets.append((x1, y1))
+            scales.append(scale)
+        side = max(max(c.shape[:2]) for c in crops)
+        imgsz = min(limit, max(32, -(-side // 32) * 32))
+        # та же точка входа, что у целых кадров: сервер инференса или локальная
+        # модель (с экспортом для CPU и кэшем детекций)
+        if self.backend is not None:
+            parts = self.backend.detect_batch(crops)
+        else:
+            parts = detect_batch(crops, cache=self.cache, imgsz=imgsz)
+        return merge_crops(parts, offsets, scales, sizes=[c.shape[1::-1] for c in crops],
+                           frame_size=frame.shape[1::-1])
+
+    def _detect_gated(self, frame, state, regions):
+        gate = self.gate
+        if state == SAME and self._gate_dets is not None:
+            # с последней детекции кадр не изменился – её результат и есть ответ
+            return self._gate_dets
+        if (state == FULL or self._gate_dets is None or self.tiled or self.cascade
+                or self.engine is not None):
+            # общий движок, тайлы и каскад работают с целыми кадрами
+            dets = gate.cached() if state == FULL else None
+            if dets is None:
+                dets = self._detect(frame)
+        else:
+            fresh = self._detect_regions(frame, regions)
+            kept = self._gate_dets.select(outside_regions(self._gate_dets, regions))
+            dets = Detections.concat([kept, fresh], fresh.names or kept.names)
+        gate.commit(dets)
+        self._gate_dets = dets
+        return dets
 
     def _process_loop(self):
-        frame_count = 0
+        metrics = self.metrics
+        since_detect = self.skip_factor
         while not self._stop.is_set():
             try:
-                frame = self.cap_queue.get(timeout=1)
+                frame, frame_index, captured_at = self.cap_queue.get(timeout=1)
             except queue.Empty:
                 continue
 
-            frame_count += 1
-            # пропускаем часть кадров
-            if frame_count % self.skip_factor != 0:
-                continue
-
-            # предобработка: уменьшение разрешения
-            small = cv2.resize(frame, self.target_size)
-            processed = process_frame(small)
-            processed = cv2.resize(processed, frame.shape[1::-1])
+            gate = self.gate
+            if gate is not None:
+                state, regions = gate.check(frame)
+                if gate.is_static():
+                    # то же, что уже на экране: не обрабатываем и не выводим
+                    self._idle += 1
+                    if metrics is not None:
+                        metrics.count("unchanged")
+                    self.pool.release(frame)
+                    continue
+                self._idle = 0
 
-            if self.proc_queue.full():
-                try: self.proc_queue.get_nowait()
-                except queue.Empty: pass
-            self.proc_queue.put(processed)
+            started = time.perf_counter()
+            if metrics is not None:
+                stage_started = time.monotonic()
+                metrics.observe("queue_wait", stage_started - captured_at)
+            interval = self.skip_factor if self.scheduler is None else self.scheduler.interval
+            detected = since_detect >= interval or self.tracker.is_stale()
+            if detected:
+                raw = (self._detect(frame) if gate is None
+                       else self._detect_gated(frame, state, regions))
+                dets = self.tracker.update(raw, captured_at)
+                since_detect = 1
+            else:
+                # промежуточный кадр: боксы сдвигаются трекером без модели
+                dets = self.tracker.predict(captured_at)
+                since_detect += 1
+            if metrics is not None:
+                now = time.monotonic()
+                metrics.observe("infer" if detected else "track", now - stage_started)
+                if not detected:
+                    metrics.count("skipped")
+                stage_started = now
+            dets.stamped(frame_index, captured_at + self._wall_offset)
+            if self.exporter is not None:
+                self.exporter.write(dets, block=False)
+            if self.recorder is not None:
+                self.recorder.on_detections(dets, captured_at)
+            source_size = frame.shape[1::-1]
+            if self.display_size is not None and tuple(self.display_size) != source_size:
+                width, height = self.display_size
+                display = self.pool.acquire((height, width, 3))
+                cv2.resize(frame, self.display_size, dst=display, interpolation=cv2.INTER_AREA)
+                self.pool.release(frame)
+                frame = display
+            processed = self.renderer.render(frame, dets, source_size)
+            if metrics is not None:
+                metrics.observe("render", time.monotonic() - stage_started)
+                metrics.count("processed")
+                metrics.frame_ready(processed, captured_at)
+            self._put_latest(self.proc_queue, processed, "dropped_output_queue")
+            if gate is not None:
+                gate.mark_shown()
+            if self.scheduler is not None:
+                self.scheduler.on_frame(time.perf_counter() - started, detected)
 
     def read(self, timeout=0):
-        """Вернуть последний обработанный кадр или None."""
+        """
+        Вернуть последний обработанный кадр или None. Кадр принадлежит
+        вызывающему, после показа его нужно вернуть через release().
+        """
         try:
             return self.proc_queue.get(timeout=timeout)
         except queue.Empty:
             return None
 
+    def release(self, frame):
+        self.pool.release(frame)
+
     def stop(self):
         self._stop.set()
+        if self.engine is not None:
+            self.engine.unregister(self)
         self.source.release()
 
 
-def start_capture(mode, phone_ip, monitor_id, window_title,
-                  frame_width, frame_height):
+def parse_source_spec(spec):
+    """
+    Разобрать описание источника для многоканального режима:
+    "phone:192.168.1.40;skip=2;fps=15;latency=100;wait=10".
+    Режимы: phone:IP[:порт], pc, screen[:монитор], window:заголовок.
+    Необязательные параметры: skip – фиксированный интервал детектора (без
+    адаптации), fps – целевые к/с, latency – целевая задержка детекции (мс),
+    wait – сколько кадр может ждать сборки общего батча (мс).
+    """
+    head, *options = [part.strip() for part in spec.split(";")]
+    mode, _, arg = head.partition(":")
+    mode = mode.strip().lower()
+    if mode not in ("phone", "pc", "screen", "window"):
+        raise ValueError(f"Неизвестный источник: {head}")
+    source = {"mode": mode, "phone_ip": "", "monitor_id": 0, "window_title": "",
+              "name": head}
+    if mode == "phone":
+        if not arg:
+            raise ValueError("Для источника phone нужен IP телефона!")
+        source["phone_ip"] = arg
+    elif mode == "screen":
+        source["monitor_id"] = int(arg or 0)
+    elif mode == "window":
+        source["window_title"] = arg
+    for option in options:
+        key, _, value = option.partition("=")
+        key = key.strip().lower()
+        if key == "skip":
+            source["skip"] = int(value)
+        elif key == "fps":
+            source["target_fps"] = float(value)
+        elif key == "latency":
+            source["latency_ms"] = float(value)
+        elif key == "wait":
+            source["wait_ms"] = float(value)
+        elif key:
+            raise ValueError(f"Неизвестный параметр источника: {key}")
+    return source
+
+
+def _numbered_path(path, index, count):
+    # у каждого источника свой файл: detections.jsonl → detections_1.jsonl
+    if not path or count == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index + 1}{ext}"
+
+
+class _SourceView:
+    """Один источник в окне захвата: обработчик, подписи Tk, HUD и показ кадров."""
+
+    def __init__(self, cell, spec, index, count, display_size, tiled, target_fps,
+                 profile, engine, backend, cascade=False):
+        self.display_size = display_size
+        self.video_label = tk.Label(cell)
+        self.video_label.pack()
+        self.status_label = tk.Label(cell, anchor="w", justify=tk.LEFT)
+        self.status_label.pack(fill=tk.X)
+
+        source = VideoSource(spec["mode"], spec.get("phone_ip", ""), spec.get("monitor_id", 0),
+                             spec.get("window_title", ""))
+        self.name = spec.get("name", spec["mode"])
+        export_path = _numbered_path(config.get("capture_export_path"), index, count)
+        self.exporter = DetectionExporter(export_path) if export_path else None
+        # skip задан явно – интервал фиксирован, иначе его подбирает планировщик;
+        # в тайловом режиме разрешение задаётся тайлами, подстраивается только интервал
+        self.skip = spec.get("skip")
+        self.scheduler = None
+        if self.skip is None:
+            latency = spec.get("latency_ms")
+            self.scheduler = AdaptiveScheduler(
+                target_fps=spec.get("target_fps", target_fps), adapt_size=not (tiled or cascade),
+                target_latency=latency / 1000.0 if latency else None, initial_size=320)
+        # профилирование: метрики стадий, периодический отчёт и HUD поверх кадра
+        self.metrics = PipelineMetrics() if profile else None
+        self.reporter = None
+        if self.metrics is not None:
+            self.reporter = MetricsReporter(
+                self.metrics, config.get("metrics_interval"),
+                _numbered_path(config.get("metrics_path"), index, count) or None)
+        wait = spec.get("wait_ms")
+        # для статичных источников (экран, окно, неподвижная камера) – пропуск неизменных кадров
+        gate = ChangeGate() if spec["mode"] in config.get("gate_modes") else None
+        # запись клипов по событию: последние секунды до него уже в памяти
+        self.recorder = None
+        if config.get("record_enabled"):
+            self.recorder = ClipRecorder(f"{index}_{spec['mode']}" if count > 1 else spec["mode"])
+        self.processor = VideoProcessor(source, skip_factor=self.skip or 3, target_size=(320, 320),
+                                        tiled=tiled, cascade=cascade, exporter=self.exporter,
+                                        display_size=display_size, scheduler=self.scheduler,
+                                        metrics=self.metrics, engine=engine, backend=backend,
+                                        engine_wait=wait / 1000.0 if wait is not None else None,
+                                        gate=gate, recorder=self.recorder,
+                                        cache=spec["mode"] in config.get("detcache_live_modes"))
+        self.hud_visible = self.metrics is not None and config.get("metrics_hud")
+        self.hud_lines = []
+        # показ: конвертация в потоке DisplayWorker, вывод – по событию в потоке Tk
+        self.display = DisplayWorker(self.processor, self.video_label, display_size,
+                                     metrics=self.metrics, hud=self._hud)
+
+    def update_status(self):
+        if self.scheduler is not None:
+            text = self.scheduler.describe()
+        else:
+            text = f"Детектор: каждый {self.skip}-й кадр"
+        stream = self.processor.source.describe() if hasattr(self.processor.source,
+                                                              "describe") else ""
+        if stream:
+            text += f"\n{stream}"
+        if self.recorder is not None:
+            text += f"\nзапись: {self.recorder.describe()}"
+        self.status_label.configure(text=f"{self.name}: {text}" if self.name else text)
+        if self.hud_visible:
+            self.hud_lines = self.metrics.describe()
+
+    def toggle_hud(self):
+        if self.metrics is not None:
+            self.hud_visible = not self.hud_visible
+
+    def _hud(self):
+        # вызывается из потока показа: список строк заменяется целиком, не меняется
+        return self.hud_lines if self.hud_visible else ()
+
+    def close(self):
+        self.display.stop()
+        self.processor.stop()
+        if self.exporter is not None:
+            self.exporter.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.reporter is not None:
+            self.reporter.close()
+
+
+def check_backend_modes(backend, tiled=False, cascade=False):
+    """ValueError, если бэкенд детекции (см. inference_server.connect) не умеет режим."""
+    if cascade and backend is not None:
+        raise ValueError("Каскадный режим не поддерживается удалённым бэкендом детекции "
+                         "(inference_server, roboflow_model)")
+    if tiled and backend is not None and not backend.supports_tiled:
+        # облако видит только целый кадр – мелкие объекты, ради которых
+        # включены тайлы, были бы молча потеряны
+        raise ValueError("Тайловый режим не поддерживается облачной моделью "
+                         "(roboflow_model); отключите тайлы или настройку roboflow_model")
+
+
+def start_multi_capture(sources, frame_width, frame_height, tiled=False, target_fps=None,
+                        profile=None, cascade=False):
+    """
+    Окно захвата для одного или нескольких источников (словари как у
+    parse_source_spec). Источники показываются сеткой в пределах
+    frame_width × frame_height; при нескольких источниках детекция идёт через
+    один общий InferenceEngine – модель загружена один раз, последние кадры
+    всех источников обрабатываются одним батчем. Если настроен сервер
+    инференса (inference_server), детекция идёт через него, и батчи
+    собираются уже на сервере вместе с другими клиентами.
+    """
     root = tk.Tk()
     root.title("Окно захвата")
 
-    video_label = tk.Label(root)
-    video_label.pack()
-
-    source = VideoSource(mode, phone_ip, monitor_id, window_title)
-    processor = VideoProcessor(source, skip_factor=3, target_size=(320, 320))
-
-    def update_gui():
-        # пытаемся получить обработанный кадр без задержки
-        frame = processor.read(timeout=0)
-        if frame is not None:
-            # конвертация и отображение
-            cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(cv2image)
-            imgtk = ImageTk.PhotoImage(image=img.resize((frame_width, frame_height)))
-            video_label.imgtk = imgtk
-            video_label.configure(image=imgtk)
-        # вызываем снова максимально быстро
-        root.after(1, update_gui)
+    count = len(sources)
+    cols = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / cols)
+    display_size = (frame_width // cols, frame_height // rows)
+    profile = config.get("metrics_enabled") if profile is None else profile
+    backend = connect()
+    check_backend_modes(backend, tiled, cascade)
+    engine = (InferenceEngine(tiled=tiled, cascade=cascade)
+              if count > 1 and backend is None else None)
+
+    views = []
+    try:
+        for index, spec in enumerate(sources):
+            cell = tk.Frame(root)
+            cell.grid(row=index // cols, column=index % cols)
+            views.append(_SourceView(cell, spec, index, count, display_size, tiled,
+                                     target_fps, profile, engine, backend, cascade))
+    except Exception:
+        for view in views:
+            view.close()
+        if engine is not None:
+            engine.close()
+        root.destroy()
+        raise
+
+    # кадры выводятся по событию от потоков показа, не чаще частоты монитора
+    pacer = DisplayPacer(root, [view.display for view in views])
+
+    def update_status():
+        for view in views:
+            view.update_status()
+        pacer.poll()
+        root.after(500, update_status)
+
+    def toggle_hud(event=None):
+        for view in views:
+            view.toggle_hud()
+
+    root.bind("<F3>", toggle_hud)
 
     def on_close():
-        processor.stop()
+        pacer.close()
+        for view in views:
+            view.close()
+        if engine is not None:
+            engine.close()
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_close)
-    update_gui()
-    root.mainloop()
\ No newline at end of file
+    update_status()
+    root.mainloop()
+
+
+def start_capture(mode, phone_ip, monitor_id, window_title,
+                  frame_width, frame_height, tiled=False, target_fps=None, profile=None,
+                  extra_sources=None, cascade=False):
+    """
+    Окно захвата выбранного источника; extra_sources – дополнительные
+    источники (описания для parse_source_spec), обрабатываемые вместе с ним.
+    """
+    source = {"mode": mode, "phone_ip": phone_ip, "monitor_id": monitor_id,
+              "window_title": window_title, "name": "" if not extra_sources else mode}
+    sources = [source] + [parse_source_spec(spec) for spec in extra_sources or []]
+    start_multi_capture(sources, frame_width, frame_height, tiled=tiled, target_fps=target_fps,
+                        profile=profile, cascade=cascade)
@@ -0,0 +1,146 @@
+import cv2
+import numpy as np
+
+import config
+from detections import Detections
+from models import get_model
+from tiling import detect_crops
+
+
+class BlobProposer:
+    """
+    Классический поиск кандидатов: мелкие пятна, контрастные к локальному фону.
+
+    Кадр уменьшается до size по длинной стороне, top-hat и black-hat выделяют
+    светлые и тёмные объекты меньше ядра (птица или дрон на небе), порог –
+    медиана отклика плюс k робастных отклонений. Возвращает боксы xyxy в
+    координатах кадра и оценки (суммарный отклик пятна), по убыванию оценки.
+    """
+
+    def __init__(self, size=None, kernel=15, k=None, min_contrast=None, min_area=1):
+        self.size = size or config.get("cascade_proposal_size")
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel, kernel))
+        self.k = config.get("cascade_blob_k") if k is None else k
+        self.min_contrast = (config.get("cascade_blob_min_contrast") if min_contrast is None
+                             else min_contrast)
+        self.min_area = min_area
+
+    def __call__(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.size / max(h, w))
+        small = cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        response = cv2.max(cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, self.kernel),
+                           cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, self.kernel))
+        median = float(np.median(response))
+        mad = float(np.median(np.abs(response - median))) or 1.0
+        threshold = max(median + self.k * 1.4826 * mad, self.min_contrast)
+        mask = (response > threshold).astype(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+        scores = np.bincount(labels.ravel(), weights=response.ravel(), minlength=count)[1:]
+        stats = stats[1:]
+        keep = stats[:, cv2.CC_STAT_AREA] >= self.min_area
+        x, y = stats[keep, 0], stats[keep, 1]
+        boxes = np.stack([x, y, x + stats[keep, 2], y + stats[keep, 3]], axis=1) / scale
+        scores = scores[keep]
+        order = np.argsort(-scores)
+        return boxes[order].astype(np.float32), scores[order].astype(np.float32)
+
+
+class ModelProposer:
+    """Лёгкая модель (proposal_weights) на уменьшенном кадре с низким порогом confidence."""
+
+    def __init__(self, name="proposal", size=None, conf=None):
+        self.name = name
+        self.size = size or config.get("cascade_proposal_size")
+        self.conf = config.get("cascade_proposal_conf") if conf is None else conf
+
+    def __call__(self, frame):
+        result = get_model(self.name)(frame, imgsz=self.size, conf=self.conf, verbose=False)[0]
+        dets = Detections.from_result(result)
+        order = np.argsort(-dets.conf)
+        return dets.xyxy[order].astype(np.float32), dets.conf[order].astype(np.float32)
+
+
+_proposers = {}
+
+
+def make_proposer(kind=None):
+    """Генератор кандидатов по настройке cascade_proposer (blob или model), один на вид."""
+    kind = kind or config.get("cascade_proposer")
+    proposer = _proposers.get(kind)
+    if proposer is None:
+        if kind == "blob":
+            proposer = BlobProposer()
+        elif kind == "model":
+            proposer = ModelProposer()
+        else:
+            raise ValueError(f"Неизвестный генератор кандидатов: {kind}")
+        _proposers[kind] = proposer
+    return proposer
+
+
+def place_crops(boxes, width, height, crop_size, max_crops, margin=0.1):
+    """
+    Разместить окна вокруг кандидатов (по убыванию оценки): кандидат, уже
+    целиком попавший в выбранное окно (с отступом margin от края), нового окна
+    не получает. Окно – crop_size × crop_size с центром на кандидате; для
+    кандидата крупнее окна – его бокс с запасом, уменьшаемый до crop_size.
+    Возвращает список (x1, y1, x2, y2).
+    """
+    crops = []
+    pad = crop_size * margin
+    for x1, y1, x2, y2 in boxes:
+        if len(crops) >= max_crops:
+            break
+        if any(cx1 + pad <= x1 and cy1 + pad <= y1 and x2 <= cx2 - pad and y2 <= cy2 - pad
+               for cx1, cy1, cx2, cy2 in crops):
+            continue
+        side = max(crop_size, (x2 - x1) * (1 + 2 * margin), (y2 - y1) * (1 + 2 * margin))
+        side = int(min(side, max(width, height)))
+        cw, ch = min(side, width), min(side, height)
+        cx = int(np.clip((x1 + x2) / 2 - cw / 2, 0, width - cw))
+        cy = int(np.clip((y1 + y2) / 2 - ch / 2, 0, height - ch))
+        crops.append((cx, cy, cx + cw, cy + ch))
+    return crops
+
+
+def detect_cascade(frame, model, proposer=None, crop_size=None, max_crops=None,
+                   merge_threshold=None):
+    """
+    Каскад: дешёвые кандидаты на уменьшенном кадре, тяжёлая модель – только
+    на вырезках вокруг них в полном разрешении, одним батчем.
+
+    Бюджет тяжёлой модели на кадр – max_crops вырезок по crop_size; кадр без
+    кандидатов тяжёлую модель не запускает вовсе.
+    """
+    proposer = proposer or make_proposer()
+    crop_size = crop_size or config.get("cascade_crop_size")
+    max_crops = config.get("cascade_max_crops") if max_crops is None else max_crops
+    merge_threshold = merge_threshold or config.get("tile_merge_threshold")
+
+    height, width = frame.shape[:2]
+    boxes, _ = proposer(frame)
+    windows = place_crops(boxes, width, height, crop_size, max_crops)
+    if not windows:
+        return Detections.empty(getattr(model, "names", None))
+
+    crops, offsets, scales = [], [], []
+    for x1, y1, x2, y2 in windows:
+        crop = frame[y1:y2, x1:x2]
+        side = max(x2 - x1, y2 - y1)
+        if side > crop_size:
+            scale = side / crop_size
+            crop = cv2.resize(crop, (max(1, round((x2 - x1) / scale)),
+                                     max(1, round((y2 - y1) / scale))),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+        crops.append(crop)
+        offsets.append((x1, y1))
+        scales.append(scale)
+    return detect_crops(model, crops, offsets, scales, imgsz=crop_size,
+                        merge_threshold=merge_threshold, frame_size=(width, height))
@@ -0,0 +1,199 @@
+import json
+import os
+
+# Настройки приложения. Значение берётся (по убыванию приоритета) из
+# переменной окружения RSAO_<ИМЯ>, из JSON-файла конфигурации (путь в
+# RSAO_CONFIG, по умолчанию config.json рядом с программой) или из DEFAULTS.
+
+DEFAULTS = {
+    # пути к весам моделей
+    "normal_weights": "C:\\Users\\warn\\Downloads\\40Epoch.pt",
+    "aerial_weights": "yolo11x-obb.pt",
+    # сколько загруженных моделей держать в памяти одновременно
+    "model_cache_size": 2,
+    # тайловый инференс: сторона тайла, доля перекрытия, максимум тайлов на
+    # кадр, дополнительный проход по уменьшенному кадру целиком и порог
+    # слияния дубликатов на стыках тайлов
+    "tile_size": 640,
+    "tile_overlap": 0.2,
+    "max_tiles": 12,
+    "tile_full_frame": True,
+    "tile_merge_threshold": 0.6,
+    # трекинг между запусками детектора: порог сходства при сопоставлении,
+    # радиус поиска (в размерах объекта) для непересекающихся боксов, сколько
+    # детекций трек может пропустить, сколько попаданий нужно для показа и
+    # смещение (в долях размера объекта), после которого детектор
+    # запускается раньше срока
+    "track_iou_threshold": 0.2,
+    "track_gate": 2.0,
+    "track_max_missed": 2,
+    "track_min_hits": 1,
+    "track_stale_shift": 0.5,
+    # обработка видеофайлов: кадров на один вызов модели и длина очередей
+    # между декодером, инференсом и кодировщиком
+    "video_batch_size": 8,
+    "video_queue_size": 16,
+    # параллельная обработка длинных видео: число процессов и минимальная
+    # длина отрезка в кадрах
+    "video_workers": 1,
+    "video_min_segment": 300,
+    # экспорт детекций: кадров в одной пачке записи и предел очереди записи
+    "export_batch_size": 256,
+    "export_max_pending": 4096,
+    # адаптивное расписание захвата: целевой FPS вывода (0 – частота
+    # захвата), целевая задержка детекции, лестница разрешений инференса и
+    # предел интервала между запусками детектора
+    "target_fps": 0.0,
+    "target_latency_ms": 150.0,
+    "inference_sizes": [192, 256, 320, 416, 512, 640],
+    "max_detect_interval": 10,
+    # файл (.jsonl/.parquet) для записи детекций окна захвата; пусто – не писать
+    "capture_export_path": "",
+    # профилирование окна захвата: включить метрики стадий, период отчёта в
+    # секундах, файл для снимков (.jsonl; пусто – сводка в stderr) и HUD
+    # поверх кадра (переключается клавишей F3)
+    "metrics_enabled": False,
+    "metrics_interval": 5.0,
+    "metrics_path": "",
+    "metrics_hud": True,
+    # запись событий живых источников: кольцевой буфер последних record_pre_s
+    # секунд (JPEG в памяти, не больше record_memory_mb МБ, кадры шире
+    # record_max_width уменьшаются); при срабатывании правила – клип от pre до
+    # record_post_s после события (не длиннее record_max_clip_s) в record_dir
+    # (пусто – Downloads/clips). Правило: классы (пусто – любые), минимальный
+    # confidence и число таких объектов в кадре
+    "record_enabled": False,
+    "record_pre_s": 5.0,
+    "record_post_s": 5.0,
+    "record_max_clip_s": 60.0,
+    "record_memory_mb": 256,
+    "record_jpeg_quality": 80,
+    "record_max_width": 1280,
+    "record_dir": "",
+    "record_classes": [],
+    "record_min_conf": 0.5,
+    "record_min_count": 1,
+    # кэш детекций на диске (повторная обработка тех же кадров без модели):
+    # включён ли (выключен по умолчанию: на новых кадрах это лишний хэш и
+    # запись; batch.py --cache включает его для запуска), файл SQLite (пусто –
+    # ~/.cache/rsao/detections.sqlite), предел размера в МБ и живые источники,
+    # для которых он проверяется (статичные экраны и окна; кадры камеры не повторяются)
+    "detcache_enabled": False,
+    "detcache_path": "",
+    "detcache_max_mb": 512,
+    "detcache_live_modes": ["screen", "window"],
+    # частота обновления окна захвата (Гц); 0 – частота монитора (Windows), иначе 60
+    "display_refresh_hz": 0,
+    # общий инференс нескольких источников: максимум кадров в батче и сколько
+    # кадр может ждать остальные источники (мс)
+    "engine_max_batch": 8,
+    "engine_max_wait_ms": 15.0,
+    # сервер инференса: адрес (host:port) для клиентов – пусто, модель
+    # загружается в своём процессе; порт сервера, размер батча и окно сбора
+    # батча (мс); кодирование кадров клиентом (jpeg или raw) и качество JPEG
+    "inference_server": "",
+    "server_port": 8765,
+    "server_max_batch": 8,
+    "server_max_wait_ms": 10.0,
+    "server_encoding": "jpeg",
+    "server_jpeg_quality": 90,
+    # облачная модель Roboflow для режима normal (если сервер инференса не
+    # задан): "проект/версия" – пусто, модель локальная; ключ API, порог
+    # confidence в процентах, одновременных запросов на батч, качество JPEG
+    "roboflow_model": "",
+    "roboflow_api_key": "",
+    "roboflow_url": "https://detect.roboflow.com",
+    "roboflow_confidence": 40,
+    "roboflow_concurrency": 4,
+    "roboflow_jpeg_quality": 90,
+    # бэкенд для CPU: auto – экспортированная модель (ONNX/OpenVINO), если она
+    # сохранена рядом с весами и нет GPU; onnx/openvino – только этот формат;
+    # torch – всегда .pt. Размер входа экспорта и число калибровочных кадров INT8
+    "cpu_backend": "auto",
+    "cpu_export_imgsz": 640,
+    "cpu_calibration_frames": 300,
+    # пропуск неизменных кадров перед инференсом: режимы захвата, где он
+    # включён; ширина уменьшенного кадра для сравнения, порог яркости, доля
+    # изменённых пикселей "без изменений", доля площади, выше которой кадр
+    # обрабатывается целиком, запас вокруг областей, предел числа областей,
+    # размер кэша детекций по хэшу кадра и допустимое расхождение хэшей (бит),
+    # шаг паузы захвата, пока картинка не меняется (мс)
+    "gate_modes": ["screen", "window"],
+    "gate_width": 160,
+    "gate_threshold": 12,
+    "gate_still_fraction": 0.0,
+    "gate_full_fraction": 0.4,
+    "gate_padding": 2,
+    "gate_max_regions": 4,
+    "gate_cache_size": 8,
+    "gate_hash_distance": 1,
+    "gate_idle_sleep_ms": 10.0,
+    # каскад: генератор кандидатов (blob – классический поиск пятен, model –
+    # лёгкая модель proposal_weights), длинная сторона уменьшенного кадра для
+    # кандидатов, порог confidence лёгкой модели, чувствительность и
+    # минимальный контраст поиска пятен; бюджет тяжёлой модели на кадр –
+    # сторона вырезки и максимум вырезок
+    "cascade_proposer": "blob",
+    "proposal_weights": "yolo11n.pt",
+    "cascade_proposal_size": 640,
+    "cascade_proposal_conf": 0.05,
+    "cascade_blob_k": 6.0,
+    "cascade_blob_min_contrast": 20,
+    "cascade_crop_size": 640,
+    "cascade_max_crops": 6,
+    # чтение потока телефона: mjpeg – свой разбор MJPEG (только свежий кадр),
+    # opencv – cv2.VideoCapture; уменьшение при декодировании (1, 2, 4, 8),
+    # таймаут сокета и пауза переподключения (начальная и предельная), с
+    "phone_reader": "mjpeg",
+    "mjpeg_scale": 1,
+    "mjpeg_timeout": 5.0,
+    "mjpeg_backoff": 0.5,
+    "mjpeg_max_backoff": 10.0,
+    # большие аэроснимки: сторона тайла, перекрытие, тайлов в одном вызове
+    # модели, длинная сторона превью и наибольшая площадь (пиксели) снимка,
+    # который без rasterio можно загрузить в память целиком
+    "large_tile_size": 1024,
+    "large_tile_overlap": 0.2,
+    "large_batch_size": 4,
+    "large_preview_size": 2048,
+    "large_max_whole_pixels": 100_000_000,
+    # пакетная обработка (batch.py): число процессов (в каждом своя модель) и
+    # площадь изображения в пикселях, начиная с которой оно режется тайлами
+    "batch_workers": 2,
+    "batch_large_pixels": 50_000_000,
+}
+
+_CONFIG_PATH = os.environ.get(
+    "RSAO_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"),
+)
+_file_values = None
+
+
+def _load_file():
+    global _file_values
+    if _file_values is None:
+        try:
+            with open(_CONFIG_PATH, "r", encoding="utf-8") as f:
+                _file_values = json.load(f)
+        except (OSError, ValueError):
+            _file_values = {}
+    return _file_values
+
+
+def get(name, default=None):
+    """Вернуть значение настройки name, приведённое к типу значения по умолчанию."""
+    fallback = DEFAULTS.get(name, default)
+    raw = os.environ.get(f"RSAO_{name.upper()}")
+    if raw is None:
+        return _load_file().get(name, fallback)
+    if isinstance(fallback, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(fallback, int):
+        return int(raw)
+    if isinstance(fallback, float):
+        return float(raw)
+    if isinstance(fallback, (list, tuple)):
+        # списки чисел в переменных окружения – через запятую
+        return [type(fallback[0])(v) if fallback else v for v in raw.split(",") if v.strip()]
+    return raw
@@ -0,0 +1,340 @@
+"""
+Экспорт моделей для CPU (ONNX Runtime / OpenVINO) с необязательным INT8.
+
+    python cpu_export.py --model aerial --format openvino --int8 --calibration frames/
+    python cpu_export.py --model aerial --compare flight.mp4
+
+Артефакт кладётся рядом с весами (как это делает ultralytics), а его
+описание – в <веса>.cpu.json. ModelRegistry при загрузке модели берёт
+артефакт автоматически, если GPU нет (настройка cpu_backend) и веса с
+момента экспорта не менялись. --compare прогоняет одни и те же кадры через
+PyTorch и экспортированную модель и печатает скорость и совпадение детекций.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+FORMATS = ("onnx", "openvino")
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+def _meta_path(weights):
+    return os.path.splitext(weights)[0] + ".cpu.json"
+
+
+def _weights_stamp(weights):
+    stat = os.stat(weights)
+    return {"weights_size": stat.st_size, "weights_mtime": int(stat.st_mtime)}
+
+
+def cached_artifact(weights, fmt=None):
+    """Описание сохранённого артефакта для весов или None (нет, устарел, другой формат)."""
+    try:
+        with open(_meta_path(weights), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stamp = _weights_stamp(weights)
+    except (OSError, ValueError):
+        return None
+    if any(meta.get(k) != v for k, v in stamp.items()):
+        return None
+    if fmt is not None and meta.get("format") != fmt:
+        return None
+    if not meta.get("dynamic"):
+        # ранний статический экспорт (батч 1, один размер) – не подходит
+        return None
+    path = meta.get("path")
+    if not path or not os.path.exists(path):
+        return None
+    return meta
+
+
+def _has_cuda():
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def select_artifact(weights):
+    """
+    Какой экспортированный артефакт загрузить вместо .pt (None – PyTorch).
+    cpu_backend: auto – любой сохранённый артефакт, если нет GPU;
+    onnx/openvino – только этого формата; torch – всегда .pt.
+    """
+    backend = config.get("cpu_backend")
+    if backend == "torch":
+        return None
+    if backend == "auto":
+        if _has_cuda():
+            return None
+        return cached_artifact(weights)
+    return cached_artifact(weights, backend)
+
+
+def iter_frames(source, limit=None, step=None):
+    """Кадры BGR из папки/маски изображений или из видео (равномерная выборка)."""
+    if os.path.isdir(source) or any(ch in source for ch in "*?["):
+        pattern = os.path.join(source, "*") if os.path.isdir(source) else source
+        paths = sorted(p for p in glob.glob(pattern)
+                       if os.path.splitext(p)[1].lower() in _IMAGE_EXTENSIONS)
+        if limit:
+            paths = paths[::max(1, len(paths) // limit)][:limit]
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError("Не удалось открыть видеофайл.")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = step or (max(1, total // limit) if limit and total > 0 else 1)
+    count = index = 0
+    try:
+        while limit is None or count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % step == 0:
+                yield frame
+                count += 1
+            index += 1
+    finally:
+        cap.release()
+
+
+def _letterbox(frame, size):
+    # та же предобработка, что у ultralytics: сохранение пропорций, поля 114
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = round(h * scale), round(w * scale)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh),
+                                                      interpolation=cv2.INTER_LINEAR)
+    return canvas
+
+
+def _calibration_dir(frames, directory):
+    os.makedirs(directory, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(directory, f"{i:05d}.jpg"), frame)
+    return directory
+
+
+def _quantize_onnx(fp32_path, int8_path, frames, imgsz):
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+
+    input_name = InferenceSession(fp32_path, providers=["CPUExecutionProvider"]) \
+        .get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            blob = _letterbox(frame, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+            return {input_name: (blob[None].astype(np.float32) / 255.0)}
+
+    quantize_static(fp32_path, int8_path, Reader(), quant_format=QuantFormat.QDQ,
+                    per_channel=True, activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8)
+
+
+def export(name, fmt="openvino", int8=False, calibration=None, imgsz=None,
+           calibration_frames=None):
+    """
+    Экспортировать модель name ("normal"/"aerial") для CPU и запомнить артефакт.
+
+    INT8 требует калибровочных кадров (calibration – папка/маска изображений
+    или видео). Вход экспортируется динамическим (dynamic=True): детекторы
+    вызывают модель батчами (видео, тайлы, вырезки каскада, батчи движка и
+    сервера) и с разным imgsz (лестница планировщика, тайлы), а статический
+    граф принимает только батч 1 и один размер. imgsz – размер калибровки.
+    """
+    from ultralytics import YOLO
+    from models import registry
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    if int8 and not calibration:
+        raise ValueError("Для INT8 нужен набор калибровочных кадров (--calibration)")
+    weights = registry.weights_path(name)
+    imgsz = imgsz or config.get("cpu_export_imgsz")
+    calibration_frames = calibration_frames or config.get("cpu_calibration_frames")
+    model = YOLO(weights)
+
+    tmp = tempfile.mkdtemp(prefix="rsao_calib_")
+    try:
+        if fmt == "openvino":
+            kwargs = {}
+            if int8:
+                # NNCF калибруется на "val"-части датасета – собираем его из наших кадров
+                images = _calibration_dir(iter_frames(calibration, calibration_frames),
+                                          os.path.join(tmp, "images"))
+                data = os.path.join(tmp, "calibration.yaml")
+                with open(data, "w", encoding="utf-8") as f:
+                    json.dump({"path": tmp, "train": images, "val": images,
+                               "names": model.names}, f, ensure_ascii=False)
+                kwargs = {"int8": True, "data": data, "fraction": 1.0}
+            path = model.export(format="openvino", imgsz=imgsz, dynamic=True, **kwargs)
+        else:
+            path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+            if int8:
+                int8_path = os.path.splitext(path)[0] + "_int8.onnx"
+                _quantize_onnx(path, int8_path,
+                               list(iter_frames(calibration, calibration_frames)), imgsz)
+                path = int8_path
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    meta = {"format": fmt, "int8": bool(int8), "path": os.path.abspath(str(path)),
+            "task": model.task, "imgsz": imgsz, "dynamic": True, **_weights_stamp(weights)}
+    with open(_meta_path(weights), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    # следующая загрузка модели подхватит артефакт
+    registry.evict(name)
+    return meta
+
+
+def _match(reference, candidate, threshold=0.5):
+    """Жадное сопоставление детекций одного класса по IoU (OBB – по описанным боксам)."""
+    from tracking import iou_matrix
+
+    ious = iou_matrix(reference.xyxy, candidate.xyxy)
+    if ious.size:
+        ious[reference.cls[:, None] != candidate.cls[None, :]] = 0
+    matched = []
+    while ious.size and ious.max() >= threshold:
+        i, j = np.unravel_index(np.argmax(ious), ious.shape)
+        matched.append((i, j, ious[i, j]))
+        ious[i, :] = 0
+        ious[:, j] = 0
+    return matched
+
+
+def compare(name, source, limit=50, imgsz=None, artifact=None):
+    """
+    Сравнить PyTorch и экспортированную модель на одних кадрах: задержка на
+    кадр и согласие детекций (recall/precision относительно PyTorch, средний
+    IoU совпавших боксов и расхождение confidence).
+    """
+    from ultralytics import YOLO
+    from detections import Detections
+    from models import registry
+
+    weights = registry.weights_path(name)
+    artifact = artifact or cached_artifact(weights)
+    if artifact is None:
+        raise ValueError("Экспортированной модели нет – сначала запустите экспорт.")
+    imgsz = imgsz or artifact["imgsz"]
+    frames = list(iter_frames(source, limit))
+    if not frames:
+        raise ValueError("Нет кадров для сравнения.")
+
+    report = {"artifact": artifact, "frames": len(frames)}
+    outputs = {}
+    models = {"torch": YOLO(weights), "export": YOLO(artifact["path"], task=artifact["task"])}
+    for label, model in models.items():
+        model(frames[0], imgsz=imgsz, verbose=False)  # прогрев
+        times, dets = [], []
+        for frame in frames:
+            started = time.perf_counter()
+            result = model(frame, imgsz=imgsz, verbose=False)[0]
+            times.append(time.perf_counter() - started)
+            dets.append(Detections.from_result(result))
+        times = np.array(times) * 1000
+        report[label] = {"mean_ms": float(times.mean()), "p95_ms": float(np.percentile(times, 95)),
+                         "fps": float(1000 / times.mean())}
+        outputs[label] = dets
+
+    ref_total = cand_total = matched_total = 0
+    ious, conf_diff = [], []
+    for ref, cand in zip(outputs["torch"], outputs["export"]):
+        pairs = _match(ref, cand)
+        ref_total += len(ref)
+        cand_total += len(cand)
+        matched_total += len(pairs)
+        ious.extend(iou for _, _, iou in pairs)
+        conf_diff.extend(abs(float(ref.conf[i]) - float(cand.conf[j])) for i, j, _ in pairs)
+    report["agreement"] = {
+        "recall": matched_total / ref_total if ref_total else 1.0,
+        "precision": matched_total / cand_total if cand_total else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "mean_conf_diff": float(np.mean(conf_diff)) if conf_diff else 0.0,
+    }
+    report["speedup"] = report["torch"]["mean_ms"] / report["export"]["mean_ms"]
+    report["call_patterns"] = _check_call_patterns(models, frames, imgsz)
+    return report
+
+
+def _check_call_patterns(models, frames, imgsz):
+    """
+    Вызовы, которые делает приложение, кроме одиночного кадра: батч кадров
+    (видео, тайлы, движок) и другие imgsz (лестница планировщика, тайлы).
+    Для каждого – ошибка экспортированной модели или recall относительно PyTorch.
+    """
+    from detections import Detections
+
+    sizes = sorted({min(config.get("inference_sizes")), config.get("tile_size"),
+                    max(config.get("inference_sizes"))} - {imgsz})
+    patterns = [("batch", frames[:4], imgsz)]
+    patterns += [(f"imgsz_{size}", frames[:1], size) for size in sizes]
+    patterns.append(("batch_imgsz_{}".format(sizes[0] if sizes else imgsz), frames[:4],
+                     sizes[0] if sizes else imgsz))
+    checks = {}
+    for label, batch, size in patterns:
+        try:
+            results = {name: [Detections.from_result(r)
+                              for r in model(batch, imgsz=size, verbose=False)]
+                       for name, model in models.items()}
+        except Exception as e:
+            checks[label] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            continue
+        ref_total = sum(len(d) for d in results["torch"])
+        matched = sum(len(_match(ref, cand))
+                      for ref, cand in zip(results["torch"], results["export"]))
+        ok = len(results["export"]) == len(batch)
+        checks[label] = {"ok": ok, "batch": len(batch), "imgsz": size,
+                         "recall": matched / ref_total if ref_total else 1.0}
+    return checks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=["normal", "aerial"], default="aerial")
+    parser.add_argument("--format", choices=FORMATS, default="openvino")
+    parser.add_argument("--int8", action="store_true", help="INT8-квантование после обучения")
+    parser.add_argument("--calibration", help="папка/маска изображений или видео для калибровки")
+    parser.add_argument("--imgsz", type=int, default=None)
+    parser.add_argument("--compare", metavar="SOURCE",
+                        help="сравнить с PyTorch на кадрах из папки/видео (без экспорта)")
+    parser.add_argument("--frames", type=int, default=50, help="кадров для сравнения")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        report = compare(args.model, args.compare, args.frames, args.imgsz)
+    else:
+        report = export(args.model, args.format, args.int8, args.calibration, args.imgsz)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
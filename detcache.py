@@ -0,0 +1,213 @@
+"""
+Кэш детекций на диске: повторная обработка тех же кадров без модели.
+
+Ключ – хэш содержимого кадра (форма + пиксели), отпечаток модели (имя, хэш
+весов, формат экспорта, см. models.ModelRegistry.fingerprint) и параметры
+инференса. Значение – детекции в упакованном двоичном виде; имена классов
+хранятся один раз на модель. Файл – SQLite (несколько процессов пакетной
+обработки пишут в него одновременно), размер ограничен detcache_max_mb,
+вытесняются давно не использовавшиеся записи.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+import numpy as np
+
+import config
+from detections import Detections
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+_HEADER = struct.Struct("<IB")
+
+# после скольких попаданий время использования записей сбрасывается на диск
+_TOUCH_BATCH = 256
+
+
+def frame_hash(frame):
+    """Быстрый хэш содержимого кадра (xxh3-128, без xxhash – blake2b)."""
+    frame = np.ascontiguousarray(frame)
+    digest = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    digest.update(f"{frame.shape}{frame.dtype}".encode())
+    digest.update(memoryview(frame).cast("B"))
+    return digest.digest()
+
+
+def make_key(frame_digest, model_id, params):
+    digest = hashlib.blake2b(frame_digest, digest_size=16)
+    digest.update(model_id.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.digest()
+
+
+def pack(dets):
+    """Детекции → компактные байты: число, флаг OBB, боксы, классы, confidence, полигоны."""
+    n = len(dets)
+    parts = [_HEADER.pack(n, dets.is_obb), dets.xyxy.astype("<f4").tobytes(),
+             dets.cls.astype("<u2").tobytes(), dets.conf.astype("<f4").tobytes()]
+    if dets.is_obb:
+        parts.append(dets.polygons.astype("<f4").tobytes())
+    return b"".join(parts)
+
+
+def unpack(data, names=None):
+    n, obb = _HEADER.unpack_from(data)
+    offset = _HEADER.size
+
+    def take(dtype, count):
+        nonlocal offset
+        # копия: массивы из буфера только для чтения, а детекции дальше меняются
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset).copy()
+        offset += array.nbytes
+        return array
+
+    xyxy = take("<f4", n * 4)
+    cls = take("<u2", n)
+    conf = take("<f4", n)
+    polygons = take("<f4", n * 8) if obb else None
+    return Detections(xyxy, cls, conf, names, polygons)
+
+
+class DetectionCache:
+    """
+    Кэш детекций в SQLite с вытеснением по давности использования.
+
+    get()/put() потокобезопасны; время использования записей при попаданиях
+    копится в памяти и пишется пачками – чтение из кэша не превращается в
+    запись на диск на каждый кадр.
+    """
+
+    def __init__(self, path=None, max_mb=None):
+        self.path = path or config.get("detcache_path") or os.path.join(
+            os.path.expanduser("~"), ".cache", "rsao", "detections.sqlite")
+        self.max_bytes = (max_mb or config.get("detcache_max_mb")) * 1024 * 1024
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, "
+                         "model TEXT, data BLOB, size INTEGER, used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, names TEXT)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._names = {}
+        self._touched = []
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _model_names(self, model_id):
+        names = self._names.get(model_id)
+        if names is None:
+            row = self._db.execute("SELECT names FROM models WHERE model = ?",
+                                   (model_id,)).fetchone()
+            names = {int(k): v for k, v in json.loads(row[0]).items()} if row else {}
+            self._names[model_id] = names
+        return names
+
+    def get_many(self, keys, model_id):
+        """Детекции по ключам (None – промах), в порядке keys."""
+        if not keys:
+            return []
+        with self._lock:
+            marks = ",".join("?" * len(keys))
+            rows = dict(self._db.execute(f"SELECT key, data FROM entries WHERE key IN ({marks})",
+                                         keys).fetchall())
+            names = self._model_names(model_id)
+            found = [rows.get(key) for key in keys]
+            now = time.time()
+            self._touched += [(now, key) for key in keys if key in rows]
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._flush_touched()
+            # счётчики – под тем же замком: get_many зовут из нескольких потоков
+            hits = len(keys) - found.count(None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [None if data is None else unpack(data, names) for data in found]
+
+    def get(self, key, model_id):
+        return self.get_many([key], model_id)[0]
+
+    def put_many(self, items, model_id, names=None):
+        """Сохранить [(ключ, Detections)] одной транзакцией."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, dets in items:
+            data = pack(dets)
+            rows.append((key, model_id, data, len(data), now))
+        with self._lock:
+            if names and self._names.get(model_id) != names:
+                self._names[model_id] = dict(names)
+                self._db.execute("INSERT OR REPLACE INTO models VALUES (?, ?)",
+                                 (model_id, json.dumps(names, ensure_ascii=False)))
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._flush_touched()
+            self._size += sum(row[3] for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def put(self, key, dets, model_id):
+        self.put_many([(key, dets)], model_id, dets.names)
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET used = ? WHERE key = ?", self._touched)
+            self._touched = []
+            self._db.commit()
+
+    def _evict(self):
+        # размер мог вырасти и от других процессов – пересчитываем по базе
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        target = self.max_bytes * 0.9
+        while self._size > target:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY used LIMIT 256"
+                                    ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                victims.append((key,))
+                self._size -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": count, "size_mb": self._size / 1024 / 1024,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.close()
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Общий кэш процесса (соединение SQLite своё в каждом процессе); None – выключен."""
+    global _cache, _cache_pid
+    if not config.get("detcache_enabled"):
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = DetectionCache()
+            _cache_pid = os.getpid()
+        return _cache
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+class Detections:
+    """
+    Результаты детекции одного кадра в виде массивов NumPy.
+
+    xyxy     – (N, 4) float32, прямоугольники в координатах кадра;
+    polygons – (N, 4, 2) float32 для OBB-моделей или None;
+    cls      – (N,) int32, индексы классов;
+    conf     – (N,) float32, confidence;
+    names    – словарь {индекс класса: имя};
+    ids      – (N,) int32, номера треков или None, если трекинга не было;
+    frame_index, timestamp – номер кадра и время (секунды от начала видео
+    или time.time() для живых источников), если известны.
+    """
+
+    __slots__ = ("xyxy", "polygons", "cls", "conf", "names", "ids", "frame_index", "timestamp")
+
+    def __init__(self, xyxy, cls, conf, names=None, polygons=None, ids=None,
+                 frame_index=None, timestamp=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.cls = np.asarray(cls, dtype=np.int32).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.names = names or {}
+        self.polygons = None if polygons is None else \
+            np.asarray(polygons, dtype=np.float32).reshape(-1, 4, 2)
+        self.ids = None if ids is None else np.asarray(ids, dtype=np.int32).reshape(-1)
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+
+    @classmethod
+    def empty(cls, names=None, obb=False):
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0), names,
+                   np.empty((0, 4, 2)) if obb else None)
+
+    @classmethod
+    def from_result(cls, result):
+        """Собрать детекции из ultralytics.Results: по одной пересылке GPU→CPU на массив."""
+        if getattr(result, "obb", None) is not None:
+            obb = result.obb
+            polygons = obb.xyxyxyxy.cpu().numpy()
+            return cls(obb.xyxy.cpu().numpy(), obb.cls.cpu().numpy(),
+                       obb.conf.cpu().numpy(), result.names, polygons)
+        boxes = result.boxes
+        if boxes is None:
+            return cls.empty(result.names)
+        return cls(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(),
+                   boxes.conf.cpu().numpy(), result.names)
+
+    @property
+    def is_obb(self):
+        return self.polygons is not None
+
+    def __len__(self):
+        return len(self.conf)
+
+    def select(self, index):
+        return Detections(self.xyxy[index], self.cls[index], self.conf[index], self.names,
+                          None if self.polygons is None else self.polygons[index],
+                          None if self.ids is None else self.ids[index],
+                          self.frame_index, self.timestamp)
+
+    def shifted(self, dx, dy):
+        """Сдвинуть координаты (например, из тайла в координаты кадра)."""
+        offset = np.array([dx, dy], dtype=np.float32)
+        return Detections(self.xyxy + np.tile(offset, 2), self.cls, self.conf, self.names,
+                          None if self.polygons is None else self.polygons + offset, self.ids,
+                          self.frame_index, self.timestamp)
+
+    def scaled(self, sx, sy):
+        scale = np.array([sx, sy], dtype=np.float32)
+        return Detections(self.xyxy * np.tile(scale, 2), self.cls, self.conf, self.names,
+                          None if self.polygons is None else self.polygons * scale, self.ids,
+                          self.frame_index, self.timestamp)
+
+    def stamped(self, frame_index, timestamp):
+        """Проставить номер кадра и время (массивы не копируются)."""
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+        return self
+
+    def to_record(self):
+        """Словарь для экспорта: массивы в виде списков, имена классов строками."""
+        record = {
+            "frame": self.frame_index,
+            "time": self.timestamp,
+            "xyxy": np.round(self.xyxy, 2).tolist(),
+            "cls": self.cls.tolist(),
+            "label": [self.names.get(int(c), str(c)) for c in self.cls],
+            "conf": np.round(self.conf, 4).tolist(),
+        }
+        if self.polygons is not None:
+            record["polygons"] = np.round(self.polygons, 2).tolist()
+        if self.ids is not None:
+            record["ids"] = self.ids.tolist()
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        names = {int(c): label for c, label in zip(record["cls"], record["label"])}
+        return cls(record["xyxy"] or np.empty((0, 4)), record["cls"], record["conf"], names,
+                   record.get("polygons"), record.get("ids"),
+                   record.get("frame"), record.get("time"))
+
+    @staticmethod
+    def concat(items, names=None):
+        items = [d for d in items if d is not None]
+        if not items:
+            return Detections.empty(names)
+        names = names or items[0].names
+        obb = any(d.is_obb for d in items)
+        polygons = None
+        if obb:
+            polygons = np.concatenate([d.polygons if d.is_obb else _box_polygons(d.xyxy)
+                                       for d in items])
+        return Detections(np.concatenate([d.xyxy for d in items]),
+                          np.concatenate([d.cls for d in items]),
+                          np.concatenate([d.conf for d in items]),
+                          names, polygons)
+
+
+def _box_polygons(xyxy):
+    x1, y1, x2, y2 = xyxy.T
+    return np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                     np.stack([x2, y2], 1), np.stack([x1, y2], 1)], 1)
+
+
+def merge_overlapping(dets, threshold=0.5, cut=None):
+    """
+    Убрать дубликаты одного объекта (например, на стыке тайлов).
+
+    Классозависимый NMS, но перекрытие меряется как площадь пересечения,
+    делённая на площадь меньшего бокса: обрезанная краем тайла часть объекта
+    целиком лежит внутри полного бокса из соседнего тайла, и обычный IoU
+    для такой пары мал. cut – булев массив "бокс обрезан внутренним краем
+    своего тайла" (см. tiling.place_detections): только если обрезаны оба
+    бокса, оставшийся расширяется до их объединения, чтобы разрезанный
+    стыком объект собрался целиком. Обрезанный победитель с необрезанным
+    дубликатом получает бокс дубликата; в остальных случаях остаётся бокс
+    победителя.
+    """
+    return merge_overlapping_cut(dets, threshold, cut)[0]
+
+
+def merge_overlapping_cut(dets, threshold=0.5, cut=None):
+    """merge_overlapping, который возвращает и флаги cut оставшихся боксов."""
+    if len(dets) < 2:
+        return dets, cut
+    xyxy = dets.xyxy
+    areas = np.maximum(xyxy[:, 2] - xyxy[:, 0], 0) * np.maximum(xyxy[:, 3] - xyxy[:, 1], 0)
+    merged = xyxy.copy()
+    order = np.argsort(-dets.conf, kind="stable")
+    suppressed = np.zeros(len(dets), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = order[~suppressed[order]]
+        rest = rest[(rest != i) & (dets.cls[rest] == dets.cls[i])]
+        if not len(rest):
+            continue
+        ix1 = np.maximum(xyxy[i, 0], xyxy[rest, 0])
+        iy1 = np.maximum(xyxy[i, 1], xyxy[rest, 1])
+        ix2 = np.minimum(xyxy[i, 2], xyxy[rest, 2])
+        iy2 = np.minimum(xyxy[i, 3], xyxy[rest, 3])
+        inter = np.maximum(ix2 - ix1, 0) * np.maximum(iy2 - iy1, 0)
+        smaller = np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        duplicates = rest[inter / smaller > threshold]
+        suppressed[duplicates] = True
+        if cut is None or not cut[i] or dets.is_obb or not len(duplicates):
+            continue
+        whole = duplicates[~cut[duplicates]]
+        parts = duplicates[cut[duplicates]]
+        if len(whole):
+            # объект целиком виден в другом тайле – его бокс вместо обрезка
+            # (duplicates идут по убыванию confidence)
+            merged[i] = xyxy[whole[0]]
+        elif len(parts):
+            merged[i, :2] = np.minimum(merged[i, :2], xyxy[parts, :2].min(0))
+            merged[i, 2:] = np.maximum(merged[i, 2:], xyxy[parts, 2:].max(0))
+    keep = np.array(keep, dtype=np.int64)
+    result = dets.select(keep)
+    result.xyxy = merged[keep]
+    return result, None if cut is None else cut[keep]
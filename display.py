@@ -0,0 +1,196 @@
+import sys
+import threading
+import time
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+import config
+
+# виртуальное событие Tk: в потоке показа готов новый кадр
+FRAME_READY = "<<FrameReady>>"
+
+
+def refresh_rate():
+    """
+    Частота обновления монитора (Гц): настройка display_refresh_hz, при 0 –
+    запрос у системы (Windows), иначе 60.
+    """
+    rate = config.get("display_refresh_hz")
+    if rate:
+        return rate
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            hdc = ctypes.windll.user32.GetDC(0)
+            try:
+                rate = ctypes.windll.gdi32.GetDeviceCaps(hdc, 116)  # VREFRESH
+            finally:
+                ctypes.windll.user32.ReleaseDC(0, hdc)
+            # 0 и 1 – "частота по умолчанию оборудования"
+            if rate > 1:
+                return rate
+        except (AttributeError, OSError):
+            pass
+    return 60
+
+
+class DisplayWorker:
+    """
+    Поток показа одного источника: забирает обработанные кадры у
+    VideoProcessor, приводит их к размеру окна и RGBX в переиспользуемые
+    буферы и будит Tk виртуальным событием FRAME_READY.
+
+    Буферов три: в один пишет поток показа, второй – последний готовый кадр,
+    третий сейчас на экране. Поток показа никогда не ждёт Tk: если окно не
+    успевает, готовый кадр просто заменяется более свежим. present()
+    вызывается только из потока Tk и обновляет один постоянный PhotoImage на
+    месте, без создания новых изображений.
+    """
+
+    def __init__(self, processor, widget, display_size, metrics=None, hud=None):
+        self.processor = processor
+        self.widget = widget
+        self.display_size = tuple(display_size)
+        self.metrics = metrics
+        # hud() → строки поверх кадра или пустой список
+        self.hud = hud
+        width, height = self.display_size
+        # 4 канала: frombuffer отображает в память только режимы вроде RGBX
+        # (для "RGB" PIL копирует данные, и изображение не видит новых кадров)
+        self._buffers = [np.zeros((height, width, 4), dtype=np.uint8) for _ in range(3)]
+        # изображения PIL разделяют память с буферами – paste() читает их напрямую
+        self._images = [Image.frombuffer("RGBX", self.display_size, buf, "raw", "RGBX", 0, 1)
+                        for buf in self._buffers]
+        self.photo = ImageTk.PhotoImage("RGB", self.display_size)
+        widget.configure(image=self.photo)
+        self._back, self._ready, self._front = 0, 1, 2
+        # время захвата и готовности кадра в буфере _ready
+        self._ready_info = None
+        self._has_frame = False
+        self._notified = False
+        self._lock = threading.Lock()
+        self.presented = 0
+        self.replaced = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        metrics = self.metrics
+        while not self._stop.is_set():
+            frame = self.processor.read(timeout=0.5)
+            if frame is None:
+                continue
+            started = time.monotonic()
+            captured_at = metrics.take_capture_time(frame) if metrics is not None else None
+            back = self._buffers[self._back]
+            if frame.shape[1::-1] != self.display_size:
+                resized = cv2.resize(frame, self.display_size, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(resized, cv2.COLOR_BGR2RGBA, dst=back)
+            else:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=back)
+            # кадр скопирован – буфер обработчика возвращается в пул сразу
+            self.processor.release(frame)
+            for i, line in enumerate(self.hud() if self.hud is not None else ()):
+                cv2.putText(back, line, (8, 18 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.45, (255, 255, 0), 1, cv2.LINE_AA)
+            converted_at = time.monotonic()
+            if metrics is not None:
+                metrics.observe("display", converted_at - started)
+
+            with self._lock:
+                if self._has_frame:
+                    # предыдущий готовый кадр так и не показан
+                    self.replaced += 1
+                self._back, self._ready = self._ready, self._back
+                self._ready_info = (captured_at, converted_at)
+                self._has_frame = True
+                notify = not self._notified
+                self._notified = True
+            if notify:
+                self._notify()
+
+    def _notify(self):
+        # event_generate из другого потока tkinter передаёт в главный цикл Tk
+        try:
+            self.widget.event_generate(FRAME_READY, when="tail")
+        except (RuntimeError, tk.TclError):
+            # окно закрывается или Tcl собран без потоков – кадр заберёт
+            # страховочный опрос окна
+            with self._lock:
+                self._notified = False
+
+    def pending(self):
+        return self._has_frame
+
+    def present(self):
+        """Показать последний готовый кадр (только из потока Tk). True – кадр показан."""
+        with self._lock:
+            self._notified = False
+            if not self._has_frame:
+                return False
+            self._front, self._ready = self._ready, self._front
+            captured_at, converted_at = self._ready_info
+            self._has_frame = False
+        self.photo.paste(self._images[self._front])
+        self.presented += 1
+        metrics = self.metrics
+        if metrics is not None:
+            shown_at = time.monotonic()
+            metrics.observe("present", shown_at - converted_at)
+            metrics.frame_shown(captured_at, shown_at)
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+
+class DisplayPacer:
+    """
+    Темп обновления окна: кадры выводятся не чаще частоты монитора.
+
+    Привязан к FRAME_READY корневого окна: событие пришло раньше очередного
+    интервала обновления – вывод откладывается одним root.after до начала
+    интервала (повторные события за это время ничего не планируют). В простое
+    Tk не просыпается вовсе.
+    """
+
+    def __init__(self, root, workers, rate=None):
+        self.root = root
+        self.workers = workers
+        self.interval = 1.0 / (rate or refresh_rate())
+        self._last = 0.0
+        self._scheduled = None
+        root.bind(FRAME_READY, self._on_ready)
+
+    def _on_ready(self, event=None):
+        if self._scheduled is not None:
+            return
+        wait = self._last + self.interval - time.monotonic()
+        if wait > 0.001:
+            self._scheduled = self.root.after(max(1, int(wait * 1000)), self._present)
+        else:
+            self._present()
+
+    def _present(self):
+        self._scheduled = None
+        shown = False
+        for worker in self.workers:
+            shown = worker.present() or shown
+        if shown:
+            self._last = time.monotonic()
+
+    def poll(self):
+        """Страховка на случай потерянного события: вывести ожидающие кадры."""
+        if any(worker.pending() for worker in self.workers):
+            self._on_ready()
+
+    def close(self):
+        if self._scheduled is not None:
+            self.root.after_cancel(self._scheduled)
+            self._scheduled = None
+        self.root.unbind(FRAME_READY)
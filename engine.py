@@ -0,0 +1,178 @@
+import threading
+import time
+from functools import partial
+
+import config
+from process import detect_batch, detect_frame
+
+
+def _detect_each(frames, **kwargs):
+    # тайлы и каскад режут кадр сами – кадры источников обрабатываются по одному
+    return [detect_frame(frame, **kwargs) for frame in frames]
+
+
+class _Request:
+    __slots__ = ("key", "frame", "deadline", "done", "result", "error")
+
+    def __init__(self, key, frame, deadline):
+        self.key = key
+        self.frame = frame
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceEngine:
+    """
+    Общий инференс для нескольких источников.
+
+    Каждый источник (обычно VideoProcessor) регистрируется под своим ключом и
+    отправляет на детекцию последний кадр; у источника не больше одного
+    ожидающего кадра – новый кадр замещает старый. Рабочий поток собирает
+    ожидающие кадры в батч и вызывает модель один раз, результаты
+    возвращаются вызывающим потокам. Батч отправляется, когда кадр есть от
+    каждого активного источника, набран max_batch или истекло ожидание
+    самого нетерпеливого кадра (max_wait источника). Источники обходятся по
+    кругу, поэтому при числе источников больше max_batch никто не голодает.
+    В тайловом и каскадном режимах (tiled, cascade) источники присылают кадры
+    в полном разрешении, модель по-прежнему вызывается только потоком движка.
+    """
+
+    def __init__(self, mode="normal", max_batch=None, max_wait=None, detect=None,
+                 tiled=False, cascade=False):
+        self.mode = mode
+        self.tiled = tiled
+        self.cascade = cascade
+        self.max_batch = max_batch or config.get("engine_max_batch")
+        self.max_wait = (config.get("engine_max_wait_ms") / 1000.0
+                         if max_wait is None else max_wait)
+        # detect: список кадров → список Detections (по умолчанию – локальная модель;
+        # кадры живых источников не повторяются, кэш детекций не проверяется)
+        if detect is None and (tiled or cascade):
+            detect = partial(_detect_each, mode=mode, tiled=tiled, cascade=cascade, cache=False)
+        self.detect = detect or partial(detect_batch, mode=mode, cache=False)
+        self._sources = {}
+        self._order = []
+        self._cursor = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        self.batches = 0
+        self.frames = 0
+        self.superseded = 0
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def register(self, key, max_wait=None):
+        """Добавить источник; max_wait – сколько его кадр может ждать сборки батча."""
+        with self._cond:
+            if key not in self._sources:
+                self._order.append(key)
+            self._sources[key] = self.max_wait if max_wait is None else max_wait
+            self._cond.notify()
+
+    def unregister(self, key):
+        with self._cond:
+            if key in self._sources:
+                del self._sources[key]
+                self._order.remove(key)
+            request = self._pending.pop(key, None)
+            self._cond.notify()
+        if request is not None:
+            request.done.set()
+
+    def submit(self, key, frame):
+        """Поставить кадр источника key в очередь, вернуть запрос (готовность – request.done)."""
+        with self._cond:
+            if key not in self._sources or self._stop:
+                # источник уже снят (остановка) – запрос сразу завершается без результата
+                request = _Request(key, frame, 0.0)
+                request.done.set()
+                return request
+            request = _Request(key, frame, time.monotonic() + self._sources[key])
+            old = self._pending.get(key)
+            self._pending[key] = request
+            self._cond.notify()
+        if old is not None:
+            # замещённый кадр не обрабатывается, его ожидающий получает None
+            self.superseded += 1
+            old.done.set()
+        return request
+
+    def detect_one(self, key, frame, timeout=None):
+        """Детекция одного кадра через общий батч; None – кадр замещён или движок остановлен."""
+        request = self.submit(key, frame)
+        request.done.wait(timeout)
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take_batch(self):
+        # вызывается под self._cond; ждёт, пока батч будет готов к отправке
+        while not self._stop:
+            if self._pending:
+                now = time.monotonic()
+                everyone = len(self._pending) >= len(self._sources)
+                deadline = min(r.deadline for r in self._pending.values())
+                if everyone or len(self._pending) >= self.max_batch or now >= deadline:
+                    break
+                self._cond.wait(deadline - now)
+            else:
+                self._cond.wait()
+        if self._stop:
+            return []
+        # круговой обход начиная с курсора: при переполнении батча первыми
+        # идут источники, пропущенные в прошлый раз
+        count = len(self._order)
+        batch = []
+        for i in range(count):
+            key = self._order[(self._cursor + i) % count]
+            request = self._pending.pop(key, None)
+            if request is not None:
+                batch.append(request)
+                if len(batch) >= self.max_batch:
+                    self._cursor = (self._cursor + i + 1) % count
+                    break
+        return batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            # кадры разного размера (у источников своё разрешение инференса)
+            # идут отдельными вызовами модели, одинаковые – одним
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.frame.shape, []).append(request)
+            for requests in groups.values():
+                try:
+                    results = self.detect([r.frame for r in requests])
+                except Exception as e:
+                    # ошибка модели пробрасывается в потоки всех источников батча
+                    for request in requests:
+                        request.error = e
+                        request.done.set()
+                    continue
+                for request, dets in zip(requests, results):
+                    request.result = dets
+                    request.done.set()
+                self.batches += 1
+                self.frames += len(requests)
+
+    def stats(self):
+        return {"batches": self.batches, "frames": self.frames,
+                "mean_batch": self.frames / self.batches if self.batches else 0.0,
+                "superseded": self.superseded}
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._cond.notify_all()
+        for request in pending:
+            request.done.set()
+        self._thread.join(timeout=5)
@@ -0,0 +1,165 @@
+import json
+import os
+import queue
+import threading
+
+import config
+from detections import Detections
+
+
+def _format_for(path):
+    return "parquet" if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else "jsonl"
+
+
+class DetectionExporter:
+    """
+    Потоковая запись детекций в JSON Lines или Parquet (по расширению файла).
+
+    write() только ставит детекции в очередь; запись идёт в фоновом потоке
+    пачками по batch_size кадров (в Parquet – отдельными row group), так что
+    захват и инференс не ждут диска. Одна строка/запись – один кадр.
+    Parquet требует pyarrow.
+    """
+
+    def __init__(self, path, batch_size=None, max_pending=None):
+        self.path = path
+        self.format = _format_for(path)
+        self.batch_size = batch_size or config.get("export_batch_size")
+        if self.format == "parquet":
+            import pyarrow  # noqa: F401 – проверяем зависимость сразу, а не в потоке записи
+        self._queue = queue.Queue(maxsize=max_pending or config.get("export_max_pending"))
+        self._error = None
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def write(self, dets: Detections, block=True):
+        """
+        Добавить детекции кадра. Для живых источников block=False: если диск
+        не успевает, кадр пропускается (счётчик dropped), а не тормозит захват.
+        """
+        if self._error is not None:
+            raise self._error
+        try:
+            self._queue.put(dets.to_record(), block=block)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_loop(self):
+        writer = None
+        batch = []
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    # поток кадров затих – сбрасываем накопленное
+                    if batch:
+                        writer = self._write_batch(writer, batch)
+                        batch = []
+                    continue
+                if record is None:
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    writer = self._write_batch(writer, batch)
+                    batch = []
+            if batch:
+                writer = self._write_batch(writer, batch)
+        except Exception as e:
+            self._error = e
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _write_batch(self, writer, batch):
+        if self.format == "jsonl":
+            if writer is None:
+                writer = open(self.path, "w", encoding="utf-8")
+            writer.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+            writer.flush()
+            return writer
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(batch, schema=_parquet_schema())
+        if writer is None:
+            writer = pq.ParquetWriter(self.path, table.schema)
+        writer.write_table(table)
+        return writer
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    coords = pa.list_(pa.float32())
+    return pa.schema([
+        ("frame", pa.int64()),
+        ("time", pa.float64()),
+        ("xyxy", pa.list_(coords)),
+        ("cls", pa.list_(pa.int32())),
+        ("label", pa.list_(pa.string())),
+        ("conf", pa.list_(pa.float32())),
+        ("polygons", pa.list_(pa.list_(coords))),
+        ("ids", pa.list_(pa.int32())),
+    ])
+
+
+def iter_detections(path):
+    """Читать детекции из файла экспорта без декодирования видео."""
+    if _format_for(path) == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield Detections.from_record(json.loads(line))
+        return
+
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches():
+        for record in batch.to_pylist():
+            yield Detections.from_record(record)
+
+
+def concat_exports(parts, output_path):
+    """Склеить файлы экспорта (например, от параллельных отрезков) по порядку."""
+    if _format_for(output_path) == "jsonl":
+        with open(output_path, "wb") as out:
+            for part in parts:
+                if os.path.exists(part):
+                    with open(part, "rb") as f:
+                        while True:
+                            chunk = f.read(1 << 20)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+        return
+
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for part in parts:
+            if not os.path.exists(part):
+                continue
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,383 @@
+"""
+Локальный сервер инференса: одна загруженная модель на несколько клиентов.
+
+Запуск:
+    python inference_server.py --port 8765
+
+POST /detect?mode=normal|aerial&tiled=0|1 – тело из одного или нескольких
+кадров подряд, длины частей – в заголовке X-Frame-Lengths (через запятую).
+Content-Type: image/jpeg (или любой формат, который понимает cv2.imdecode)
+либо application/octet-stream – сырые BGR-кадры, форма в X-Frame-Shape
+("высота,ширина,каналы"). Ответ – JSON {"names": {...}, "detections": [...]},
+детекции в формате Detections.to_record, по одной на кадр.
+
+Запросы разных клиентов собираются в общие батчи (DynamicBatcher): первый
+кадр ждёт остальных не дольше max_wait, затем кадры одного размера уходят в
+модель одним вызовом.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import cv2
+import numpy as np
+
+import config
+from detections import Detections
+
+
+class _Job:
+    __slots__ = ("frame", "tiled", "done", "result", "error")
+
+    def __init__(self, frame, tiled=False):
+        self.frame = frame
+        self.tiled = tiled
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class DynamicBatcher:
+    """
+    Очередь кадров перед моделью. Рабочий поток берёт первый кадр, ждёт
+    следующие до max_wait (или до max_batch кадров) и отправляет их батчем.
+    Тайловые кадры (detect_tiled) обрабатываются тем же потоком по одному:
+    модели Ultralytics не потокобезопасны, к модели обращается только он.
+    """
+
+    def __init__(self, detect, detect_tiled=None, max_batch=None, max_wait=None):
+        # detect: список кадров → список Detections; detect_tiled: кадр → Detections
+        self.detect = detect
+        self.detect_tiled = detect_tiled
+        self.max_batch = max_batch or config.get("server_max_batch")
+        self.max_wait = (config.get("server_max_wait_ms") / 1000.0
+                         if max_wait is None else max_wait)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._stop = False
+        self.batches = 0
+        self.frames = 0
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, frames, tiled=False):
+        if tiled and self.detect_tiled is None:
+            raise ValueError("Тайловая детекция не поддерживается")
+        jobs = [_Job(frame, tiled) for frame in frames]
+        with self._cond:
+            self._queue.extend(jobs)
+            self._cond.notify()
+        return jobs
+
+    def run(self, frames, tiled=False):
+        """Детекция кадров в общем батче; блокирует до результата."""
+        jobs = self.submit(frames, tiled)
+        for job in jobs:
+            job.done.wait()
+            if job.error is not None:
+                raise job.error
+        return [job.result for job in jobs]
+
+    def _take(self):
+        with self._cond:
+            while not self._queue and not self._stop:
+                self._cond.wait()
+            if self._stop:
+                return []
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            groups = {}
+            for job in batch:
+                if job.tiled:
+                    # тайлы одного кадра и так идут в модель батчем
+                    groups[id(job)] = [job]
+                else:
+                    groups.setdefault(job.frame.shape, []).append(job)
+            for jobs in groups.values():
+                try:
+                    if jobs[0].tiled:
+                        results = [self.detect_tiled(jobs[0].frame)]
+                    else:
+                        results = self.detect([job.frame for job in jobs])
+                except Exception as e:
+                    for job in jobs:
+                        job.error = e
+                        job.done.set()
+                    continue
+                for job, dets in zip(jobs, results):
+                    job.result = dets
+                    job.done.set()
+                self.batches += 1
+                self.frames += len(jobs)
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            jobs, self._queue = self._queue, []
+            self._cond.notify_all()
+        for job in jobs:
+            job.error = RuntimeError("Сервер инференса остановлен")
+            job.done.set()
+
+
+def _split_frames(body, lengths):
+    if not lengths:
+        return [body]
+    parts, offset = [], 0
+    for length in lengths:
+        parts.append(body[offset:offset + length])
+        offset += length
+    if offset != len(body):
+        raise ValueError("Длины кадров не совпадают с размером тела запроса")
+    return parts
+
+
+def decode_frames(body, content_type, lengths=None, shape=None):
+    """Разобрать тело запроса в список BGR-кадров."""
+    frames = []
+    for part in _split_frames(body, lengths):
+        if content_type == "application/octet-stream":
+            if shape is None:
+                raise ValueError("Для сырых кадров нужен заголовок X-Frame-Shape")
+            frames.append(np.frombuffer(part, dtype=np.uint8).reshape(shape))
+        else:
+            frame = cv2.imdecode(np.frombuffer(part, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError("Не удалось декодировать изображение")
+            frames.append(frame)
+    return frames
+
+
+class InferenceServer:
+    """HTTP-сервер с моделями из реестра и батчером на каждый режим."""
+
+    def __init__(self, host="127.0.0.1", port=None, modes=("normal", "aerial")):
+        from process import detect_batch, detect_frame
+
+        # кадры клиентов – живые источники, повторов почти нет: кэш детекций
+        # только хэшировал бы каждый кадр и раздувал файл
+        self.batchers = {mode: DynamicBatcher(partial(detect_batch, mode=mode, cache=False),
+                                              partial(detect_frame, mode=mode, tiled=True,
+                                                      cache=False))
+                         for mode in modes}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/health":
+                    self._reply(200, {"status": "ok", "stats": server.stats()})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != "/detect":
+                    self._reply(404, {"error": "not found"})
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                query = parse_qs(url.query)
+                try:
+                    lengths = self.headers.get("X-Frame-Lengths")
+                    shape = self.headers.get("X-Frame-Shape")
+                    frames = decode_frames(
+                        body, self.headers.get("Content-Type", "image/jpeg"),
+                        [int(x) for x in lengths.split(",")] if lengths else None,
+                        tuple(int(x) for x in shape.split(",")) if shape else None)
+                    mode = query.get("mode", ["normal"])[0]
+                    tiled = query.get("tiled", ["0"])[0] in ("1", "true")
+                    results = server.detect(frames, mode, tiled)
+                except (ValueError, KeyError) as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                except Exception as e:
+                    self._reply(500, {"error": str(e)})
+                    return
+                names = results[0].names if results else {}
+                self._reply(200, {"names": {str(k): v for k, v in names.items()},
+                                  "detections": [d.to_record() for d in results]})
+
+        self.httpd = ThreadingHTTPServer((host, config.get("server_port") if port is None
+                                          else port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = "{}:{}".format(*self.httpd.server_address[:2])
+
+    def detect(self, frames, mode="normal", tiled=False):
+        if mode not in self.batchers:
+            raise KeyError(f"Неизвестный режим: {mode}")
+        return self.batchers[mode].run(frames, tiled)
+
+    def stats(self):
+        return {mode: {"batches": b.batches, "frames": b.frames}
+                for mode, b in self.batchers.items()}
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for batcher in self.batchers.values():
+            batcher.close()
+
+
+class InferenceClient:
+    """
+    Клиент сервера инференса – замена локальной модели.
+
+    detect(frame) для VideoProcessor, detect_batch(frames, mode) для
+    process_video. Каждый поток держит своё постоянное соединение; объект
+    можно передавать в процессы (соединения не сериализуются).
+    """
+
+    # тайлы режет и обрабатывает сервер
+    supports_tiled = True
+
+    def __init__(self, url=None, encoding=None, quality=None, timeout=30.0):
+        url = url or config.get("inference_server")
+        self.url = url if "://" in url else f"http://{url}"
+        # jpeg – меньше трафика, raw – без потерь и без кодирования (для localhost)
+        self.encoding = encoding or config.get("server_encoding")
+        self.quality = quality or config.get("server_jpeg_quality")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            parsed = urlparse(self.url)
+            conn = self._local.conn = http.client.HTTPConnection(
+                parsed.hostname, parsed.port or 80, timeout=self.timeout)
+        return conn
+
+    def _encode(self, frames):
+        if self.encoding == "raw":
+            parts = [np.ascontiguousarray(f).tobytes() for f in frames]
+            headers = {"Content-Type": "application/octet-stream",
+                       "X-Frame-Shape": ",".join(map(str, frames[0].shape))}
+        else:
+            parts = [cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1]
+                     .tobytes() for f in frames]
+            headers = {"Content-Type": "image/jpeg"}
+        headers["X-Frame-Lengths"] = ",".join(str(len(p)) for p in parts)
+        return b"".join(parts), headers
+
+    def _post(self, frames, mode, tiled):
+        body, headers = self._encode(frames)
+        path = "/detect?" + urlencode({"mode": mode, "tiled": int(tiled)})
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # сервер закрыл постоянное соединение – одна повторная попытка
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Сервер инференса: {payload.get('error', response.status)}")
+        names = {int(k): v for k, v in payload["names"].items()}
+        results = []
+        for record in payload["detections"]:
+            dets = Detections.from_record(record)
+            dets.names = names
+            results.append(dets)
+        return results
+
+    def detect(self, frame, mode="normal", tiled=False):
+        return self._post([frame], mode, tiled)[0]
+
+    def detect_batch(self, frames, mode="normal"):
+        if self.encoding == "raw" and len({f.shape for f in frames}) > 1:
+            return [self.detect(f, mode) for f in frames]
+        return self._post(frames, mode, False) if frames else []
+
+
+def connect(url=None):
+    """
+    Удалённый бэкенд детекции: клиент сервера из настройки inference_server,
+    иначе облачная модель roboflow_model; None – детекция локальная.
+    """
+    url = url or config.get("inference_server")
+    if url:
+        return InferenceClient(url)
+    if config.get("roboflow_model"):
+        from roboflow_client import RoboflowClient
+        return RoboflowClient()
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--modes", default="normal,aerial",
+                        help="какие модели обслуживать (загружаются при первом запросе)")
+    parser.add_argument("--warmup", action="store_true", help="загрузить модели сразу")
+    args = parser.parse_args(argv)
+
+    modes = tuple(m.strip() for m in args.modes.split(",") if m.strip())
+    if args.warmup:
+        from models import get_model
+        for mode in modes:
+            get_model(mode)
+    server = InferenceServer(args.host, args.port, modes)
+    print(f"Сервер инференса: http://{server.address}/detect")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
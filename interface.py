@@ -1,4 +1,6 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import customtkinter as ctk
@@ -9,8 +11,11 @@ import cv2
 import numpy as np
 from moviepy import VideoFileClip
 
-from capture import start_capture
-from process import process_frame
+from capture import start_capture, parse_source_spec, check_backend_modes
+from inference_server import connect
+from process import process_frame, process_video
+from models import warmup
+from largeimage import process_large_image
 
 try:
     from tkinterdnd2 import DND_FILES
@@ -28,10 +33,11 @@ class VideoProcessingAppToplevel(ctk.CTkToplevel):
         self.title("Проверка видео через модель")
         self.geometry("500x300")
         self.video_path = None
-        self.cap = None
-        self.out = None
         self.output_file_name = None
         self.current_imgtk = None
+        self.worker = None
+        self.stop_event = None
+        self.progress_queue = queue.Queue(maxsize=8)
         self.create_widgets()
 
     def create_widgets(self):
@@ -88,50 +94,86 @@ class VideoProcessingAppToplevel(ctk.CTkToplevel):
         if not self.video_path:
             messagebox.showerror("Ошибка", "Видео не выбрано!")
             return
-
-        if self.cap:
-            self.cap.release()
-        self.cap = cv2.VideoCapture(self.video_path)
-        if not self.cap.isOpened():
-            messagebox.showerror("Ошибка", "Не удалось открыть видеофайл.")
+        if self.worker is not None and self.worker.is_alive():
+            messagebox.showerror("Ошибка", "Видео уже обрабатывается!")
             return
 
-        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.cap.get(cv2.CAP_PROP_FPS)
-
-        downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
-        base_name = os.path.basename(self.video_path)
-        self.output_file_name = os.path.join(downloads_path, f"processed_{base_name}")
-
-        fourcc = cv2.VideoWriter.fourcc(*'mp4v')
-        self.out = cv2.VideoWriter(self.output_file_name, fourcc, fps, (width, height))
-
-        self.status_label.configure(text="Воспроизведение и запись видео с моделью...")
-        self.process_video_live(mode)
-
-    def process_video_live(self, mode="normal"):
-        ret, frame = self.cap.read()
-        if ret:
-            processed_frame = process_frame(frame, mode=mode)
-            self.out.write(processed_frame)  # запись кадра
-            rgb_frame = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(rgb_frame)
-            self.current_imgtk = ImageTk.PhotoImage(image=image)
-            self.video_label.configure(image=self.current_imgtk)
-            self.after(30, self.process_video_live, mode)
+        self.stop_event = threading.Event()
+        self.status_label.configure(text="Обработка и запись видео с моделью...")
+        self.worker = threading.Thread(target=self.process_video_worker, args=(mode,), daemon=True)
+        self.worker.start()
+        self.poll_progress()
+
+    def process_video_worker(self, mode):
+        # работает в фоновом потоке: Tk-виджеты отсюда не трогаем, только очередь
+        def on_progress(done, total, fps, frame):
+            self._post(("progress", done, total, fps, frame))
+        try:
+            # окно работает с локальной моделью, как и process_frame, либо с
+            # общей моделью сервера инференса, если он настроен
+            backend = connect()
+            output = process_video(self.video_path, mode=mode, on_progress=on_progress,
+                                   stop_event=self.stop_event, backend=backend)
+            self._post(("done", output))
+        except Exception as e:
+            self._post(("error", str(e)))
+
+    def _post(self, message):
+        # промежуточный прогресс можно пропустить, итоговые сообщения – нет
+        if message[0] == "progress":
+            try:
+                self.progress_queue.put_nowait(message)
+            except queue.Full:
+                pass
         else:
-            self.cap.release()
-            if self.out:
-                self.out.release()
-            self.status_label.configure(text=f"Видео завершено. Сохранено: {self.output_file_name}")
-            messagebox.showinfo("Готово", f"Обработанное видео сохранено:\n{self.output_file_name}")
+            self.progress_queue.put(message)
+
+    def poll_progress(self):
+        if not self.winfo_exists():
+            return
+        finished = False
+        while True:
+            try:
+                message = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                _, done, total, fps, frame = message
+                total_text = f"/{total}" if total else ""
+                self.status_label.configure(text=f"Обработано кадров: {done}{total_text}, {fps:.1f} к/с")
+                if frame is not None:
+                    self.show_preview(frame)
+            elif message[0] == "done" and message[1] is None:
+                finished = True
+                self.status_label.configure(text="Обработка остановлена")
+            elif message[0] == "done":
+                finished = True
+                self.output_file_name = message[1]
+                self.status_label.configure(text=f"Видео завершено. Сохранено: {self.output_file_name}")
+                messagebox.showinfo("Готово", f"Обработанное видео сохранено:\n{self.output_file_name}")
+            else:
+                finished = True
+                self.status_label.configure(text="Ошибка обработки видео")
+                messagebox.showerror("Ошибка", message[1])
+        if not finished:
+            self.after(100, self.poll_progress)
+
+    def show_preview(self, frame):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        image = Image.fromarray(rgb_frame)
+        self.current_imgtk = ImageTk.PhotoImage(image=image)
+        self.video_label.configure(image=self.current_imgtk)
+
+    def destroy(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        super().destroy()
 
 
 def start_interface():
     root = ctk.CTk()
     root.title("Выбор источника съёмки")
-    root.geometry("600x500")
+    root.geometry("600x550")
 
     root.clipboard_image = None
     mode_var = tk.StringVar(value="phone")
@@ -195,6 +237,61 @@ def start_interface():
     preview_label = ctk.CTkLabel(aerial_frame, text="Превью изображения")
     preview_label.pack(side=tk.TOP, pady=5)
 
+    def show_thumbnail(bgr):
+        pil_image = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        pil_image.thumbnail((200, 200))
+        tk_image = ImageTk.PhotoImage(pil_image)
+        preview_label.configure(image=tk_image, text="")
+        preview_label.image = tk_image
+
+    def open_large_image():
+        # ортофотоплан с диска: тайлы в исходном разрешении, без ресайза всего снимка
+        path = filedialog.askopenfilename(
+            filetypes=[("Изображения", "*.tif *.tiff *.png *.jpg *.jpeg *.jp2"), ("Все файлы", "*.*")])
+        if not path:
+            return
+        messages = queue.Queue()
+
+        def worker():
+            try:
+                result = process_large_image(
+                    path, on_progress=lambda done, total: messages.put(("progress", done, total)))
+                messages.put(("done",) + result)
+            except Exception as e:
+                messages.put(("error", str(e)))
+
+        def poll():
+            if not root.winfo_exists():
+                return
+            try:
+                while True:
+                    message = messages.get_nowait()
+                    if message[0] == "progress":
+                        label_aerial.configure(text=f"Тайлы: {message[1]}/{message[2]}")
+                    elif message[0] == "done":
+                        _, detections_path, preview_path, found = message
+                        label_aerial.configure(text="Нажмите Ctrl+V для вставки изображения")
+                        preview = cv2.imread(preview_path)
+                        if preview is not None:
+                            show_thumbnail(preview)
+                        messagebox.showinfo("Информация", f"Найдено объектов: {found}\n"
+                                            f"Детекции: {detections_path}\nПревью: {preview_path}")
+                        return
+                    else:
+                        label_aerial.configure(text="Нажмите Ctrl+V для вставки изображения")
+                        messagebox.showerror("Ошибка", f"Ошибка обработки снимка: {message[1]}")
+                        return
+            except queue.Empty:
+                pass
+            root.after(200, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
+    large_button = ctk.CTkButton(aerial_frame, text="Открыть большой снимок...",
+                                 command=open_large_image)
+    large_button.pack(side=tk.TOP, pady=5)
+
     frame_size_frame = ctk.CTkFrame(root)
     frame_size_frame.grid(row=6, column=0, columnspan=2, pady=10, padx=20)
     label_frame_width = ctk.CTkLabel(frame_size_frame, text="Ширина рамки:")
@@ -207,6 +304,27 @@ def start_interface():
     frame_height_entry = ctk.CTkEntry(frame_size_frame, width=50)
     frame_height_entry.insert(0, "960")
     frame_height_entry.pack(side=tk.LEFT, padx=5)
+    label_target_fps = ctk.CTkLabel(frame_size_frame, text="Целевые к/с (0 – авто):")
+    label_target_fps.pack(side=tk.LEFT, padx=5)
+    target_fps_entry = ctk.CTkEntry(frame_size_frame, width=40)
+    target_fps_entry.insert(0, "0")
+    target_fps_entry.pack(side=tk.LEFT, padx=5)
+    tiled_var = tk.BooleanVar(value=False)
+    tiled_checkbox = ctk.CTkCheckBox(frame_size_frame, text="Тайлы (мелкие объекты)", variable=tiled_var)
+    tiled_checkbox.pack(side=tk.LEFT, padx=5)
+    cascade_var = tk.BooleanVar(value=False)
+    cascade_checkbox = ctk.CTkCheckBox(frame_size_frame, text="Каскад", variable=cascade_var)
+    cascade_checkbox.pack(side=tk.LEFT, padx=5)
+
+    # дополнительные источники через запятую, например "pc, phone:192.168.1.40;skip=2";
+    # все источники показываются в одном окне и делят одну модель
+    extra_frame = ctk.CTkFrame(root)
+    extra_frame.grid(row=7, column=0, columnspan=2, pady=5, padx=20)
+    label_extra = ctk.CTkLabel(extra_frame, text="Доп. источники:")
+    label_extra.pack(side=tk.LEFT, padx=5)
+    extra_entry = ctk.CTkEntry(extra_frame, width=360,
+                               placeholder_text="pc, screen:1, phone:192.168.1.40;skip=2")
+    extra_entry.pack(side=tk.LEFT, padx=5)
 
     def update_fields(*args):
         current_mode = mode_var.get()
@@ -226,6 +344,8 @@ def start_interface():
             aerial_frame.grid()
         else:
             aerial_frame.grid_remove()
+        # пока пользователь выбирает источник, нужная модель грузится в фоне
+        warmup("aerial" if current_mode == "aerial" else "normal")
 
     mode_var.trace("w", update_fields)
     update_fields()
@@ -261,6 +381,8 @@ def start_interface():
                     monitor_id = 0
 
         window_title = window_var.get() if mode == "window" else ""
+        tiled = tiled_var.get()
+        cascade = cascade_var.get()
 
         try:
             frame_width = int(frame_width_entry.get().strip())
@@ -268,11 +390,27 @@ def start_interface():
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные числовые значения для размера окна!")
             return
+        try:
+            target_fps = float(target_fps_entry.get().strip() or 0)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите корректное значение целевых к/с!")
+            return
 
         if mode == "phone" and not phone_ip:
             messagebox.showerror("Ошибка", "Введите IP телефона!")
             return
 
+        extra_sources = [spec.strip() for spec in extra_entry.get().split(",") if spec.strip()]
+        try:
+            for spec in extra_sources:
+                parse_source_spec(spec)
+            if mode != "aerial":
+                # до закрытия окна выбора: иначе ошибку некому показать
+                check_backend_modes(connect(), tiled, cascade)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+
         if mode not in ["aerial"]:
             root.destroy()
 
@@ -283,25 +421,33 @@ def start_interface():
                 return
             pil_image = root.clipboard_image.convert("RGB")
             cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            cv_image = cv2.resize(cv_image, (frame_width, frame_height))
-            processed_image = process_frame(cv_image, mode="aerial")
+            if tiled or cascade:
+                # детекция по тайлам (или каскадом) в исходном разрешении, уменьшение только для показа
+                processed_image = process_frame(cv_image, mode="aerial", tiled=tiled,
+                                                cascade=cascade)
+                processed_image = cv2.resize(processed_image, (frame_width, frame_height))
+            else:
+                cv_image = cv2.resize(cv_image, (frame_width, frame_height))
+                processed_image = process_frame(cv_image, mode="aerial")
             processed_rgb = cv2.cvtColor(processed_image, cv2.COLOR_BGR2RGB)
             pil_processed = Image.fromarray(processed_rgb)
             tk_processed = ImageTk.PhotoImage(pil_processed)
             preview_label.configure(image=tk_processed)
             preview_label.image = tk_processed
         else:
-            start_capture(mode, phone_ip, monitor_id, window_title, frame_width, frame_height)
+            start_capture(mode, phone_ip, monitor_id, window_title, frame_width, frame_height,
+                          tiled=tiled, target_fps=target_fps, extra_sources=extra_sources,
+                          cascade=cascade)
             start_interface()
 
     start_button = ctk.CTkButton(root, text="Start", command=on_start, width=200)
-    start_button.grid(row=7, column=0, columnspan=2, pady=20)
+    start_button.grid(row=8, column=0, columnspan=2, pady=20)
 
     def open_video_editor():
         VideoProcessingAppToplevel(root)
 
     video_editor_button = ctk.CTkButton(root, text="Загрузить видео", command=open_video_editor, width=200)
-    video_editor_button.grid(row=8, column=0, columnspan=2, pady=10)
+    video_editor_button.grid(row=9, column=0, columnspan=2, pady=10)
 
     root.mainloop()
 
@@ -0,0 +1,290 @@
+"""
+Детекция на очень больших аэроснимках (ортофотопланах) потоком тайлов.
+
+    python largeimage.py ortho.tif --output results/
+
+Снимок читается окнами (rasterio/GDAL или memmap для несжатого TIFF),
+перекрывающиеся тайлы идут в модель "aerial" батчами по рядам, детекции
+(в том числе OBB) сливаются на стыках соседних рядов и сразу пишутся в файл,
+параллельно собирается уменьшенное превью с отрисованными детекциями. В
+памяти одновременно – один ряд тайлов, превью и детекции на стыке, поэтому
+при оконном чтении расход памяти не зависит от размера снимка.
+
+Без rasterio PNG, JPEG и сжатые TIFF оконно не читаются: такой снимок
+загружается целиком, и только если он не больше large_max_whole_pixels
+пикселей – более крупные отклоняются с просьбой установить rasterio.
+"""
+import argparse
+import os
+from itertools import groupby
+
+import cv2
+import numpy as np
+
+import config
+from detections import Detections, merge_overlapping_cut
+from export import DetectionExporter
+from models import get_model
+from render import Renderer
+from tiling import crop_detections, place_detections, tile_grid
+
+
+def _to_bgr8(data, channels_last=True):
+    # окно снимка → BGR uint8: серый (и серый с альфой)/RGB/RGBA, 16-битные
+    # данные сжимаются до 8 бит
+    if not channels_last:
+        data = np.moveaxis(data, 0, -1)
+    if data.dtype == np.uint16:
+        data = (data >> 8).astype(np.uint8)
+    elif data.dtype != np.uint8:
+        data = np.clip(data, 0, 255).astype(np.uint8)
+    if data.ndim == 2 or data.shape[2] < 3:
+        # 1 канал – серый, 2 – серый и альфа: берётся первый
+        gray = data if data.ndim == 2 else data[:, :, 0]
+        return cv2.cvtColor(np.ascontiguousarray(gray), cv2.COLOR_GRAY2BGR)
+    # RGBA и многоканальные снимки – первые три канала
+    return cv2.cvtColor(np.ascontiguousarray(data[:, :, :3]), cv2.COLOR_RGB2BGR)
+
+
+class RasterioReader:
+    """Оконное чтение через GDAL (GeoTIFF, BigTIFF, JPEG2000, PNG, JPEG)."""
+
+    def __init__(self, path):
+        import rasterio
+        from rasterio.windows import Window
+        self._window = Window
+        self.dataset = rasterio.open(path)
+        self.width = self.dataset.width
+        self.height = self.dataset.height
+
+    def read(self, x, y, w, h):
+        bands = min(self.dataset.count, 3)
+        data = self.dataset.read(list(range(1, bands + 1)), window=self._window(x, y, w, h))
+        return _to_bgr8(data, channels_last=False)
+
+    def close(self):
+        self.dataset.close()
+
+
+class MemmapReader:
+    """
+    Несжатый TIFF отображается в память (tifffile), окна читаются срезами.
+    Каналы – чередующиеся (YXS) или отдельными плоскостями (SYX, planar).
+    """
+
+    def __init__(self, path):
+        import tifffile
+        with tifffile.TiffFile(path) as tif:
+            axes = tif.series[0].axes
+        self.array = tifffile.memmap(path, mode="r")
+        if axes not in ("YX", "YXS", "SYX") or len(axes) != self.array.ndim:
+            # многостраничные, объёмные и прочие раскладки – через другие читатели
+            raise ValueError(f"Неподдерживаемая раскладка TIFF: {axes}")
+        self.planar = axes == "SYX"
+        if self.planar:
+            self.height, self.width = self.array.shape[1:3]
+        else:
+            self.height, self.width = self.array.shape[:2]
+
+    def read(self, x, y, w, h):
+        if self.planar:
+            # из плоскостей читаются только нужные (не больше трёх)
+            return _to_bgr8(np.asarray(self.array[:3, y:y + h, x:x + w]), channels_last=False)
+        return _to_bgr8(np.asarray(self.array[y:y + h, x:x + w]))
+
+    def close(self):
+        del self.array
+
+
+class ImageReader:
+    """
+    Запасной вариант без rasterio/tifffile: cv2 загружает снимок целиком.
+    Память тогда пропорциональна размеру снимка, поэтому снимки больше
+    max_pixels (по заголовку файла, до загрузки) не открываются.
+    """
+
+    def __init__(self, path, max_pixels=None):
+        max_pixels = config.get("large_max_whole_pixels") if max_pixels is None else max_pixels
+        size = _header_size(path)
+        if size is not None and max_pixels and size[0] * size[1] > max_pixels:
+            raise ValueError(
+                f"Снимок {size[0]}×{size[1]} слишком велик, чтобы загружать его целиком "
+                f"(предел large_max_whole_pixels = {max_pixels}). Установите rasterio "
+                f"для оконного чтения или сохраните снимок несжатым TIFF.")
+        self.image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if self.image is None:
+            raise ValueError("Не удалось открыть изображение.")
+        self.height, self.width = self.image.shape[:2]
+
+    def read(self, x, y, w, h):
+        return self.image[y:y + h, x:x + w]
+
+    def close(self):
+        self.image = None
+
+
+def _header_size(path):
+    # размер из заголовка: PIL открывает файл лениво, пиксели не читаются
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def open_image(path):
+    """Подобрать оконный читатель для файла: rasterio → memmap TIFF → cv2 целиком."""
+    try:
+        return RasterioReader(path)
+    except ImportError:
+        pass
+    if os.path.splitext(path)[1].lower() in (".tif", ".tiff"):
+        try:
+            return MemmapReader(path)
+        except (ImportError, ValueError):
+            # tifffile нет или TIFF сжат – отображение в память невозможно
+            pass
+    return ImageReader(path)
+
+
+def process_large_image(path, output_dir=None, tile_size=None, overlap=None, batch_size=None,
+                        preview_size=None, on_progress=None, stop_event=None, mode="aerial",
+                        export_format="jsonl", write_preview=True):
+    """
+    Обработать большой снимок потоком тайлов.
+
+    :param path: Файл снимка (TIFF/PNG/JPEG).
+    :param output_dir: Папка результатов (по умолчанию Downloads).
+    :param tile_size: Сторона тайла в пикселях снимка.
+    :param overlap: Доля перекрытия тайлов.
+    :param batch_size: Тайлов в одном вызове модели.
+    :param preview_size: Длинная сторона превью.
+    :param on_progress: Колбэк (done, total) по числу тайлов.
+    :param stop_event: threading.Event для досрочной остановки.
+    :param export_format: Формат файла детекций ("jsonl", "parquet") или None – не писать.
+    :param write_preview: Собирать и сохранять превью с детекциями.
+    :return: (путь к детекциям, путь к превью, число детекций); пути не
+             записанных файлов – None.
+    """
+    tile_size = tile_size or config.get("large_tile_size")
+    overlap = config.get("large_tile_overlap") if overlap is None else overlap
+    batch_size = batch_size or config.get("large_batch_size")
+    preview_size = preview_size or config.get("large_preview_size")
+    merge_threshold = config.get("tile_merge_threshold")
+    output_dir = output_dir or os.path.join(os.path.expanduser("~"), "Downloads")
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(path))[0]
+    detections_path = (os.path.join(output_dir, f"{base}_detections.{export_format}")
+                       if export_format else None)
+    preview_path = os.path.join(output_dir, f"{base}_preview.jpg") if write_preview else None
+
+    model = get_model(mode)
+    reader = open_image(path)
+    try:
+        width, height = reader.width, reader.height
+        tile, origins = tile_grid(width, height, tile_size, overlap)
+        tile_w, tile_h = min(tile, width), min(tile, height)
+        # тайлы идут рядами сверху вниз
+        rows = [(y, [x for x, _ in group]) for y, group in groupby(origins, key=lambda o: o[1])]
+        total = len(origins)
+
+        scale = min(1.0, preview_size / max(width, height))
+        preview = None
+        if preview_path:
+            preview = np.zeros((max(1, round(height * scale)), max(1, round(width * scale)), 3),
+                               dtype=np.uint8)
+        renderer = Renderer((0, 0, 255), thickness=1, font_scale=0.35)
+        found = 0
+        done = 0
+        carry = None
+        carry_cut = np.zeros(0, dtype=bool)
+
+        exporter = DetectionExporter(detections_path) if detections_path else None
+        try:
+            def emit(dets):
+                nonlocal found
+                if not len(dets):
+                    return
+                found += len(dets)
+                if exporter is not None:
+                    exporter.write(dets.stamped(0, None))
+                if preview is not None:
+                    renderer.render(preview, dets.scaled(scale, scale))
+
+            for row, (y, xs) in enumerate(rows):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                band, cuts = [], [carry_cut]
+                for start in range(0, len(xs), batch_size):
+                    crops, offsets = [], []
+                    for x in xs[start:start + batch_size]:
+                        crop = reader.read(x, y, tile_w, tile_h)
+                        crops.append(crop)
+                        offsets.append((x, y))
+                        if preview is None:
+                            continue
+                        # превью: уменьшенный тайл на своё место
+                        px1, py1 = round(x * scale), round(y * scale)
+                        px2 = min(round((x + tile_w) * scale), preview.shape[1])
+                        py2 = min(round((y + tile_h) * scale), preview.shape[0])
+                        if px2 > px1 and py2 > py1:
+                            preview[py1:py2, px1:px2] = cv2.resize(
+                                crop, (px2 - px1, py2 - py1), interpolation=cv2.INTER_AREA)
+                    # сливается весь ряд сразу: флаги обрезки краем тайла нужны и на
+                    # стыке с предыдущим рядом
+                    dets, cut = place_detections(crop_detections(model, crops, tile_size),
+                                                 offsets, sizes=[c.shape[1::-1] for c in crops],
+                                                 frame_size=(width, height))
+                    band.append(dets)
+                    cuts.append(cut)
+                    done += len(crops)
+                    if on_progress is not None:
+                        on_progress(done, total)
+
+                # стыки внутри ряда и с предыдущим рядом; всё, что целиком выше
+                # следующего ряда, уже ни с чем не пересечётся – пишем и забываем
+                merged, cut = merge_overlapping_cut(Detections.concat([carry] + band),
+                                                    merge_threshold, np.concatenate(cuts))
+                next_top = rows[row + 1][0] if row + 1 < len(rows) else height
+                final = merged.xyxy[:, 3] < next_top
+                emit(merged.select(final))
+                carry, carry_cut = merged.select(~final), cut[~final]
+            if carry is not None:
+                emit(carry)
+        finally:
+            if exporter is not None:
+                exporter.close()
+    finally:
+        reader.close()
+
+    if preview is not None:
+        cv2.imwrite(preview_path, preview)
+    return detections_path, preview_path, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--output", help="папка результатов (по умолчанию Downloads)")
+    parser.add_argument("--tile", type=int, default=None)
+    parser.add_argument("--overlap", type=float, default=None)
+    parser.add_argument("--batch", type=int, default=None)
+    parser.add_argument("--preview", type=int, default=None, help="длинная сторона превью")
+    args = parser.parse_args(argv)
+
+    def on_progress(done, total):
+        print(f"\rТайлы: {done}/{total}", end="", flush=True)
+
+    detections, preview, found = process_large_image(
+        args.path, args.output, args.tile, args.overlap, args.batch, args.preview,
+        on_progress=on_progress)
+    print(f"\nНайдено объектов: {found}\nДетекции: {detections}\nПревью: {preview}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+# Границы корзин гистограмм в миллисекундах (примерно логарифмическая шкала)
+BUCKETS_MS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+# Стадии живого захвата в порядке прохождения кадра
+STAGES = (
+    "capture",     # чтение кадра из источника
+    "queue_wait",  # ожидание в cap_queue до начала обработки
+    "infer",       # запуск детектора (с предобработкой)
+    "track",       # промежуточный кадр: прогноз трекера
+    "render",      # ресайз под окно и отрисовка
+    "display",     # поток показа: масштаб и RGB в буфер окна
+    "present",     # от готового буфера до вывода в окне (пробуждение Tk, темп)
+    "end_to_end",  # от захвата до показа
+)
+
+# Счётчики: вытеснения из очередей "последнего кадра", кадры без детектора
+# (пропуск по интервалу), кадры без изменений (ChangeGate) и неудачные чтения
+# источника
+COUNTERS = ("captured", "capture_failed", "dropped_capture_queue", "skipped",
+            "unchanged", "processed", "dropped_output_queue", "displayed")
+
+
+class RollingHistogram:
+    """
+    Скользящее окно последних window замеров.
+
+    Добавление – append в deque, без блокировок и сортировок; перцентили и
+    корзины считаются только при snapshot().
+    """
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.total += 1
+
+    def snapshot(self):
+        data = sorted(s * 1000 for s in list(self._samples))
+        if not data:
+            return {"count": 0, "total": self.total}
+
+        def percentile(p):
+            return data[min(len(data) - 1, int(p * len(data)))]
+
+        buckets = [0] * (len(BUCKETS_MS) + 1)
+        for value in data:
+            buckets[bisect.bisect_left(BUCKETS_MS, value)] += 1
+        return {
+            "count": len(data),
+            "total": self.total,
+            "mean_ms": sum(data) / len(data),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": data[-1],
+            "buckets": buckets,
+        }
+
+
+class PipelineMetrics:
+    """
+    Инструментирование живого захвата: длительности стадий и счётчики сбросов.
+
+    VideoProcessor вызывает методы только если ему передан объект метрик,
+    поэтому с выключенным профилированием накладных расходов нет – остаётся
+    одна проверка на None на стадию.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.started = time.monotonic()
+        self.histograms = {name: RollingHistogram(window) for name in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+        # время захвата кадров, ожидающих показа: id(буфер) → monotonic
+        self._pending = {}
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].add(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def frame_ready(self, frame, captured_at):
+        """Кадр ушёл в proc_queue – запомнить время захвата до показа."""
+        self._pending[id(frame)] = captured_at
+
+    def frame_dropped(self, frame):
+        self._pending.pop(id(frame), None)
+
+    def take_capture_time(self, frame):
+        """Кадр скопирован для показа и возвращается в пул – забрать время его захвата."""
+        return self._pending.pop(id(frame), None)
+
+    def frame_shown(self, captured_at, shown_at=None):
+        self.count("displayed")
+        if captured_at is not None:
+            shown_at = time.monotonic() if shown_at is None else shown_at
+            self.observe("end_to_end", shown_at - captured_at)
+
+    def frame_displayed(self, frame, shown_at=None):
+        self.frame_shown(self.take_capture_time(frame), shown_at)
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "elapsed_s": elapsed,
+            "counters": counters,
+            "rates": {
+                "capture_fps": counters["captured"] / elapsed,
+                "process_fps": counters["processed"] / elapsed,
+                "display_fps": counters["displayed"] / elapsed,
+            },
+            "stages": {name: h.snapshot() for name, h in self.histograms.items()},
+        }
+
+    def describe(self, snapshot=None):
+        """Короткая сводка для HUD и лога."""
+        s = snapshot or self.snapshot()
+        lines = ["к/с: захват {capture_fps:.1f}, обработка {process_fps:.1f}, "
+                 "показ {display_fps:.1f}".format(**s["rates"])]
+        stages = []
+        for name in STAGES:
+            h = s["stages"][name]
+            if h["count"]:
+                stages.append(f"{name} {h['p50_ms']:.0f}/{h['p95_ms']:.0f}")
+        lines.append("мс p50/p95: " + ", ".join(stages))
+        c = s["counters"]
+        lines.append(f"сброшено: захват {c['dropped_capture_queue']}, "
+                     f"вывод {c['dropped_output_queue']}, без детектора {c['skipped']}, "
+                     f"без изменений {c['unchanged']}")
+        return lines
+
+
+class MetricsReporter:
+    """
+    Фоновый поток: раз в interval секунд снимок метрик дописывается строкой
+    JSON в path, без path – сводка печатается в stderr.
+    """
+
+    def __init__(self, metrics, interval=5.0, path=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.path = path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def report(self):
+        snapshot = self.metrics.snapshot()
+        if self.path:
+            snapshot["time"] = time.time()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+        else:
+            print(" | ".join(self.metrics.describe(snapshot)), file=sys.stderr)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        self.report()
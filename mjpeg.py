@@ -0,0 +1,214 @@
+import http.client
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+import config
+
+# Уменьшенное декодирование JPEG: libjpeg сразу отдаёт кадр в 1/2, 1/4, 1/8
+_REDUCED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class StreamStats:
+    """Частота кадров и битрейт потока по скользящему окну в window секунд."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def add(self, size, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._events.append((now, size))
+            cutoff = now - self.window
+            while self._events and self._events[0][0] < cutoff:
+                self._events.popleft()
+
+    def rates(self):
+        with self._lock:
+            events = list(self._events)
+        if len(events) < 2:
+            return 0.0, 0.0
+        span = max(events[-1][0] - events[0][0], 1e-6)
+        fps = (len(events) - 1) / span
+        bitrate = sum(size for _, size in events[1:]) * 8 / span
+        return fps, bitrate
+
+
+class MJPEGReader:
+    """
+    Чтение MJPEG-потока (IP Webcam и т.п.) по HTTP без буферизации OpenCV.
+
+    Фоновый поток сам разбирает multipart/x-mixed-replace и хранит только
+    последний полный JPEG: если потребитель не успевает, старые кадры
+    выбрасываются, не декодируясь. read() декодирует самый свежий кадр,
+    при scale 2/4/8 – сразу в уменьшенном размере. При обрыве соединение
+    восстанавливается с нарастающей паузой.
+    """
+
+    def __init__(self, url, scale=None, timeout=None, backoff=None, max_backoff=None):
+        self.url = url
+        self.scale = scale or config.get("mjpeg_scale")
+        if self.scale not in _REDUCED:
+            raise ValueError("scale должен быть 1, 2, 4 или 8")
+        self.timeout = config.get("mjpeg_timeout") if timeout is None else timeout
+        self.backoff = config.get("mjpeg_backoff") if backoff is None else backoff
+        self.max_backoff = config.get("mjpeg_max_backoff") if max_backoff is None else max_backoff
+        self.stream = StreamStats()
+        self.received = 0
+        self.decoded = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.connected = False
+        self.error = None
+        self._jpeg = None
+        self._seq = 0
+        self._read_seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._conn = None
+        self._sock = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = self.backoff
+        while not self._stop.is_set():
+            try:
+                self._stream()
+                delay = self.backoff
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.error = str(e)
+            finally:
+                self.connected = False
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self._sock = None
+            if self._stop.wait(delay):
+                break
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_backoff)
+
+    def _stream(self):
+        parsed = urlparse(self.url)
+        conn_class = (http.client.HTTPSConnection if parsed.scheme == "https"
+                      else http.client.HTTPConnection)
+        self._conn = conn_class(parsed.hostname, parsed.port, timeout=self.timeout)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        self._conn.request("GET", path)
+        # у потока без Content-Length getresponse() отцепляет сокет от
+        # соединения (conn.sock = None) – для release() он запоминается здесь
+        self._sock = self._conn.sock
+        response = self._conn.getresponse()
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}")
+        content_type = response.getheader("Content-Type", "")
+        boundary = None
+        for param in content_type.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "boundary":
+                boundary = value.strip('"')
+        if not boundary:
+            raise ValueError(f"Не multipart-поток: {content_type}")
+        if not boundary.startswith("--"):
+            boundary = "--" + boundary
+        self.connected = True
+        self.error = None
+        self._parse(response, boundary.encode("latin-1"))
+
+    def _parse(self, response, boundary):
+        # свой буфер вместо readline: тело JPEG бинарное, а у части серверов
+        # нет Content-Length – тогда кадр заканчивается на следующей границе
+        buf = bytearray()
+        read = response.read1 if hasattr(response, "read1") else response.read
+        while not self._stop.is_set():
+            start = buf.find(boundary)
+            if start >= 0:
+                header_end, sep = buf.find(b"\r\n\r\n", start), 4
+                if header_end < 0:
+                    header_end, sep = buf.find(b"\n\n", start), 2
+                if header_end >= 0:
+                    length = None
+                    for line in bytes(buf[start:header_end]).decode("latin-1").splitlines()[1:]:
+                        key, _, value = line.partition(":")
+                        if key.strip().lower() == "content-length":
+                            length = int(value)
+                    body = header_end + sep
+                    if length is not None and len(buf) >= body + length:
+                        self._publish(bytes(buf[body:body + length]))
+                        del buf[:body + length]
+                        continue
+                    if length is None:
+                        end = buf.find(boundary, body)
+                        if end >= 0:
+                            self._publish(bytes(buf[body:end]).rstrip(b"\r\n"))
+                            del buf[:end]
+                            continue
+            elif len(buf) > len(boundary):
+                # до границы – мусор (или хвост предыдущей части), он не нужен
+                del buf[:len(buf) - len(boundary)]
+            chunk = read(65536)
+            if not chunk:
+                raise ValueError("Поток закрыт сервером")
+            buf += chunk
+
+    def _publish(self, jpeg):
+        self.stream.add(len(jpeg))
+        with self._cond:
+            if self._jpeg is not None and self._read_seq < self._seq:
+                # предыдущий кадр так и не прочитан – он устарел
+                self.dropped += 1
+            self._jpeg = jpeg
+            self._seq += 1
+            self.received += 1
+            self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """Декодировать самый свежий ещё не прочитанный кадр; None – нового кадра нет."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self._stop.is_set(),
+                                       timeout):
+                return None
+            if self._stop.is_set():
+                return None
+            jpeg, self._read_seq = self._jpeg, self._seq
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), _REDUCED[self.scale])
+        if frame is not None:
+            self.decoded += 1
+        return frame
+
+    def stats(self):
+        fps, bitrate = self.stream.rates()
+        return {"stream_fps": fps, "bitrate_kbps": bitrate / 1000, "received": self.received,
+                "decoded": self.decoded, "dropped": self.dropped,
+                "reconnects": self.reconnects, "connected": self.connected,
+                "error": self.error}
+
+    def describe(self):
+        s = self.stats()
+        if not s["connected"]:
+            return f"поток: нет соединения ({s['error'] or 'подключение'}), переподключений {s['reconnects']}"
+        return (f"поток: {s['stream_fps']:.1f} к/с, {s['bitrate_kbps']:.0f} кбит/с, "
+                f"пропущено устаревших {s['dropped']}")
+
+    def release(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        sock = self._sock
+        if sock is not None:
+            # прерываем блокирующее чтение потока
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
+        self._thread.join(timeout=self.timeout)
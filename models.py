@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import config
+
+# Имена моделей → ключ настройки с путём к весам
+MODEL_WEIGHTS = {
+    "normal": "normal_weights",
+    "aerial": "aerial_weights",
+    # лёгкая модель-генератор кандидатов для каскада (cascade.py)
+    "proposal": "proposal_weights",
+}
+
+
+class ModelRegistry:
+    """
+    Ленивый реестр моделей YOLO.
+
+    Модель загружается при первом обращении, путь к весам берётся из config
+    (или переменной окружения). Загруженные модели хранятся в LRU-кэше
+    ограниченного размера: при переполнении вытесняется давно не
+    использовавшаяся модель.
+    """
+
+    def __init__(self, max_models=None):
+        self.max_models = max(1, max_models or config.get("model_cache_size"))
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # отдельная блокировка на каждое имя, чтобы две загрузки одной модели
+        # не шли параллельно, а загрузка разных моделей не мешала друг другу
+        self._load_locks = {}
+        # имя → (путь к весам, формат экспорта) загруженной модели или готовый
+        # отпечаток; хэш весов считается только при первом обращении к кэшу
+        # детекций (detcache.py)
+        self._fingerprints = {}
+
+    def weights_path(self, name):
+        if name not in MODEL_WEIGHTS:
+            raise KeyError(f"Неизвестная модель: {name}")
+        return config.get(MODEL_WEIGHTS[name])
+
+    def _load(self, name):
+        from ultralytics import YOLO
+        from cpu_export import select_artifact
+        weights = self.weights_path(name)
+        # без GPU – сохранённый рядом с весами экспорт ONNX/OpenVINO (см. cpu_export.py)
+        artifact = select_artifact(weights)
+        # экспорт (особенно INT8) даёт немного другие детекции, чем .pt
+        suffix = ("" if artifact is None else
+                  f":{artifact.get('format')}:{int(bool(artifact.get('int8')))}")
+        with self._lock:
+            self._fingerprints[name] = (weights, suffix)
+        if artifact is not None:
+            return YOLO(artifact["path"], task=artifact["task"])
+        return YOLO(weights)
+
+    def get(self, name):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+            model = self._load(name)
+            with self._lock:
+                self._models[name] = model
+                self._models.move_to_end(name)
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+            return model
+
+    def register(self, name, model):
+        """Подставить готовый объект модели (например, заглушку для бенчмарка)."""
+        with self._lock:
+            self._models[name] = model
+            self._models.move_to_end(name)
+            self._fingerprints[name] = f"{name}:custom:{type(model).__qualname__}"
+
+    def fingerprint(self, name):
+        """Отпечаток модели: имя, хэш файла весов и формат экспорта (модель загружается)."""
+        self.get(name)
+        with self._lock:
+            fingerprint = self._fingerprints[name]
+        if isinstance(fingerprint, str):
+            return fingerprint
+        weights, suffix = fingerprint
+        return f"{name}:{_file_digest(weights)}{suffix}"
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def warmup(self, name):
+        """Загрузить модель в фоновом потоке, не блокируя вызывающий (UI) поток."""
+        thread = threading.Thread(target=self.get, args=(name,), daemon=True)
+        thread.start()
+        return thread
+
+    def evict(self, name=None):
+        with self._lock:
+            if name is None:
+                self._models.clear()
+            else:
+                self._models.pop(name, None)
+
+
+# (путь, размер, mtime) → хэш файла: каждый файл весов читается не больше раза
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _file_digest(path):
+    # веса по имени (скачиваются ultralytics) – отпечатком служит само имя
+    if not os.path.isfile(path):
+        return path
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if key in _digests:
+            return _digests[key]
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+registry = ModelRegistry()
+
+
+def get_model(name):
+    return registry.get(name)
+
+
+def warmup(name):
+    return registry.warmup(name)
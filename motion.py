@@ -0,0 +1,187 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import config
+
+# Состояния кадра относительно опорного
+SAME = "same"        # изменений нет – детекции берутся из кэша
+REGIONS = "regions"  # изменилась часть кадра – детекция только в этих областях
+FULL = "full"        # изменился весь кадр (или слишком много областей)
+
+
+def dhash(gray):
+    """64-битный разностный хэш уменьшенного серого кадра."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _merge_boxes(boxes):
+    # объединение пересекающихся прямоугольников до неподвижной точки
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]),
+                                max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+class ChangeGate:
+    """
+    Дешёвая проверка изменений кадра перед инференсом.
+
+    Кадр уменьшается до width пикселей по ширине (серый), разность с опорным
+    кадром порогуется, изменённые пиксели собираются в области. Опорный
+    кадр (последний с детекцией) обновляется только через
+    commit(), поэтому медленный дрейф накапливается и в итоге тоже считается
+    изменением. Отдельно is_static() сравнивает кадр с последним показанным:
+    такой кадр можно не обрабатывать и не выводить вовсе.
+    Детекции полных кадров запоминаются в маленьком LRU по перцептивному
+    хэшу вместе с серой миниатюрой кадра: при возврате к уже виденному экрану
+    модель не запускается. Хэш – только предварительный отбор, запись
+    используется, если миниатюра проходит тот же порог разности, что и SAME.
+    """
+
+    def __init__(self, width=None, threshold=None, still_fraction=None, full_fraction=None,
+                 padding=None, max_regions=None, cache_size=None, hash_distance=None):
+        self.width = width or config.get("gate_width")
+        self.threshold = config.get("gate_threshold") if threshold is None else threshold
+        # доля изменённых пикселей, ниже которой кадр считается неизменным
+        self.still_fraction = (config.get("gate_still_fraction") if still_fraction is None
+                               else still_fraction)
+        # доля площади областей, выше которой дешевле обработать кадр целиком
+        self.full_fraction = (config.get("gate_full_fraction") if full_fraction is None
+                              else full_fraction)
+        # запас вокруг области (в пикселях уменьшенного кадра): объект мог уйти за её край
+        self.padding = config.get("gate_padding") if padding is None else padding
+        self.max_regions = max_regions or config.get("gate_max_regions")
+        self.cache_size = config.get("gate_cache_size") if cache_size is None else cache_size
+        self.hash_distance = (config.get("gate_hash_distance") if hash_distance is None
+                              else hash_distance)
+        self._reference = None
+        self._shown = None
+        self._gray = None
+        self._small = None
+        self._diff = None
+        self._hash = None
+        self._cache = OrderedDict()
+        self.counts = {SAME: 0, REGIONS: 0, FULL: 0, "cache_hits": 0}
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        self._small = cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        self._gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        self._hash = None
+        return w / size[0], h / size[1]
+
+    def check(self, frame):
+        """Сравнить кадр с опорным: (SAME | REGIONS | FULL, области xyxy в координатах кадра)."""
+        sx, sy = self._prepare(frame)
+        reference = self._reference
+        if reference is None or reference.shape != self._gray.shape:
+            self.counts[FULL] += 1
+            return FULL, []
+
+        if self._unchanged(reference):
+            self.counts[SAME] += 1
+            return SAME, []
+
+        _, mask = cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=max(1, self.padding))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        boxes = [(x, y, x + w, y + h) for x, y, w, h, _ in stats[1:count]]
+        boxes = _merge_boxes(boxes)
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in boxes)
+        if len(boxes) > self.max_regions or area > self.full_fraction * mask.size:
+            self.counts[FULL] += 1
+            return FULL, []
+
+        self.counts[REGIONS] += 1
+        frame_h, frame_w = frame.shape[:2]
+        regions = [(int(x1 * sx), int(y1 * sy), min(int(np.ceil(x2 * sx)), frame_w),
+                    min(int(np.ceil(y2 * sy)), frame_h)) for x1, y1, x2, y2 in boxes]
+        return REGIONS, regions
+
+    def _unchanged(self, reference):
+        if reference is None or reference.shape != self._gray.shape:
+            return False
+        self._diff = cv2.absdiff(self._gray, reference, dst=self._diff)
+        _, mask = cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) <= self.still_fraction * mask.size
+
+    def is_static(self):
+        """Проверенный кадр не отличается от последнего показанного (см. mark_shown)."""
+        return self._gray is not None and self._unchanged(self._shown)
+
+    def mark_shown(self):
+        if self._gray is not None:
+            self._shown = self._gray.copy()
+
+    def commit(self, dets=None):
+        """
+        Сделать проверенный кадр опорным. dets – детекции полного кадра,
+        запоминаются в кэше по хэшу кадра.
+        """
+        if self._gray is None:
+            return
+        if self._reference is None or self._reference.shape != self._gray.shape:
+            self._reference = self._gray.copy()
+        else:
+            np.copyto(self._reference, self._gray)
+        if dets is not None and self.cache_size:
+            key = self._current_hash()
+            self._cache[key] = (self._gray.copy(), dets)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _current_hash(self):
+        if self._hash is None:
+            self._hash = dhash(self._gray)
+        return self._hash
+
+    def cached(self):
+        """Детекции ранее виденного почти такого же кадра или None."""
+        if not self._cache or self._gray is None:
+            return None
+        key = self._current_hash()
+        for cached_key in reversed(self._cache):
+            if bin(cached_key ^ key).count("1") > self.hash_distance:
+                continue
+            gray, dets = self._cache[cached_key]
+            # близкий хэш бывает и у кадров с другим содержимым – сверяем пиксели
+            if self._unchanged(gray):
+                self._cache.move_to_end(cached_key)
+                self.counts["cache_hits"] += 1
+                return dets
+        return None
+
+    def reset(self):
+        self._reference = None
+        self._shown = None
+        self._cache.clear()
+
+
+def outside_regions(dets, regions):
+    """Маска детекций, центр которых не попадает ни в одну из областей."""
+    if not len(dets) or not regions:
+        return np.ones(len(dets), dtype=bool)
+    cx = (dets.xyxy[:, 0] + dets.xyxy[:, 2]) / 2
+    cy = (dets.xyxy[:, 1] + dets.xyxy[:, 3]) / 2
+    r = np.asarray(regions, dtype=np.float32)
+    inside = ((cx[:, None] >= r[None, :, 0]) & (cx[:, None] < r[None, :, 2]) &
+              (cy[:, None] >= r[None, :, 1]) & (cy[:, None] < r[None, :, 3]))
+    return ~inside.any(axis=1)
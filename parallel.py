@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+import config
+from export import DetectionExporter, concat_exports
+from pipeline import VideoPipeline
+
+
+def split_segments(total, workers, min_length=None):
+    """
+    Разбить total кадров на не более чем workers отрезков [start, end).
+    Отрезки короче min_length не создаются: накладные расходы на процесс,
+    загрузку модели и склейку для них больше выигрыша.
+    """
+    min_length = min_length or config.get("video_min_segment")
+    count = max(1, min(workers, total // max(min_length, 1)))
+    bounds = [round(total * i / count) for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(count)]
+
+
+class SegmentReader:
+    """Обёртка над VideoCapture, читающая ровно кадры [start, end)."""
+
+    def __init__(self, path, start, end):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError("Не удалось открыть видеофайл.")
+        self.remaining = None if end is None else end - start
+        self._seek(path, start)
+
+    def _seek(self, path, start):
+        if start <= 0:
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == start:
+            return
+        # бэкенд не умеет точно позиционироваться – досчитываем кадры с начала,
+        # иначе кадры на стыке отрезков потеряются или задвоятся
+        self.cap.release()
+        self.cap = cv2.VideoCapture(path)
+        for _ in range(start):
+            if not self.cap.grab():
+                break
+
+    def read(self):
+        if self.remaining is not None and self.remaining <= 0:
+            return False, None
+        ret, frame = self.cap.read()
+        if ret and self.remaining is not None:
+            self.remaining -= 1
+        return ret, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT and self.remaining is not None:
+            return self.remaining
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+def init_worker(threads):
+    # процессы делят ядра между собой: без ограничения каждый займёт все
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def process_segment(path, start, end, part_path, detect, draw, batch_size,
+                    progress_queue, cancel_event, export_part=None):
+    """Обработать отрезок видео в отдельном процессе и записать его в part_path."""
+    reader = SegmentReader(path, start, end)
+    fps = reader.get(cv2.CAP_PROP_FPS)
+    size = (int(reader.get(cv2.CAP_PROP_FRAME_WIDTH)), int(reader.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    out = cv2.VideoWriter(part_path, cv2.VideoWriter.fourcc(*'mp4v'), fps, size)
+    exporter = DetectionExporter(export_part) if export_part else None
+
+    def on_progress(done, total, fps, frame):
+        progress_queue.put((start, done))
+
+    pipeline = VideoPipeline(reader, out, detect, draw, batch_size=batch_size,
+                             on_progress=on_progress, progress_interval=0.5,
+                             stop_event=cancel_event, exporter=exporter, first_index=start)
+    try:
+        return pipeline.run()
+    finally:
+        reader.release()
+        out.release()
+        if exporter is not None:
+            exporter.close()
+
+
+def _find_ffmpeg():
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def concat_parts(parts, output_path):
+    """
+    Склеить отрезки в один файл. Если доступен ffmpeg – без перекодирования
+    (concat demuxer), иначе кадры последовательно переписываются через OpenCV.
+    """
+    ffmpeg = _find_ffmpeg()
+    if ffmpeg:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+            for part in parts:
+                f.write("file '{}'\n".format(os.path.abspath(part).replace("'", "'\\''")))
+            list_path = f.name
+        try:
+            result = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat",
+                                     "-safe", "0", "-i", list_path, "-c", "copy", output_path],
+                                    capture_output=True)
+            if result.returncode == 0:
+                return
+        finally:
+            os.remove(list_path)
+
+    out = None
+    for part in parts:
+        cap = cv2.VideoCapture(part)
+        if out is None:
+            size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            out = cv2.VideoWriter(output_path, cv2.VideoWriter.fourcc(*'mp4v'),
+                                  cap.get(cv2.CAP_PROP_FPS), size)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    if out is not None:
+        out.release()
+
+
+def process_video_parallel(path, output_path, total, detect, draw, workers, batch_size=None,
+                           on_progress=None, stop_event=None, export_path=None):
+    """
+    Обработать видео отрезками в workers процессах и склеить результат.
+
+    У каждого процесса своя модель; detect и draw должны сериализоваться
+    pickle (функции уровня модуля или functools.partial от них).
+    Последний отрезок читается до конца файла: CAP_PROP_FRAME_COUNT у
+    некоторых контейнеров приблизителен. Возвращает output_path или None, если
+    обработку остановили через stop_event (отрезки не склеиваются).
+    """
+    segments = split_segments(total, workers)
+    segments[-1] = (segments[-1][0], None)
+    part_dir = tempfile.mkdtemp(prefix="rsao_parts_", dir=os.path.dirname(output_path) or None)
+    ext = os.path.splitext(output_path)[1] or ".mp4"
+    parts = [os.path.join(part_dir, f"part{i:04d}{ext}") for i in range(len(segments))]
+    export_parts = [None] * len(segments)
+    if export_path:
+        export_ext = os.path.splitext(export_path)[1]
+        export_parts = [os.path.join(part_dir, f"part{i:04d}{export_ext}")
+                        for i in range(len(segments))]
+    threads = max(1, (os.cpu_count() or 1) // len(segments))
+
+    ctx = multiprocessing.get_context("spawn")
+    manager = ctx.Manager()
+    try:
+        progress_queue = manager.Queue()
+        cancel_event = manager.Event()
+        done = {}
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=len(segments), mp_context=ctx,
+                                 initializer=init_worker, initargs=(threads,)) as pool:
+            futures = [pool.submit(process_segment, path, start, end, part, detect, draw,
+                                   batch_size, progress_queue, cancel_event, export_part)
+                       for (start, end), part, export_part in zip(segments, parts, export_parts)]
+            while not all(f.done() for f in futures):
+                if stop_event is not None and stop_event.is_set():
+                    cancel_event.set()
+                try:
+                    start, count = progress_queue.get(timeout=0.2)
+                    done[start] = count
+                except queue.Empty:
+                    pass
+                if on_progress:
+                    frames = sum(done.values())
+                    on_progress(frames, total, frames / max(time.perf_counter() - started, 1e-6), None)
+            counts = [f.result() for f in futures]
+
+        if on_progress:
+            frames = sum(counts)
+            on_progress(frames, total, frames / max(time.perf_counter() - started, 1e-6), None)
+        if stop_event is not None and stop_event.is_set():
+            return None
+        concat_parts(parts, output_path)
+        if export_path:
+            concat_exports(export_parts, export_path)
+    finally:
+        manager.shutdown()
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return output_path
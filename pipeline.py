@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+import cv2
+
+import config
+
+_END = object()
+
+
+class VideoPipeline:
+    """
+    Потоковая обработка видеофайла: декодер → батчевый инференс → кодировщик.
+
+    Декодер и кодировщик работают в отдельных потоках, инференс идёт батчами
+    по batch_size кадров на вызов модели. Между стадиями – ограниченные
+    очереди: если модель не успевает, декодер ждёт, а не копит кадры в памяти.
+
+    detect_batch(frames) -> список Detections, draw(frame, dets) -> кадр.
+    on_progress(done, total, fps, frame) вызывается из рабочего потока не чаще
+    progress_interval секунд; frame – последний обработанный кадр для превью.
+    Детекциям проставляются номер кадра (от first_index) и время в видео;
+    если задан exporter, они пишутся в него по порядку кадров.
+    """
+
+    def __init__(self, cap, writer, detect_batch, draw, batch_size=None, queue_size=None,
+                 on_progress=None, progress_interval=0.2, stop_event=None, exporter=None,
+                 first_index=0):
+        self.cap = cap
+        self.writer = writer
+        self.detect_batch = detect_batch
+        self.draw = draw
+        self.batch_size = max(1, batch_size or config.get("video_batch_size"))
+        queue_size = queue_size or config.get("video_queue_size")
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.exporter = exporter
+        self.first_index = first_index
+
+        self._decoded = queue.Queue(maxsize=max(queue_size, self.batch_size))
+        self._inferred = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        # внешний сигнал отмены (кнопка/закрытие окна)
+        self._cancel = stop_event or threading.Event()
+        self._error = None
+        self.frames_done = 0
+
+    def stop(self):
+        """Прервать обработку (например, при закрытии окна)."""
+        self._cancel.set()
+
+    def _stopped(self):
+        return self._stop.is_set() or self._cancel.is_set()
+
+    def _put(self, q, item):
+        # put с проверкой остановки, чтобы поток не завис на полной очереди
+        while not self._stopped():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stopped():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode_loop(self):
+        try:
+            while not self._stopped():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if not self._put(self._decoded, frame):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._decoded, _END)
+
+    def _encode_loop(self):
+        started = time.perf_counter()
+        last_report = 0.0
+        try:
+            while True:
+                item = self._get(self._inferred)
+                if item is _END:
+                    break
+                frame, dets = item
+                index = self.first_index + self.frames_done
+                dets.stamped(index, index / self.fps if self.fps else None)
+                if self.exporter is not None:
+                    self.exporter.write(dets)
+                frame = self.draw(frame, dets)
+                self.writer.write(frame)
+                self.frames_done += 1
+
+                now = time.perf_counter()
+                if self.on_progress and now - last_report >= self.progress_interval:
+                    last_report = now
+                    self.on_progress(self.frames_done, self.total,
+                                     self.frames_done / max(now - started, 1e-6), frame)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def run(self):
+        """Обработать видео целиком в вызывающем потоке. Возвращает число кадров."""
+        decoder = threading.Thread(target=self._decode_loop, daemon=True)
+        encoder = threading.Thread(target=self._encode_loop, daemon=True)
+        decoder.start()
+        encoder.start()
+        started = time.perf_counter()
+        try:
+            finished = False
+            while not finished and not self._stopped():
+                batch = []
+                while len(batch) < self.batch_size:
+                    # первый кадр батча ждём, остальные добираем без ожидания
+                    try:
+                        item = self._decoded.get(timeout=0.1) if not batch else \
+                            self._decoded.get_nowait()
+                    except queue.Empty:
+                        if batch or self._stopped():
+                            break
+                        continue
+                    if item is _END:
+                        finished = True
+                        break
+                    batch.append(item)
+                if batch:
+                    for frame, dets in zip(batch, self.detect_batch(batch)):
+                        if not self._put(self._inferred, (frame, dets)):
+                            break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._inferred, _END)
+            encoder.join()
+            self._stop.set()
+            decoder.join()
+
+        if self._error is not None:
+            raise self._error
+        if self.on_progress:
+            elapsed = time.perf_counter() - started
+            self.on_progress(self.frames_done, self.total,
+                             self.frames_done / max(elapsed, 1e-6), None)
+        return self.frames_done
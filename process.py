@@ -1,75 +1,174 @@
 import os
-import numpy as np
+import threading
 import cv2
-import torch
-from PIL import Image
-import pathlib
-from roboflow import Roboflow
-import tempfile
-
-from ultralytics import YOLO
-
-
-my_model = YOLO('C:\\Users\\warn\\Downloads\\40Epoch.pt')
-
-model_aerial = YOLO("yolo11x-obb.pt")
-
-def process_frame(frame, mode="normal"):
-    if mode == "aerial":
-        results = model_aerial(frame)
-
-        for result in results:
-            # result.obb.xyxyxyxy – список координат для каждого бокса
-            # result.obb.cls.int() – индексы классов, result.names – имена классов
-            # result.obb.conf – значения confidence для каждого бокса
-            for box, cls, conf in zip(result.obb.xyxyxyxy,
-                                      result.obb.cls.int().tolist(),
-                                      result.obb.conf):
-
-                class_name = result.names[cls]
-                pts = np.array(box).reshape((-1, 1, 2)).astype(np.int32)
-                cv2.polylines(frame, [pts], isClosed=True, color=(0, 0, 255), thickness=2)
-                x, y = pts[0][0]
-                cv2.putText(frame, f"{class_name}: {conf * 100:.2f}%", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+from functools import partial
+
+import config
+from models import get_model, registry
+from detcache import get_cache, frame_hash, make_key
+from detections import Detections
+from tiling import detect_tiled
+from cascade import detect_cascade
+from render import Renderer
+from pipeline import VideoPipeline
+from export import DetectionExporter
+from parallel import process_video_parallel, split_segments
+
+# у Renderer есть переиспользуемые буферы – свои экземпляры на каждый поток
+_renderers = threading.local()
+
+# Модели загружаются лениво через реестр (models.py) при первом обращении.
+_MODEL_ALIASES = {
+    "my_model": "normal",
+    "model_aerial": "aerial",
+}
+
+
+def __getattr__(name):
+    # обратная совместимость: process.my_model / process.model_aerial
+    if name in _MODEL_ALIASES:
+        return get_model(_MODEL_ALIASES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def draw_detections(frame, dets, color):
+    """Нарисовать боксы (или OBB-полигоны) с подписями класса и confidence."""
+    renderers = getattr(_renderers, "by_color", None)
+    if renderers is None:
+        renderers = _renderers.by_color = {}
+    renderer = renderers.get(color)
+    if renderer is None:
+        renderer = renderers[color] = Renderer(color)
+    return renderer.render(frame, dets)
+
+
+def _cache_params(tiled, cascade):
+    # всё, от чего зависят детекции кадра, кроме самой модели
+    params = {"tiled": tiled, "cascade": cascade}
+    if tiled and not cascade:
+        params.update({k: config.get(k) for k in ("tile_size", "tile_overlap", "max_tiles",
+                                                  "tile_full_frame", "tile_merge_threshold")})
+    if cascade:
+        params.update({k: config.get(k) for k in config.DEFAULTS if k.startswith("cascade_")})
+        params["tile_merge_threshold"] = config.get("tile_merge_threshold")
+        if params["cascade_proposer"] == "model":
+            params["proposal"] = registry.fingerprint("proposal")
+    return params
+
+
+def detect_frame(frame, mode="normal", tiled=False, frame_index=None, timestamp=None,
+                 cascade=False, cache=True):
+    """
+    Детекция без отрисовки – компаньон process_frame.
 
-        return frame
+    Возвращает Detections (массивы NumPy в координатах frame) с номером кадра
+    и временем; тензоры модели переносятся на CPU целиком, а не по боксу.
+    cascade – модель запускается только на вырезках вокруг дешёвых кандидатов.
+    cache – сначала искать детекции этого кадра в кэше на диске (detcache.py).
+    """
+    name = "aerial" if mode == "aerial" else "normal"
+    model = get_model(name)
+    store = get_cache() if cache else None
+    if store is not None:
+        model_id = registry.fingerprint(name)
+        key = make_key(frame_hash(frame), model_id, _cache_params(tiled, cascade))
+        dets = store.get(key, model_id)
+        if dets is not None:
+            return dets.stamped(frame_index, timestamp)
+    if cascade:
+        dets = detect_cascade(frame, model)
+    elif tiled:
+        dets = detect_tiled(frame, model)
     else:
-        results = my_model(frame)
-
-        for result in results:
-            boxes = result.boxes
-            for xyxy, cls_id, conf in zip(
-                    boxes.xyxy,
-                    boxes.cls.int().tolist(),
-                    boxes.conf
-            ):
-                x1, y1, x2, y2 = map(int, xyxy)
+        dets = Detections.from_result(model(frame, verbose=False)[0])
+    if store is not None:
+        store.put(key, dets, model_id)
+    return dets.stamped(frame_index, timestamp)
 
-                cv2.rectangle(frame, (x1, y1), (x2, y2),
-                              color=(255, 0, 0), thickness=2) #ili red 0,0,255
 
-                class_name = result.names[cls_id]
-                label = f"{class_name}: {conf * 100:.2f}%"
-                cv2.putText(frame, label,
-                            (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, (255, 0, 0), 2)
+def process_frame(frame, mode="normal", tiled=False, cascade=False):
+    # tiled: полный кадр режется на перекрывающиеся тайлы – мелкие объекты не теряются;
+    # cascade: тяжёлая модель только вокруг кандидатов, пустое небо не обрабатывается
+    dets = detect_frame(frame, mode, tiled=tiled, cascade=cascade)
+    return draw_detections(frame, dets, (0, 0, 255) if mode == "aerial" else (255, 0, 0))
 
-        return frame
 
-
-def process_video(videoPath, mode="normal"):
+def detect_batch(frames, mode="normal", cache=True, imgsz=None):
+    """
+    Детекция для списка кадров одним вызовом модели; с cache в модель идут
+    только кадры, которых нет в кэше детекций. imgsz – размер входа модели
+    (по умолчанию – её собственный).
+    """
+    name = "aerial" if mode == "aerial" else "normal"
+    model = get_model(name)
+    kwargs = {"verbose": False}
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    store = get_cache() if cache else None
+    if store is None:
+        return [Detections.from_result(r) for r in model(frames, **kwargs)]
+    model_id = registry.fingerprint(name)
+    params = _cache_params(False, False)
+    if imgsz:
+        params["imgsz"] = imgsz
+    keys = [make_key(frame_hash(frame), model_id, params) for frame in frames]
+    results = store.get_many(keys, model_id)
+    missing = [i for i, dets in enumerate(results) if dets is None]
+    if missing:
+        fresh = [Detections.from_result(r)
+                 for r in model([frames[i] for i in missing], **kwargs)]
+        for i, dets in zip(missing, fresh):
+            results[i] = dets
+        store.put_many([(keys[i], dets) for i, dets in zip(missing, fresh)], model_id,
+                       fresh[0].names)
+    return results
+
+
+def _draw_video_frame(frame, dets):
+    return draw_detections(frame, dets, (0, 0, 255))
+
+
+def _skip_overlay(frame, dets):
+    return frame
+
+
+class _NullWriter:
+    # только детекции: кадры видео никуда не пишутся
+    def write(self, frame):
+        pass
+
+    def release(self):
+        pass
+
+
+def process_video(videoPath, mode="normal", batch_size=None, on_progress=None, stop_event=None,
+                  detect=None, workers=None, export_path=None, overlay=True, backend=None,
+                  output_path=None, write_video=True):
     """
     Полностью обрабатывает видеофайл:
-    - Считывает видео по кадрам.
-    - Обрабатывает каждый кадр с помощью модели (режим 'normal' или 'aerial'),
+    - Считывает видео по кадрам в отдельном потоке.
+    - Обрабатывает кадры батчами с помощью модели (режим 'normal' или 'aerial'),
       добавляя bounding box и процентное значение confidence.
-    - Сохраняет обработанное видео в папке Downloads.
+    - Сохраняет обработанное видео в папке Downloads или в output_path
+      (запись – в отдельном потоке).
 
     :param videoPath: Путь к исходному видеофайлу.
     :param mode: Режим обработки ('normal' или 'aerial').
-    :return: Путь к сохранённому обработанному видео.
+    :param batch_size: Кадров на один вызов модели (по умолчанию из config).
+    :param on_progress: Колбэк (done, total, fps, frame), вызывается из рабочего потока.
+    :param stop_event: threading.Event для досрочной остановки.
+    :param detect: Своя функция детекции батча кадров (список кадров → список Detections).
+    :param workers: Число процессов; при workers > 1 видео делится на отрезки,
+                    которые обрабатываются параллельно и затем склеиваются.
+    :param export_path: Файл .jsonl или .parquet для потоковой записи детекций.
+    :param overlay: False – записать видео без отрисовки детекций.
+    :param backend: Клиент сервера инференса (inference_server.InferenceClient) –
+                    детекция на общей модели сервера вместо локальной.
+    :param output_path: Куда записать видео (по умолчанию Downloads/processed_<имя>).
+    :param write_video: False – только детекции (export_path), видео не пишется.
+    :return: Путь к сохранённому обработанному видео; None, если видео не
+             записывалось или параллельную обработку (workers > 1) остановили –
+             отрезки не склеиваются.
     """
     cap = cv2.VideoCapture(videoPath)
     if not cap.isOpened():
@@ -79,51 +178,44 @@ def process_video(videoPath, mode="normal"):
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
 
-    downloadsPath = os.path.join(os.path.expanduser("~"), "Downloads")
-    baseName = os.path.basename(videoPath)
-    outputFileName = os.path.join(downloadsPath, f"processed_{baseName}")
-
-    fourcc = cv2.VideoWriter.fourcc(*'mp4v')
-    out = cv2.VideoWriter(outputFileName, fourcc, fps, (width, height))
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if mode == "aerial":
-            results = model_aerial(frame)
-            for result in results:
-                for box, cls, conf in zip(result.obb.xyxyxyxy, result.obb.cls.int().tolist(), result.obb.conf):
-                    className = result.names[cls]
-                    pts = np.array(box).reshape((-1, 1, 2)).astype(np.int32)
-                    cv2.polylines(frame, [pts], isClosed=True, color=(0, 0, 255), thickness=2)
-                    x, y = pts[0][0]
-                    cv2.putText(frame, f"{className}: {conf * 100:.2f}%", (x, y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-        else:
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                tempFilename = tmp.name
-                cv2.imwrite(tempFilename, frame)
-            result = model_normal.predict(tempFilename, confidence=40).json()
-            os.remove(tempFilename)
-            for pred in result.get("predictions", []):
-                centerX = pred["x"]
-                centerY = pred["y"]
-                widthBox = pred["width"]
-                heightBox = pred["height"]
-                className = pred["class"]
-                conf = pred["confidence"]
-                x1 = int(centerX - widthBox / 2)
-                y1 = int(centerY - heightBox / 2)
-                x2 = int(centerX + widthBox / 2)
-                y2 = int(centerY + heightBox / 2)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                cv2.putText(frame, f"{className}: {conf * 100:.2f}%", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-
-        out.write(frame)
-
-    cap.release()
-    out.release()
-    return outputFileName
\ No newline at end of file
+    if output_path:
+        outputFileName = output_path
+    else:
+        downloadsPath = os.path.join(os.path.expanduser("~"), "Downloads")
+        baseName = os.path.basename(videoPath)
+        outputFileName = os.path.join(downloadsPath, f"processed_{baseName}")
+
+    if detect is None and backend is not None:
+        detect = partial(backend.detect_batch, mode=mode)
+    elif detect is None:
+        # кадры идут в модель прямо из памяти, та же модель, что у process_frame
+        detect = partial(detect_batch, mode="aerial" if mode == "aerial" else "normal")
+
+    draw = _draw_video_frame if overlay and write_video else _skip_overlay
+    workers = workers or config.get("video_workers")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    # отрезки склеиваются из записанных частей – без записи видео один процесс
+    if write_video and workers > 1 and len(split_segments(total, workers)) > 1:
+        cap.release()
+        return process_video_parallel(videoPath, outputFileName, total, detect, draw,
+                                      workers, batch_size=batch_size, on_progress=on_progress,
+                                      stop_event=stop_event, export_path=export_path)
+
+    if write_video:
+        fourcc = cv2.VideoWriter.fourcc(*'mp4v')
+        out = cv2.VideoWriter(outputFileName, fourcc, fps, (width, height))
+    else:
+        out = _NullWriter()
+    exporter = DetectionExporter(export_path) if export_path else None
+
+    pipeline = VideoPipeline(cap, out, detect, draw,
+                             batch_size=batch_size, on_progress=on_progress,
+                             stop_event=stop_event, exporter=exporter)
+    try:
+        pipeline.run()
+    finally:
+        cap.release()
+        out.release()
+        if exporter is not None:
+            exporter.close()
+    return outputFileName if write_video else None
@@ -0,0 +1,254 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+import config
+from export import DetectionExporter
+
+
+class EventRule:
+    """
+    Условие записи клипа: в кадре не меньше min_count объектов из classes
+    (имена или номера классов; пусто – любые) с confidence не ниже min_conf.
+    """
+
+    def __init__(self, classes=None, min_conf=None, min_count=None):
+        classes = config.get("record_classes") if classes is None else classes
+        self.classes = {str(c) for c in classes}
+        self.min_conf = config.get("record_min_conf") if min_conf is None else min_conf
+        self.min_count = min_count or config.get("record_min_count")
+
+    def matches(self, dets):
+        if len(dets) < self.min_count:
+            return False
+        keep = dets.conf >= self.min_conf
+        if self.classes:
+            keep &= np.array([str(c) in self.classes or dets.names.get(int(c)) in self.classes
+                              for c in dets.cls], dtype=bool)
+        return int(keep.sum()) >= self.min_count
+
+
+class _Clip:
+    def __init__(self, start, end, started_wall):
+        self.start = start
+        self.end = end
+        self.started_wall = started_wall
+        self.frames = []
+        self.dets = {}
+
+
+class ClipRecorder:
+    """
+    Кольцевой буфер последних секунд живого источника и запись клипов по событию.
+
+    add_frame() (поток захвата) только уменьшает кадр до max_width (или
+    копирует) в очередь; сжатие в JPEG и кольцо – в своём потоке, кольцо ограничено и по длительности (pre
+    секунд), и по памяти (memory_mb). on_detections() (поток обработки)
+    проверяет правило: при срабатывании клип начинается за pre секунд до
+    события и продолжается post секунд после последнего срабатывания (не
+    дольше max_clip; кадры клипа держатся отдельно от кольца до записи).
+    Готовый клип – видео и детекции его кадров (.jsonl, в координатах
+    кадров клипа) – пишет отдельный поток кодирования. Если сжатие не успевает, кадры пропускаются (счётчик
+    dropped), а не задерживают захват.
+    """
+
+    def __init__(self, name="", rule=None, pre=None, post=None, max_clip=None, memory_mb=None,
+                 quality=None, max_width=None, output_dir=None, grace=1.0):
+        self.name = name
+        self.rule = rule or EventRule()
+        self.pre = config.get("record_pre_s") if pre is None else pre
+        self.post = config.get("record_post_s") if post is None else post
+        self.max_clip = max_clip or config.get("record_max_clip_s")
+        self.budget = (memory_mb or config.get("record_memory_mb")) * 1024 * 1024
+        self.quality = quality or config.get("record_jpeg_quality")
+        self.max_width = config.get("record_max_width") if max_width is None else max_width
+        self.output_dir = (output_dir or config.get("record_dir") or
+                           os.path.join(os.path.expanduser("~"), "Downloads", "clips"))
+        # детекции последних кадров приходят позже самих кадров – клип
+        # кодируется с задержкой grace секунд после конца
+        self.grace = grace
+
+        self._frames = queue.Queue(maxsize=4)
+        # кольцо: (номер кадра, monotonic, JPEG, масштаб кадра к исходному);
+        # детекции – по номеру кадра, в координатах исходного кадра
+        self._ring = deque()
+        self._ring_bytes = 0
+        self._dets = OrderedDict()
+        self._clip = None
+        # закрытые клипы, ждущие кодирования: им ещё досылаются детекции
+        self._closing = []
+        self._lock = threading.Lock()
+        self._encode_queue = queue.Queue()
+        self.dropped = 0
+        self.events = 0
+        self.clips = []
+        self.error = None
+        self._stop = threading.Event()
+        self._compress_thread = threading.Thread(target=self._compress_loop, daemon=True)
+        self._encode_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._compress_thread.start()
+        self._encode_thread.start()
+
+    def add_frame(self, frame, frame_index, captured_at):
+        """Кадр захвата (уменьшается или копируется – буфер остаётся у вызывающего)."""
+        if self._frames.full():
+            # сжатие не успевает – кадр пропускается без копирования
+            self.dropped += 1
+            return
+        h, w = frame.shape[:2]
+        if self.max_width and w > self.max_width:
+            scale = self.max_width / w
+            frame = cv2.resize(frame, (self.max_width, round(h * scale)),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+            frame = frame.copy()
+        try:
+            self._frames.put_nowait((frame, frame_index, captured_at, scale))
+        except queue.Full:
+            self.dropped += 1
+
+    def on_detections(self, dets, captured_at):
+        """Детекции обработанного кадра (с проставленным frame_index)."""
+        matched = self.rule.matches(dets)
+        with self._lock:
+            self._dets[dets.frame_index] = dets
+            for clip in self._closing + [self._clip]:
+                if clip is not None and clip.start <= captured_at <= clip.end:
+                    clip.dets[dets.frame_index] = dets
+            if not matched:
+                return
+            clip = self._clip
+            if clip is None:
+                self.events += 1
+                clip = self._clip = _Clip(captured_at - self.pre, captured_at + self.post,
+                                          time.time())
+                # кадры до события уже в кольце – клип забирает их ссылки
+                clip.frames = [item for item in self._ring if item[1] >= clip.start]
+                for index, _, _, _ in clip.frames:
+                    if index in self._dets:
+                        clip.dets[index] = self._dets[index]
+            else:
+                clip.end = min(max(clip.end, captured_at + self.post), clip.start + self.max_clip)
+
+    def _compress_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while not self._stop.is_set():
+            try:
+                frame, frame_index, captured_at, scale = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                self._check_clip(time.monotonic())
+                continue
+            ok, jpeg = cv2.imencode(".jpg", frame, params)
+            if not ok:
+                continue
+            item = (frame_index, captured_at, jpeg.tobytes(), scale)
+            with self._lock:
+                self._ring.append(item)
+                self._ring_bytes += len(item[2])
+                clip = self._clip
+                if clip is not None and captured_at >= clip.start:
+                    clip.frames.append(item)
+                self._trim(captured_at)
+            self._check_clip(captured_at)
+
+    def _trim(self, now):
+        # старше pre секунд или сверх бюджета памяти – вон из кольца
+        ring = self._ring
+        while ring and (ring[0][1] < now - self.pre or self._ring_bytes > self.budget):
+            self._ring_bytes -= len(ring.popleft()[2])
+        oldest = ring[0][0] if ring else None
+        while self._dets and (oldest is None or next(iter(self._dets)) < oldest):
+            self._dets.popitem(last=False)
+
+    def _check_clip(self, now):
+        with self._lock:
+            clip = self._clip
+            if clip is None or now < clip.end:
+                return
+            self._clip = None
+            self._closing.append(clip)
+        self._encode_queue.put((time.monotonic() + self.grace, clip))
+
+    def _encode_loop(self):
+        while True:
+            job = self._encode_queue.get()
+            if job is None:
+                break
+            ready_at, clip = job
+            delay = ready_at - time.monotonic()
+            if delay > 0 and not self._stop.is_set():
+                time.sleep(delay)
+            with self._lock:
+                if clip in self._closing:
+                    self._closing.remove(clip)
+            try:
+                self.clips.append(self._write_clip(clip))
+            except (OSError, ValueError, cv2.error) as e:
+                self.error = str(e)
+
+    def _write_clip(self, clip):
+        frames = clip.frames
+        if not frames:
+            raise ValueError("Клип без кадров")
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(clip.started_wall))
+        base = f"clip_{stamp}_{self.name}" if self.name else f"clip_{stamp}"
+        video_path = os.path.join(self.output_dir, base + ".mp4")
+        span = frames[-1][1] - frames[0][1]
+        fps = (len(frames) - 1) / span if span > 0 else 10.0
+        writer = None
+        try:
+            with DetectionExporter(os.path.join(self.output_dir, base + "_detections.jsonl")) \
+                    as exporter:
+                for index, _, jpeg, scale in frames:
+                    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    if frame is None:
+                        continue
+                    if writer is None:
+                        size = frame.shape[1::-1]
+                        writer = cv2.VideoWriter(video_path, cv2.VideoWriter.fourcc(*'mp4v'),
+                                                 fps, size)
+                    # детекции – из исходного кадра в координаты кадра клипа
+                    sx = sy = scale
+                    if frame.shape[1::-1] != size:
+                        sx *= size[0] / frame.shape[1]
+                        sy *= size[1] / frame.shape[0]
+                        frame = cv2.resize(frame, size)
+                    writer.write(frame)
+                    if index in clip.dets:
+                        dets = clip.dets[index]
+                        exporter.write(dets if sx == sy == 1.0 else dets.scaled(sx, sy))
+        finally:
+            if writer is not None:
+                writer.release()
+        return video_path
+
+    def describe(self):
+        with self._lock:
+            seconds = self._ring[-1][1] - self._ring[0][1] if len(self._ring) > 1 else 0.0
+            recording = self._clip is not None
+            size = self._ring_bytes
+        text = (f"буфер {seconds:.1f} с, {size / 1024 / 1024:.0f} МБ; событий {self.events}, "
+                f"клипов {len(self.clips)}")
+        if recording:
+            text += ", идёт запись"
+        if self.error:
+            text += f", ошибка: {self.error}"
+        return text
+
+    def close(self):
+        """Остановить запись; начатый клип дописывается тем, что уже есть."""
+        self._stop.set()
+        self._compress_thread.join(timeout=2.0)
+        with self._lock:
+            clip, self._clip = self._clip, None
+        if clip is not None:
+            self._encode_queue.put((0, clip))
+        self._encode_queue.put(None)
+        self._encode_thread.join()
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from detections import Detections
+
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class GlyphCache:
+    """
+    Заранее отрисованные маски подписей.
+
+    Имя класса рисуется один раз на класс, числа (confidence, номер трека)
+    собираются из масок отдельных символов. Готовые подписи целиком тоже
+    кэшируются (LRU): между запусками детектора трекер отдаёт те же номера и
+    confidence, и подпись берётся из кэша без putText.
+    """
+
+    def __init__(self, font_scale=0.5, thickness=2, max_labels=1024):
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.max_labels = max_labels
+        self._glyphs = {}
+        self._labels = OrderedDict()
+        (_, text_h), baseline = cv2.getTextSize("0", _FONT, font_scale, thickness)
+        self.height = text_h + baseline + thickness
+        self.baseline = baseline
+
+    def _render(self, text):
+        (w, _), _ = cv2.getTextSize(text, _FONT, self.font_scale, self.thickness)
+        # маска шире шага на толщину линии, чтобы не обрезать последний штрих
+        mask = np.zeros((self.height, w + self.thickness), dtype=np.uint8)
+        cv2.putText(mask, text, (0, self.height - self.baseline - 1), _FONT,
+                    self.font_scale, 255, self.thickness)
+        return mask, w
+
+    def get(self, text):
+        glyph = self._glyphs.get(text)
+        if glyph is None:
+            glyph = self._glyphs[text] = self._render(text)
+        return glyph
+
+    def label(self, head, name, tail):
+        """Маска head + name + tail: name (имя класса) целиком из кэша, остальное – по символам."""
+        key = (head, name, tail)
+        mask = self._labels.get(key)
+        if mask is not None:
+            self._labels.move_to_end(key)
+            return mask
+        glyphs = [self.get(ch) for ch in head] + [self.get(name)] + [self.get(ch) for ch in tail]
+        mask = np.zeros((self.height, sum(w for _, w in glyphs) + self.thickness), dtype=np.uint8)
+        x = 0
+        for glyph, advance in glyphs:
+            region = mask[:, x:x + glyph.shape[1]]
+            np.maximum(region, glyph, out=region)
+            x += advance
+        self._labels[key] = mask
+        if len(self._labels) > self.max_labels:
+            self._labels.popitem(last=False)
+        return mask
+
+
+class Renderer:
+    """
+    Отрисовка детекций отдельной стадией.
+
+    Кадр передаётся уже в выходном/экранном разрешении, детекции – в
+    координатах исходного кадра (source_size), они масштабируются под кадр.
+    Все рамки рисуются одним вызовом cv2.polylines; подписи из GlyphCache
+    собираются в одну маску и переносятся на кадр одним cv2.copyTo.
+    overlay=False – быстрый путь без отрисовки (для безголовых прогонов).
+    """
+
+    def __init__(self, color=(255, 0, 0), thickness=2, font_scale=0.5, overlay=True,
+                 labels=True):
+        self.color = color
+        self.thickness = thickness
+        self.overlay = overlay
+        self.labels = labels
+        self.glyphs = GlyphCache(font_scale, thickness)
+        self._layer = None
+        self._paint = None
+
+    def render(self, frame, dets: Detections, source_size=None):
+        if not self.overlay or dets is None or not len(dets):
+            return frame
+        if source_size is not None and tuple(source_size) != (frame.shape[1], frame.shape[0]):
+            dets = dets.scaled(frame.shape[1] / source_size[0], frame.shape[0] / source_size[1])
+
+        if dets.is_obb:
+            polygons = dets.polygons
+        else:
+            x1, y1, x2, y2 = dets.xyxy.T
+            polygons = np.stack([x1, y1, x2, y1, x2, y2, x1, y2], axis=1).reshape(-1, 4, 2)
+        polygons = np.round(polygons).astype(np.int32)
+        cv2.polylines(frame, list(polygons), isClosed=True, color=self.color,
+                      thickness=self.thickness)
+
+        if self.labels:
+            self._draw_labels(frame, dets, polygons[:, 0, :])
+        return frame
+
+    def _buffers(self, frame):
+        # маска подписей и заливка цветом переиспользуются между кадрами
+        if self._layer is None or self._layer.shape != frame.shape[:2]:
+            self._layer = np.zeros(frame.shape[:2], dtype=np.uint8)
+            self._paint = np.empty_like(frame)
+            self._paint[:] = self.color
+        return self._layer, self._paint
+
+    def _draw_labels(self, frame, dets, anchors):
+        layer, paint = self._buffers(frame)
+        frame_h, frame_w = layer.shape
+        # подпись – над первой вершиной полигона (левый верхний угол бокса),
+        # базовая линия текста на 10 пикселей выше угла, как раньше с putText
+        xs = anchors[:, 0]
+        ys = anchors[:, 1] - 10 - (self.glyphs.height - self.glyphs.baseline)
+        top, left, bottom, right = frame_h, frame_w, 0, 0
+        for i in range(len(dets)):
+            cls = int(dets.cls[i])
+            head = f"#{dets.ids[i]} " if dets.ids is not None else ""
+            mask = self.glyphs.label(head, f"{dets.names.get(cls, str(cls))}: ",
+                                     f"{dets.conf[i] * 100:.2f}%")
+            x, y = int(xs[i]), int(ys[i])
+            h, w = mask.shape
+            fx1, fy1 = max(x, 0), max(y, 0)
+            fx2, fy2 = min(x + w, frame_w), min(y + h, frame_h)
+            if fx1 >= fx2 or fy1 >= fy2:
+                continue
+            region = layer[fy1:fy2, fx1:fx2]
+            np.maximum(region, mask[fy1 - y:fy2 - y, fx1 - x:fx2 - x], out=region)
+            top, left = min(top, fy1), min(left, fx1)
+            bottom, right = max(bottom, fy2), max(right, fx2)
+
+        if top < bottom and left < right:
+            area = (slice(top, bottom), slice(left, right))
+            cv2.copyTo(paint[area], layer[area], frame[area])
+            layer[area] = 0
@@ -0,0 +1,128 @@
+import base64
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlencode
+
+import cv2
+
+import config
+from detections import Detections
+from models import get_model
+
+
+class RoboflowClient:
+    """
+    Облачная модель Roboflow (hosted inference API) как бэкенд детекции.
+
+    Кадры кодируются в JPEG в памяти и отправляются пачкой: запросы батча идут
+    параллельно из пула потоков, у каждого потока своё постоянное HTTPS-
+    соединение. Облачная модель обслуживает только режим normal, остальные
+    режимы считаются локальной моделью. Интерфейс – как у
+    inference_server.InferenceClient: detect(frame) и detect_batch(frames, mode);
+    тайловая детекция облаком не поддерживается (supports_tiled = False,
+    detect(tiled=True) – ValueError).
+    """
+
+    supports_tiled = False
+
+    def __init__(self, model=None, api_key=None, url=None, confidence=None, concurrency=None,
+                 quality=None, timeout=30.0):
+        self.model = model or config.get("roboflow_model")
+        self.api_key = api_key or config.get("roboflow_api_key")
+        self.url = (url or config.get("roboflow_url")).rstrip("/")
+        self.confidence = confidence or config.get("roboflow_confidence")
+        self.concurrency = max(1, concurrency or config.get("roboflow_concurrency"))
+        self.quality = quality or config.get("roboflow_jpeg_quality")
+        self.timeout = timeout
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._local = threading.local()
+        self._pool = None
+        self._lock = threading.Lock()
+        # имена классов → индексы, общие для всех кадров: трекер и экспорт
+        # видят один и тот же class_id у одного класса
+        self._names = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_local", "_pool", "_lock", "_names"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            parsed = urlparse(self.url)
+            conn_class = (http.client.HTTPSConnection if parsed.scheme == "https"
+                          else http.client.HTTPConnection)
+            conn = self._local.conn = conn_class(parsed.hostname, parsed.port,
+                                                 timeout=self.timeout)
+        return conn
+
+    def _post(self, body):
+        path = (urlparse(self.url).path + f"/{self.model}?" +
+                urlencode({"api_key": self.api_key, "confidence": self.confidence,
+                           "format": "json"}))
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # постоянное соединение закрыто сервером – одна повторная попытка
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Roboflow: {payload.get('message', response.status)}")
+        return payload
+
+    def _class_id(self, pred):
+        with self._lock:
+            return self._names.setdefault(pred["class"], len(self._names))
+
+    def _detect_one(self, frame):
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("Не удалось закодировать кадр")
+        predictions = self._post(base64.b64encode(jpeg.tobytes())).get("predictions", [])
+        xyxy = [[p["x"] - p["width"] / 2, p["y"] - p["height"] / 2,
+                 p["x"] + p["width"] / 2, p["y"] + p["height"] / 2] for p in predictions]
+        class_ids = [self._class_id(p) for p in predictions]
+        with self._lock:
+            names = {index: name for name, index in self._names.items()}
+        return Detections(xyxy, class_ids, [p["confidence"] for p in predictions], names)
+
+    def detect(self, frame, mode="normal", tiled=False):
+        if tiled:
+            raise ValueError("Тайловая детекция не поддерживается Roboflow")
+        return self.detect_batch([frame], mode)[0]
+
+    def detect_batch(self, frames, mode="normal"):
+        if mode != "normal":
+            model = get_model(mode)
+            return [Detections.from_result(r) for r in model(frames, verbose=False)]
+        if len(frames) <= 1:
+            return [self._detect_one(frame) for frame in frames]
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix="roboflow")
+            pool = self._pool
+        return list(pool.map(self._detect_one, frames))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,107 @@
+import math
+import threading
+import time
+
+import config
+
+
+class AdaptiveScheduler:
+    """
+    Подбор интервала запуска детектора и разрешения инференса по замерам.
+
+    Непрерывно измеряются частота захвата, время инференса и время
+    промежуточного (трекерного) кадра. Интервал детектора выбирается так,
+    чтобы средняя стоимость кадра укладывалась в целевой FPS (по умолчанию –
+    частота захвата), а разрешение инференса понижается/повышается по
+    лестнице sizes, чтобы время детекции укладывалось в целевую задержку.
+    """
+
+    def __init__(self, target_fps=None, target_latency=None, sizes=None, adapt_size=True,
+                 max_interval=None, initial_size=None):
+        self.target_fps = config.get("target_fps") if target_fps is None else target_fps
+        self.target_latency = (config.get("target_latency_ms") / 1000.0
+                               if target_latency is None else target_latency)
+        self.sizes = sorted(sizes or config.get("inference_sizes"))
+        self.adapt_size = adapt_size
+        self.max_interval = max_interval or config.get("max_detect_interval")
+        self.size_index = (self.sizes.index(initial_size) if initial_size in self.sizes
+                           else len(self.sizes) // 2)
+        self.interval = 1
+        self.alpha = 0.2
+        self._lock = threading.Lock()
+        self._last_capture = None
+        self._last_output = None
+        self._last_size_change = 0.0
+        self.capture_interval = None
+        self.output_interval = None
+        self.infer_time = None
+        self.track_time = None
+
+    def _ema(self, old, new):
+        return new if old is None else old + self.alpha * (new - old)
+
+    @property
+    def target_size(self):
+        size = self.sizes[self.size_index]
+        return size, size
+
+    def on_capture(self, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            if self._last_capture is not None:
+                self.capture_interval = self._ema(self.capture_interval,
+                                                  timestamp - self._last_capture)
+            self._last_capture = timestamp
+
+    def on_frame(self, seconds, detected):
+        """Учесть время обработки кадра (detected – был ли запуск детектора)."""
+        now = time.monotonic()
+        with self._lock:
+            if detected:
+                self.infer_time = self._ema(self.infer_time, seconds)
+            else:
+                self.track_time = self._ema(self.track_time, seconds)
+            if self._last_output is not None:
+                self.output_interval = self._ema(self.output_interval, now - self._last_output)
+            self._last_output = now
+            if detected:
+                self._adapt(now)
+
+    def _adapt(self, now):
+        frame_budget = 1.0 / self.target_fps if self.target_fps else self.capture_interval
+        if frame_budget and self.infer_time is not None:
+            track = min(self.track_time or 0.0, frame_budget * 0.9)
+            # (T_det + (N - 1) * T_trk) / N <= бюджет кадра  =>  N >= (T_det - T_trk) / (бюджет - T_trk)
+            needed = (self.infer_time - track) / (frame_budget - track)
+            self.interval = min(max(1, math.ceil(needed)), self.max_interval)
+
+        if not self.adapt_size or self.infer_time is None or now - self._last_size_change < 2.0:
+            return
+        # разрешение меняется не чаще раза в 2 секунды, с гистерезисом
+        if self.infer_time > self.target_latency and self.size_index > 0:
+            self.size_index -= 1
+            self.infer_time = None
+            self._last_size_change = now
+        elif (self.infer_time < self.target_latency * 0.5
+              and self.size_index < len(self.sizes) - 1):
+            self.size_index += 1
+            self.infer_time = None
+            self._last_size_change = now
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "size": self.sizes[self.size_index],
+                "capture_fps": 1.0 / self.capture_interval if self.capture_interval else 0.0,
+                "output_fps": 1.0 / self.output_interval if self.output_interval else 0.0,
+                "infer_ms": (self.infer_time or 0.0) * 1000,
+            }
+
+    def describe(self):
+        s = self.snapshot()
+        text = (f"Детектор: каждый {s['interval']}-й кадр, инференс {s['infer_ms']:.0f} мс, "
+                f"захват {s['capture_fps']:.1f} к/с, вывод {s['output_fps']:.1f} к/с")
+        if self.adapt_size:
+            text += f", разрешение {s['size']}"
+        return text
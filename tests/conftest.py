@@ -0,0 +1,16 @@
+import os
+import sys
+
+# модули проекта лежат в корне репозитория, без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detections import Detections  # noqa: E402
+
+NAMES = {0: "car", 1: "person"}
+
+
+def dets(boxes, conf=None, cls=None):
+    """Detections по списку боксов: по умолчанию класс 0 и confidence 0.9."""
+    conf = [0.9] * len(boxes) if conf is None else conf
+    cls = [0] * len(boxes) if cls is None else cls
+    return Detections(boxes, cls, conf, NAMES)
@@ -0,0 +1,135 @@
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import NAMES, dets
+from detcache import DetectionCache, frame_hash, make_key, pack, unpack
+from detections import Detections
+
+MODEL = "normal:test"
+
+
+def numbered(n, offset=0.0):
+    """n разных боксов обоих классов – записи кэша заметного размера."""
+    xyxy = np.arange(n * 4, dtype=np.float32).reshape(n, 4) + offset
+    return dets(xyxy, np.linspace(0.3, 0.9, n), np.arange(n) % 2)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    store = DetectionCache(str(tmp_path / "detections.sqlite"), max_mb=64)
+    yield store
+    store.close()
+
+
+def test_pack_roundtrip():
+    original = numbered(5)
+    restored = unpack(pack(original), NAMES)
+    np.testing.assert_array_equal(restored.xyxy, original.xyxy)
+    np.testing.assert_array_equal(restored.cls, original.cls)
+    np.testing.assert_allclose(restored.conf, original.conf, rtol=1e-6)
+    assert restored.names == NAMES
+    assert not restored.is_obb
+
+
+def test_pack_roundtrip_obb():
+    polygons = np.arange(3 * 8, dtype=np.float32).reshape(3, 4, 2)
+    original = Detections(np.zeros((3, 4)), [0, 1, 0], [0.5, 0.6, 0.7], NAMES, polygons)
+    restored = unpack(pack(original), NAMES)
+    assert restored.is_obb
+    np.testing.assert_array_equal(restored.polygons.reshape(3, 4, 2), polygons)
+
+
+def test_pack_empty():
+    restored = unpack(pack(Detections.empty(NAMES)), NAMES)
+    assert len(restored) == 0
+
+
+def test_unpacked_arrays_are_writable():
+    restored = unpack(pack(numbered(2)), NAMES)
+    restored.xyxy += 1
+
+
+def test_frame_hash_depends_on_content_and_shape():
+    frame = np.zeros((4, 6, 3), dtype=np.uint8)
+    changed = frame.copy()
+    changed[0, 0, 0] = 1
+    assert frame_hash(frame) == frame_hash(frame.copy())
+    assert frame_hash(frame) != frame_hash(changed)
+    assert frame_hash(frame) != frame_hash(frame.reshape(6, 4, 3))
+
+
+def test_key_depends_on_model_and_params():
+    digest = frame_hash(np.zeros((2, 2, 3), dtype=np.uint8))
+    key = make_key(digest, MODEL, {"tiled": False})
+    assert key == make_key(digest, MODEL, {"tiled": False})
+    assert key != make_key(digest, "normal:other", {"tiled": False})
+    assert key != make_key(digest, MODEL, {"tiled": True})
+
+
+def test_get_put(cache):
+    key = make_key(b"frame", MODEL, {})
+    assert cache.get(key, MODEL) is None
+    cache.put(key, numbered(3), MODEL)
+    restored = cache.get(key, MODEL)
+    np.testing.assert_array_equal(restored.xyxy, numbered(3).xyxy)
+    assert restored.names == NAMES
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_many_keeps_order(cache):
+    keys = [make_key(bytes([i]), MODEL, {}) for i in range(4)]
+    cache.put_many([(keys[1], numbered(1)), (keys[3], numbered(3))], MODEL, NAMES)
+    found = cache.get_many(keys, MODEL)
+    assert [None if d is None else len(d) for d in found] == [None, 1, None, 3]
+
+
+def test_persists_between_instances(tmp_path):
+    path = str(tmp_path / "detections.sqlite")
+    key = make_key(b"frame", MODEL, {})
+    first = DetectionCache(path, max_mb=64)
+    first.put(key, numbered(2), MODEL)
+    first.close()
+    second = DetectionCache(path, max_mb=64)
+    try:
+        restored = second.get(key, MODEL)
+        assert len(restored) == 2 and restored.names == NAMES
+    finally:
+        second.close()
+
+
+def test_eviction_bounds_size_and_keeps_recent(tmp_path):
+    entry = len(pack(numbered(50)))
+    # места примерно на 10 записей
+    store = DetectionCache(str(tmp_path / "detections.sqlite"),
+                           max_mb=entry * 10 / 1024 / 1024)
+    try:
+        keys = [make_key(bytes([i]), MODEL, {}) for i in range(30)]
+        hot = keys[0]
+        for i, key in enumerate(keys):
+            store.put(key, numbered(50, i), MODEL)
+            # первая запись используется постоянно – её вытеснять нельзя
+            assert store.get(hot, MODEL) is not None
+        assert store.stats()["entries"] <= 10
+        assert store._size <= store.max_bytes
+        assert store.get(keys[-1], MODEL) is not None
+        assert store.get(keys[1], MODEL) is None
+    finally:
+        store.close()
+
+
+def test_counters_from_several_threads(cache):
+    hit, miss = make_key(b"hit", MODEL, {}), make_key(b"miss", MODEL, {})
+    cache.put(hit, numbered(1), MODEL)
+
+    def lookup():
+        for _ in range(200):
+            cache.get_many([hit, miss], MODEL)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (cache.hits, cache.misses) == (800, 800)
@@ -0,0 +1,67 @@
+import queue
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+import display  # noqa: E402
+
+
+class FakePhoto:
+    """PhotoImage без Tk: запоминает вставленные изображения."""
+
+    def __init__(self, mode, size):
+        self.pasted = []
+
+    def paste(self, image):
+        self.pasted.append(np.asarray(image.convert("RGB")).copy())
+
+
+class FakeWidget:
+    def configure(self, **kwargs):
+        pass
+
+    def event_generate(self, *args, **kwargs):
+        pass
+
+
+class FakeProcessor:
+    def __init__(self):
+        self.frames = queue.Queue()
+        self.released = []
+
+    def read(self, timeout=None):
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, frame):
+        self.released.append(frame)
+
+
+def wait_pending(worker, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not worker.pending() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert worker.pending()
+
+
+def test_presented_image_follows_buffers(monkeypatch):
+    monkeypatch.setattr(display.ImageTk, "PhotoImage", FakePhoto)
+    processor = FakeProcessor()
+    worker = display.DisplayWorker(processor, FakeWidget(), (32, 24))
+    try:
+        for bgr in [(255, 0, 0), (0, 0, 255), (10, 200, 30)]:
+            # кадр другого размера – через уменьшение в буфер показа
+            processor.frames.put(np.full((48, 64, 3), bgr, dtype=np.uint8))
+            wait_pending(worker)
+            assert worker.present()
+            shown = worker.photo.pasted[-1]
+            assert shown.shape == (24, 32, 3)
+            assert tuple(shown[12, 16]) == bgr[::-1]
+        assert len(processor.released) == 3
+        assert not worker.present()
+    finally:
+        worker.stop()
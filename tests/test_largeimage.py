@@ -0,0 +1,101 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import largeimage
+from bench import StubBoxes, StubResult
+from models import registry
+
+
+class BlobModel:
+    """Заглушка модели: каждый светлый прямоугольник вырезки – объект класса 0."""
+
+    names = {0: "blob"}
+
+    def __call__(self, crops, verbose=False, **kwargs):
+        results = []
+        for crop in crops:
+            mask = (crop[:, :, 0] > 128).astype(np.uint8)
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            xyxy = np.array([[x, y, x + w, y + h] for x, y, w, h, _ in stats[1:count]],
+                            dtype=np.float32).reshape(-1, 4)
+            results.append(StubResult(StubBoxes(xyxy, np.zeros(len(xyxy), np.float32),
+                                                np.full(len(xyxy), 0.9, np.float32)),
+                                      self.names))
+        return results
+
+
+@pytest.fixture
+def blob_model():
+    registry.register("aerial", BlobModel())
+    yield
+    registry.evict("aerial")
+
+
+def run(tmp_path, objects, **kwargs):
+    image = np.zeros((1000, 1000, 3), dtype=np.uint8)
+    for x1, y1, x2, y2 in objects:
+        image[y1:y2, x1:x2] = 255
+    path = str(tmp_path / "ortho.png")
+    cv2.imwrite(path, image)
+    # тайлы 400 с шагом 300: ряды y = 0, 300, 600
+    detections_path, preview_path, found = largeimage.process_large_image(
+        path, str(tmp_path / "out"), tile_size=400, overlap=0.25, batch_size=2, **kwargs)
+    boxes = []
+    if detections_path:
+        with open(detections_path, encoding="utf-8") as f:
+            for line in f:
+                boxes += json.loads(line)["xyxy"]
+    return sorted(map(tuple, boxes)), found, detections_path, preview_path
+
+
+def test_objects_on_row_seams_are_reported_once(tmp_path, blob_model):
+    objects = [
+        (100, 250, 150, 450),  # длиннее перекрытия рядов – обрезан в обоих
+        (500, 380, 540, 440),  # обрезан краем верхнего ряда, целиком в следующем
+        (800, 800, 850, 850),  # внутри одного тайла
+        (120, 920, 160, 990),  # в нижнем ряду
+    ]
+    boxes, found, _, _ = run(tmp_path, objects)
+    assert found == len(objects)
+    assert boxes == sorted(tuple(float(v) for v in o) for o in objects)
+
+
+def test_object_in_three_rows(tmp_path, blob_model):
+    # виден в трёх рядах: обрезок первого сливается в ряду 2, перенесённый бокс –
+    # с обрезком ряда 3
+    boxes, found, _, _ = run(tmp_path, [(100, 350, 140, 650)])
+    assert found == 1
+    assert boxes == [(100.0, 350.0, 140.0, 650.0)]
+
+
+def test_outputs_follow_options(tmp_path, blob_model):
+    _, found, detections_path, preview_path = run(tmp_path, [(10, 10, 50, 50)],
+                                                  export_format=None)
+    assert found == 1
+    assert detections_path is None
+    assert preview_path is not None
+    _, _, detections_path, preview_path = run(tmp_path, [(10, 10, 50, 50)],
+                                              write_preview=False)
+    assert detections_path.endswith(".jsonl")
+    assert preview_path is None
+
+
+@pytest.mark.parametrize("shape,channels_last", [
+    ((8, 8), True), ((8, 8, 1), True), ((8, 8, 2), True), ((8, 8, 3), True),
+    ((8, 8, 4), True), ((2, 8, 8), False), ((3, 8, 8), False)])
+def test_to_bgr8_band_layouts(shape, channels_last):
+    data = np.full(shape, 1000, dtype=np.uint16)
+    bgr = largeimage._to_bgr8(data, channels_last)
+    assert bgr.shape == (8, 8, 3) and bgr.dtype == np.uint8
+    assert (bgr == 1000 >> 8).all()
+
+
+def test_whole_image_fallback_refuses_large_files(tmp_path):
+    path = str(tmp_path / "ortho.png")
+    cv2.imwrite(path, np.zeros((100, 120, 3), dtype=np.uint8))
+    assert largeimage.ImageReader(path, max_pixels=12_000).width == 120
+    with pytest.raises(ValueError, match="rasterio"):
+        largeimage.ImageReader(path, max_pixels=11_999)
@@ -0,0 +1,122 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+import pytest
+
+from mjpeg import MJPEGReader
+
+
+def jpeg(value):
+    ok, data = cv2.imencode(".jpg", np.full((48, 64, 3), value, dtype=np.uint8))
+    assert ok
+    return data.tobytes()
+
+
+class _Recorder(MJPEGReader):
+    def __init__(self, *args, **kwargs):
+        self.parts = []
+        super().__init__(*args, **kwargs)
+
+    def _publish(self, data):
+        self.parts.append(data)
+        super()._publish(data)
+
+
+@pytest.fixture
+def stream_server():
+    """Сервер, отдающий заданный multipart-поток мелкими кусками и держащий соединение."""
+    done = threading.Event()
+    payload = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", payload["content_type"])
+            self.end_headers()
+            body = payload["body"]
+            # куски по 7 байт: границы и заголовки частей рвутся между чтениями
+            for i in range(0, len(body), 7):
+                self.wfile.write(body[i:i + 7])
+                self.wfile.flush()
+            done.wait(5)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05},
+                     daemon=True).start()
+
+    def serve(body, content_type="multipart/x-mixed-replace; boundary=frame"):
+        payload.update(body=body, content_type=content_type)
+        return "http://127.0.0.1:{}/video".format(server.server_address[1])
+
+    yield serve
+    done.set()
+    server.shutdown()
+    server.server_close()
+
+
+def read_parts(url, count, timeout=5.0):
+    reader = _Recorder(url, scale=1, timeout=2.0, backoff=0.05)
+    try:
+        deadline = time.monotonic() + timeout
+        while len(reader.parts) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        frame = reader.read(timeout=1.0)
+        return reader, list(reader.parts), frame
+    finally:
+        reader.release()
+
+
+def test_parts_with_content_length(stream_server):
+    frames = [jpeg(v) for v in (30, 120, 220)]
+    body = b"".join(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(f)
+                    + f + b"\r\n" for f in frames)
+    reader, parts, frame = read_parts(stream_server(body), 3)
+    assert parts == frames
+    # читается только самый свежий кадр, непрочитанные считаются выброшенными
+    assert frame is not None and abs(int(frame.mean()) - 220) < 5
+    assert reader.dropped == 2
+
+
+def test_content_length_allows_boundary_inside_body(stream_server):
+    parts = [b"abc--frame\r\n\r\ndef", b"xyz"]
+    body = b"".join(b"--frame\r\nContent-Length: %d\r\n\r\n" % len(p) + p + b"\r\n"
+                    for p in parts)
+    _, received, _ = read_parts(stream_server(body), 2)
+    assert received == parts
+
+
+def test_parts_without_content_length(stream_server):
+    frames = [jpeg(v) for v in (30, 120, 220)]
+    body = b"".join(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + f + b"\r\n"
+                    for f in frames) + b"--frame--\r\n"
+    _, parts, frame = read_parts(stream_server(body), 3)
+    assert parts == frames
+    assert frame is not None and abs(int(frame.mean()) - 220) < 5
+
+
+def test_quoted_boundary_and_preamble(stream_server):
+    frames = [jpeg(60), jpeg(160)]
+    body = b"preamble\r\n" + b"".join(b"--myb\nContent-Length: %d\n\n" % len(f) + f + b"\n"
+                                      for f in frames)
+    _, parts, _ = read_parts(
+        stream_server(body, 'multipart/x-mixed-replace; boundary="--myb"'), 2)
+    assert parts == frames
+
+
+def test_not_multipart_reports_error(stream_server):
+    reader = MJPEGReader(stream_server(b"", "image/jpeg"), scale=1, timeout=2.0, backoff=0.05)
+    try:
+        deadline = time.monotonic() + 5.0
+        while reader.error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "multipart" in reader.error
+        assert not reader.connected
+    finally:
+        reader.release()
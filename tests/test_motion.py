@@ -0,0 +1,43 @@
+import numpy as np
+
+from motion import FULL, REGIONS, SAME, ChangeGate
+
+
+def frame(*squares):
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    for x, y in squares:
+        image[y:y + 40, x:x + 40] = 200
+    return image
+
+
+def test_first_frame_is_full_then_same():
+    g = ChangeGate(width=160, threshold=25, still_fraction=0.002, full_fraction=0.5,
+                   padding=1, max_regions=4, cache_size=8, hash_distance=64)
+    assert g.check(frame((20, 20)))[0] == FULL
+    g.commit()
+    assert g.check(frame((20, 20)))[0] == SAME
+
+
+def test_small_change_gives_region_around_it():
+    g = ChangeGate(width=160, threshold=25, still_fraction=0.002, full_fraction=0.5,
+                   padding=1, max_regions=4, cache_size=8, hash_distance=64)
+    g.check(frame((20, 20)))
+    g.commit()
+    state, regions = g.check(frame((20, 20), (200, 150)))
+    assert state == REGIONS
+    assert len(regions) == 1
+    x1, y1, x2, y2 = regions[0]
+    assert x1 <= 200 and y1 <= 150 and x2 >= 240 and y2 >= 190
+
+
+def test_cache_hit_requires_matching_pixels():
+    # hash_distance 64 пропускает любой хэш: решает сверка миниатюр
+    g = ChangeGate(width=160, threshold=25, still_fraction=0.002, full_fraction=0.5,
+                   padding=1, max_regions=4, cache_size=8, hash_distance=64)
+    g.check(frame((20, 20)))
+    g.commit("A")
+    g.check(frame((200, 150)))
+    assert g.cached() is None
+    g.check(frame((20, 20)))
+    assert g.cached() == "A"
+    assert g.counts["cache_hits"] == 1
@@ -0,0 +1,67 @@
+import pytest
+
+from scheduler import AdaptiveScheduler
+
+
+def test_interval_fits_frame_budget():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480, adapt_size=False)
+    s.on_frame(0.01, detected=False)
+    s.on_frame(0.25, detected=True)
+    # (0.25 - 0.01) / (0.1 - 0.01) = 2.67 → детектор на каждом 3-м кадре
+    assert s.interval == 3
+
+
+def test_fast_detector_runs_every_frame():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480, adapt_size=False)
+    s.on_frame(0.05, detected=True)
+    assert s.interval == 1
+
+
+def test_interval_capped():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=4,
+                          initial_size=480, adapt_size=False)
+    s.on_frame(0.01, detected=False)
+    s.on_frame(5.0, detected=True)
+    assert s.interval == 4
+
+
+def test_budget_from_capture_rate_without_target_fps():
+    s = AdaptiveScheduler(target_fps=0, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480, adapt_size=False)
+    for i in range(5):
+        s.on_capture(i * 0.05)
+    s.on_frame(0.0, detected=False)
+    s.on_frame(0.12, detected=True)
+    assert s.capture_interval == pytest.approx(0.05)
+    assert s.interval == 3
+
+
+def test_size_steps_down_when_slow_and_up_when_fast():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480)
+    assert s.target_size == (480, 480)
+    s.on_frame(0.3, detected=True)
+    assert s.target_size == (320, 320)
+    # разрешение меняется не чаще раза в 2 секунды
+    s.on_frame(0.01, detected=True)
+    assert s.target_size == (320, 320)
+    s._last_size_change -= 2.0
+    s.on_frame(0.01, detected=True)
+    assert s.target_size == (480, 480)
+
+
+def test_size_hysteresis_band():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480)
+    # между половиной целевой задержки и ней – разрешение не меняется
+    s.on_frame(0.07, detected=True)
+    assert s.target_size == (480, 480)
+
+
+def test_size_fixed_without_adapt_size():
+    s = AdaptiveScheduler(target_fps=10, target_latency=0.1, sizes=[320, 480, 640], max_interval=8,
+                          initial_size=480, adapt_size=False)
+    s.on_frame(1.0, detected=True)
+    assert s.target_size == (480, 480)
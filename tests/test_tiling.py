@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from conftest import dets
+from detections import merge_overlapping
+from tiling import place_detections, tile_grid
+
+
+@pytest.mark.parametrize("width,height", [(1920, 1080), (640, 640), (1000, 300), (3000, 2000)])
+def test_tile_grid_covers_frame(width, height):
+    tile, origins = tile_grid(width, height, 640, 0.2)
+    covered = np.zeros((height, width), dtype=bool)
+    for x, y in origins:
+        assert 0 <= x <= width - min(tile, width)
+        assert 0 <= y <= height - min(tile, height)
+        covered[y:y + tile, x:x + tile] = True
+    assert covered.all()
+
+
+def test_tile_grid_overlap():
+    tile, origins = tile_grid(2000, 640, 640, 0.25)
+    xs = sorted({x for x, _ in origins})
+    assert tile == 640
+    assert all(b - a <= 640 * 0.75 for a, b in zip(xs, xs[1:]))
+
+
+def test_tile_grid_max_tiles_grows_tile():
+    tile, origins = tile_grid(4000, 4000, 512, 0.2, max_tiles=16)
+    assert len(origins) <= 16
+    assert tile > 512
+
+
+def test_tile_grid_small_frame():
+    # тайл не больше кадра: квадрат по короткой стороне
+    assert tile_grid(300, 300, 640, 0.2) == (300, [(0, 0)])
+    assert tile_grid(300, 200, 640, 0.2) == (200, [(0, 0), (100, 0)])
+
+
+def test_merge_keeps_highest_confidence():
+    merged = merge_overlapping(dets([[0, 0, 100, 100], [5, 5, 100, 100]], [0.6, 0.9]))
+    assert len(merged) == 1
+    assert merged.conf[0] == pytest.approx(0.9)
+    np.testing.assert_allclose(merged.xyxy[0], [5, 5, 100, 100])
+
+
+def test_merge_is_per_class():
+    merged = merge_overlapping(dets([[0, 0, 100, 100], [0, 0, 100, 100]], [0.6, 0.9], [0, 1]))
+    assert len(merged) == 2
+
+
+def test_merge_uses_smaller_box_overlap():
+    # обрезок целиком внутри полного бокса: IoU мал, но это один объект
+    merged = merge_overlapping(dets([[0, 0, 100, 100], [80, 0, 100, 100]], [0.9, 0.8]))
+    assert len(merged) == 1
+
+
+def test_merge_without_cut_keeps_winner_box():
+    merged = merge_overlapping(dets([[0, 0, 100, 100], [50, 0, 160, 100]], [0.9, 0.8]), 0.4)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.xyxy[0], [0, 0, 100, 100])
+
+
+def test_merge_unions_only_boxes_cut_by_tiles():
+    # объект 60..160 разрезан стыком тайлов [0, 100) и [90, 190)
+    parts = [dets([[60, 10, 100, 30]], [0.9]), dets([[0, 10, 70, 30]], [0.8])]
+    placed, cut = place_detections(parts, [(0, 0), (90, 0)], sizes=[(100, 100)] * 2,
+                                   frame_size=(300, 100))
+    assert cut.tolist() == [True, True]
+    merged = merge_overlapping(placed, 0.2, cut)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.xyxy[0], [60, 10, 160, 30])
+
+
+def test_merge_prefers_whole_box_over_cut_winner():
+    # левый тайл видит обрезок (выше confidence), правый – объект целиком
+    parts = [dets([[90, 10, 100, 30]], [0.9]), dets([[10, 10, 50, 30]], [0.8])]
+    placed, cut = place_detections(parts, [(0, 0), (80, 0)], sizes=[(100, 100)] * 2,
+                                   frame_size=(180, 100))
+    assert cut.tolist() == [True, False]
+    merged = merge_overlapping(placed, 0.5, cut)
+    assert len(merged) == 1
+    assert merged.conf[0] == pytest.approx(0.9)
+    np.testing.assert_allclose(merged.xyxy[0], [90, 10, 130, 30])
+
+
+def test_full_frame_pass_never_cut():
+    # уменьшенный целый кадр: окно совпадает с кадром, края кадра не режут
+    full = dets([[0, 0, 50, 50]], [0.7])
+    tile = dets([[20, 20, 70, 60]], [0.9])
+    placed, cut = place_detections([tile, full], [(0, 0), (0, 0)], [1.0, 2.0],
+                                   sizes=[(100, 100), (90, 50)], frame_size=(180, 100))
+    assert not cut[1]
+    merged = merge_overlapping(placed, 0.3, cut)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.xyxy[0], [20, 20, 70, 60])
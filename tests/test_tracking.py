@@ -0,0 +1,83 @@
+import numpy as np
+
+from conftest import dets
+from tracking import Tracker, iou_matrix, similarity_matrix
+
+
+def ids_by_x(result):
+    order = np.argsort(result.xyxy[:, 0])
+    return [int(result.ids[i]) for i in order]
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float64)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10]], dtype=np.float64)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 1 / 3], [0.0, 0.0]], atol=1e-6)
+
+
+def test_similarity_matches_small_fast_object_by_centre():
+    # мелкий объект сместился больше своего размера: IoU 0, но центры близки
+    a = np.array([[0, 0, 10, 10]], dtype=np.float64)
+    b = np.array([[15, 0, 25, 10]], dtype=np.float64)
+    far = np.array([[60, 0, 70, 10]], dtype=np.float64)
+    assert iou_matrix(a, b)[0, 0] == 0
+    assert similarity_matrix(a, b, gate=3.0)[0, 0] > 0.2
+    assert similarity_matrix(a, far, gate=3.0)[0, 0] == 0
+
+
+def test_ids_persist_across_updates():
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=1, stale_shift=0.5, gate=3.0)
+    first = t.update(dets([[0, 0, 20, 20], [100, 0, 120, 20]]), timestamp=0.0)
+    second = t.update(dets([[2, 0, 22, 20], [102, 0, 122, 20]]), timestamp=0.1)
+    assert ids_by_x(first) == ids_by_x(second) == [1, 2]
+
+
+def test_association_is_greedy_by_similarity():
+    # детекции приходят в обратном порядке – сопоставление не по индексу
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=1, stale_shift=0.5, gate=3.0)
+    t.update(dets([[0, 0, 20, 20], [40, 0, 60, 20]]), timestamp=0.0)
+    result = t.update(dets([[41, 0, 61, 20], [1, 0, 21, 20]]), timestamp=0.1)
+    assert ids_by_x(result) == [1, 2]
+
+
+def test_association_respects_class():
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=1, stale_shift=0.5, gate=3.0)
+    t.update(dets([[0, 0, 20, 20]], cls=[0]), timestamp=0.0)
+    result = t.update(dets([[0, 0, 20, 20]], cls=[1]), timestamp=0.1)
+    # тот же бокс другого класса – новый трек, старый пропущен
+    assert result.ids.tolist() == [2]
+    assert len(t.tracks) == 2
+
+
+def test_unmatched_track_expires_after_max_missed():
+    t = Tracker(iou_threshold=0.3, max_missed=1, min_hits=1, stale_shift=0.5, gate=3.0)
+    t.update(dets([[0, 0, 20, 20]]), timestamp=0.0)
+    t.update(dets([]), timestamp=0.1)
+    assert len(t.tracks) == 1
+    t.update(dets([]), timestamp=0.2)
+    assert not t.tracks
+
+
+def test_min_hits_hides_new_tracks():
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=2, stale_shift=0.5, gate=3.0)
+    assert len(t.update(dets([[0, 0, 20, 20]]), timestamp=0.0)) == 0
+    assert len(t.update(dets([[1, 0, 21, 20]]), timestamp=0.1)) == 1
+
+
+def test_predict_moves_box_with_estimated_velocity():
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=1, stale_shift=0.5, gate=3.0)
+    for i in range(5):
+        t.update(dets([[10 * i, 0, 10 * i + 20, 20]]), timestamp=0.1 * i)
+    before = t.predict(timestamp=0.4).xyxy[0, 0]
+    after = t.predict(timestamp=0.6).xyxy[0, 0]
+    # объект идёт вправо со скоростью ~100 пикселей в секунду
+    assert 10 < after - before < 30
+
+
+def test_stale_when_prediction_drifts():
+    t = Tracker(iou_threshold=0.3, max_missed=2, min_hits=1, stale_shift=0.5, gate=3.0)
+    for i in range(5):
+        t.update(dets([[10 * i, 0, 10 * i + 20, 20]]), timestamp=0.1 * i)
+    assert not t.is_stale()
+    t.predict(timestamp=0.6)
+    assert t.is_stale()
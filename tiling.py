@@ -0,0 +1,144 @@
+import math
+
+import cv2
+import numpy as np
+
+import config
+from detections import Detections, merge_overlapping
+
+
+def tile_grid(width, height, tile_size, overlap, max_tiles=0):
+    """
+    Разбить кадр width x height на перекрывающиеся квадратные тайлы.
+
+    overlap – доля перекрытия соседних тайлов (0..1). Если тайлов получается
+    больше max_tiles, размер тайла увеличивается (модель потом сожмёт его до
+    tile_size) – так ограничивается стоимость одного кадра.
+    Возвращает размер тайла и список (x, y) левых верхних углов.
+    """
+    tile = max(1, min(tile_size, width, height))
+    while True:
+        stride = max(1, int(tile * (1 - overlap)))
+        xs = _positions(width, tile, stride)
+        ys = _positions(height, tile, stride)
+        if not max_tiles or len(xs) * len(ys) <= max_tiles or tile >= max(width, height):
+            break
+        tile = min(max(width, height), int(math.ceil(tile * 1.25)))
+    return tile, [(x, y) for y in ys for x in xs]
+
+
+def _positions(length, tile, stride):
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile, stride))
+    positions.append(length - tile)
+    return positions
+
+
+def detect_tiled(frame, model, tile_size=None, overlap=None, max_tiles=None,
+                 full_frame=None, merge_threshold=None):
+    """
+    Тайловый инференс кадра в полном разрешении.
+
+    Все тайлы (и, при full_frame, уменьшенный целый кадр – для объектов
+    крупнее тайла) отправляются в модель одним батчем, боксы и OBB-полигоны
+    переводятся в координаты кадра, дубликаты на стыках тайлов сливаются.
+    """
+    tile_size = tile_size or config.get("tile_size")
+    overlap = config.get("tile_overlap") if overlap is None else overlap
+    max_tiles = config.get("max_tiles") if max_tiles is None else max_tiles
+    full_frame = config.get("tile_full_frame") if full_frame is None else full_frame
+    merge_threshold = merge_threshold or config.get("tile_merge_threshold")
+
+    height, width = frame.shape[:2]
+    tile, origins = tile_grid(width, height, tile_size, overlap, max_tiles)
+
+    crops = [frame[y:y + tile, x:x + tile] for x, y in origins]
+    offsets = list(origins)
+    scales = [1.0] * len(crops)
+    if full_frame and len(origins) > 1:
+        scale = tile_size / max(width, height)
+        crops.append(cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                interpolation=cv2.INTER_AREA))
+        offsets.append((0, 0))
+        scales.append(1.0 / scale)
+
+    return detect_crops(model, crops, offsets, scales, imgsz=tile_size,
+                        merge_threshold=merge_threshold, frame_size=(width, height))
+
+
+# бокс ближе этого (в пикселях кадра) к внутреннему краю тайла считается обрезанным
+_EDGE_MARGIN = 2.0
+
+
+def crop_detections(model, crops, imgsz=None):
+    """Прогнать вырезки одним батчем: Detections каждой в её собственных координатах."""
+    kwargs = {"verbose": False}
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    return [Detections.from_result(r) for r in model(crops, **kwargs)]
+
+
+def place_detections(parts, offsets, scales=None, sizes=None, frame_size=None, names=None):
+    """
+    Детекции вырезок → координаты кадра.
+
+    sizes – (ширина, высота) вырезок: по ним отмечаются боксы, упирающиеся во
+    внутренний край вырезки, т.е. разрезанные им (края кадра frame_size не в
+    счёт; по умолчанию кадр – общий охват вырезок). Уменьшенный целый кадр
+    поэтому никогда не даёт обрезанных боксов. Возвращает (Detections, cut);
+    без sizes cut – None.
+    """
+    scales = scales or [1.0] * len(parts)
+    windows = None
+    if sizes is not None:
+        windows = [(dx, dy, dx + w * scale, dy + h * scale)
+                   for (dx, dy), (w, h), scale in zip(offsets, sizes, scales)]
+        if frame_size is None:
+            frame_size = (max(w[2] for w in windows), max(w[3] for w in windows))
+    placed, cuts = [], []
+    for i, (dets, (dx, dy), scale) in enumerate(zip(parts, offsets, scales)):
+        if scale != 1.0:
+            dets = dets.scaled(scale, scale)
+        dets = dets.shifted(dx, dy)
+        placed.append(dets)
+        if windows is not None:
+            cuts.append(_cut_by_window(dets.xyxy, windows[i], frame_size))
+    if names is None and parts:
+        names = parts[0].names
+    dets = Detections.concat(placed, names)
+    if windows is None:
+        return dets, None
+    return dets, np.concatenate(cuts) if cuts else np.zeros(0, dtype=bool)
+
+
+def _cut_by_window(xyxy, window, frame_size):
+    x1, y1, x2, y2 = window
+    width, height = frame_size
+    m = _EDGE_MARGIN
+    cut = np.zeros(len(xyxy), dtype=bool)
+    # край окна внутри кадра и бокс к нему вплотную
+    if x1 > m:
+        cut |= xyxy[:, 0] <= x1 + m
+    if y1 > m:
+        cut |= xyxy[:, 1] <= y1 + m
+    if x2 < width - m:
+        cut |= xyxy[:, 2] >= x2 - m
+    if y2 < height - m:
+        cut |= xyxy[:, 3] >= y2 - m
+    return cut
+
+
+def merge_crops(parts, offsets, scales=None, merge_threshold=0.5, names=None, sizes=None,
+                frame_size=None):
+    """Детекции вырезок (в их координатах) → детекции кадра без дубликатов на стыках."""
+    dets, cut = place_detections(parts, offsets, scales, sizes, frame_size, names)
+    return merge_overlapping(dets, merge_threshold, cut)
+
+
+def detect_crops(model, crops, offsets, scales=None, imgsz=None, merge_threshold=0.5,
+                 frame_size=None):
+    """Прогнать вырезки кадра одним батчем и собрать детекции в координатах кадра."""
+    parts = crop_detections(model, crops, imgsz)
+    return merge_crops(parts, offsets, scales, merge_threshold,
+                       sizes=[crop.shape[1::-1] for crop in crops], frame_size=frame_size)
@@ -0,0 +1,209 @@
+import time
+
+import numpy as np
+
+import config
+from detections import Detections
+
+# Модель движения с постоянной скоростью: состояние (cx, cy, w, h, vx, vy, vw, vh),
+# скорости в пикселях в секунду
+_H = np.eye(4, 8, dtype=np.float64)
+_Q = np.diag([4.0, 4.0, 4.0, 4.0, 400.0, 400.0, 50.0, 50.0])
+_R = np.diag([4.0, 4.0, 8.0, 8.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e3, 1e3])
+
+
+def _transition(dt):
+    F = np.eye(8, dtype=np.float64)
+    F[:4, 4:] = np.eye(4) * dt
+    return F
+
+
+def _xyxy_to_cxcywh(xyxy):
+    x1, y1, x2, y2 = xyxy
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def iou_matrix(a, b):
+    """Попарный IoU двух наборов боксов xyxy: (N, 4) x (M, 4) → (N, M)."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.maximum(ix2 - ix1, 0) * np.maximum(iy2 - iy1, 0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def similarity_matrix(a, b, gate):
+    """
+    Сходство треков и детекций: IoU, а для непересекающихся боксов – близость
+    центров. Мелкий объект между запусками детектора может сместиться больше
+    своего размера, и одного IoU для сопоставления не хватает.
+    """
+    ious = iou_matrix(a, b)
+    if not ious.size:
+        return ious
+    ca = (a[:, :2] + a[:, 2:]) / 2
+    cb = (b[:, :2] + b[:, 2:]) / 2
+    dist = np.hypot(*(ca[:, None, :] - cb[None, :, :]).transpose(2, 0, 1))
+    size = np.maximum(np.max(a[:, 2:] - a[:, :2], axis=1), 1.0)[:, None]
+    closeness = np.clip(1 - dist / (gate * size), 0, 1) * 0.5
+    return np.maximum(ious, closeness)
+
+
+class Track:
+    def __init__(self, track_id, xyxy, cls, conf, polygon=None):
+        self.id = track_id
+        self.cls = cls
+        self.conf = conf
+        self.x = np.zeros(8)
+        self.x[:4] = _xyxy_to_cxcywh(xyxy)
+        self.P = _P0.copy()
+        self.hits = 1
+        self.missed = 0
+        self._set_anchor(polygon)
+
+    def _set_anchor(self, polygon):
+        # бокс на момент детекции: от него оценивается смещение прогноза
+        self.anchor = self.x[:4].copy()
+        # форма OBB хранится относительно центра и размера бокса
+        if polygon is None:
+            self.shape = None
+        else:
+            cx, cy, w, h = self.anchor
+            self.shape = (polygon - (cx, cy)) / (max(w, 1.0), max(h, 1.0))
+
+    def predict(self, dt):
+        F = _transition(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + _Q * dt
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+
+    def update(self, xyxy, cls, conf, polygon=None):
+        z = _xyxy_to_cxcywh(xyxy)
+        S = _H @ self.P @ _H.T + _R
+        K = self.P @ _H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - _H @ self.x)
+        self.P = (np.eye(8) - K @ _H) @ self.P
+        self.cls = cls
+        self.conf = conf
+        self.hits += 1
+        self.missed = 0
+        self._set_anchor(polygon)
+
+    @property
+    def xyxy(self):
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    @property
+    def polygon(self):
+        if self.shape is None:
+            return None
+        cx, cy, w, h = self.x[:4]
+        return self.shape * (w, h) + (cx, cy)
+
+
+class Tracker:
+    """
+    Трекер детекций между запусками детектора.
+
+    update() вызывается с результатами детектора: треки сопоставляются с
+    детекциями жадно по IoU и близости центров (с учётом класса) и уточняются фильтром Калмана.
+    predict() вызывается на промежуточных кадрах и двигает боксы по
+    оценённой скорости, без обращения к модели.
+    """
+
+    def __init__(self, iou_threshold=None, max_missed=None, min_hits=None, stale_shift=None,
+                 gate=None):
+        self.iou_threshold = iou_threshold or config.get("track_iou_threshold")
+        self.gate = gate or config.get("track_gate")
+        self.max_missed = config.get("track_max_missed") if max_missed is None else max_missed
+        self.min_hits = min_hits or config.get("track_min_hits")
+        self.stale_shift = stale_shift or config.get("track_stale_shift")
+        self.tracks = []
+        self.names = {}
+        self.obb = False
+        self._next_id = 1
+        self._last_time = None
+
+    def _advance(self, timestamp):
+        # шаг фильтра – реальное время между кадрами: кадры, пропущенные,
+        # пока работал детектор, не сбивают оценку скорости
+        if timestamp is None:
+            timestamp = time.monotonic()
+        dt = 0.0 if self._last_time is None else max(timestamp - self._last_time, 0.0)
+        self._last_time = timestamp
+        for track in self.tracks:
+            track.predict(dt)
+
+    def update(self, dets: Detections, timestamp=None):
+        self.names = dets.names or self.names
+        self.obb = dets.is_obb
+        self._advance(timestamp)
+
+        boxes = np.array([t.xyxy for t in self.tracks]).reshape(-1, 4)
+        ious = similarity_matrix(boxes, dets.xyxy.astype(np.float64), self.gate)
+        if ious.size:
+            ious[np.array([t.cls for t in self.tracks])[:, None] != dets.cls[None, :]] = 0
+
+        matched_tracks, matched_dets = set(), set()
+        # жадное сопоставление: пары в порядке убывания IoU
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = np.unravel_index(flat, ious.shape)
+            if ious[ti, di] < self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+            self.tracks[ti].update(dets.xyxy[di], int(dets.cls[di]), float(dets.conf[di]),
+                                   None if dets.polygons is None else dets.polygons[di])
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        for di in range(len(dets)):
+            if di not in matched_dets:
+                self.tracks.append(Track(self._next_id, dets.xyxy[di], int(dets.cls[di]),
+                                         float(dets.conf[di]),
+                                         None if dets.polygons is None else dets.polygons[di]))
+                self._next_id += 1
+        return self.detections()
+
+    def predict(self, timestamp=None):
+        self._advance(timestamp)
+        return self.detections()
+
+    def is_stale(self):
+        """
+        Треки устарели, если какой-то объект по прогнозу сместился со времени
+        последней детекции больше чем на stale_shift своего размера – тогда
+        детектор стоит запустить раньше срока.
+        """
+        for track in self.tracks:
+            if track.missed:
+                continue
+            anchor = track.anchor
+            shift = np.hypot(*(track.x[:2] - anchor[:2]))
+            if shift > self.stale_shift * max(anchor[2], anchor[3], 1.0):
+                return True
+        return False
+
+    def detections(self):
+        tracks = [t for t in self.tracks if t.hits >= self.min_hits and not t.missed]
+        if not tracks:
+            return Detections.empty(self.names, self.obb)
+        polygons = None
+        if self.obb:
+            polygons = [t.polygon if t.shape is not None else
+                        np.array(t.xyxy)[[0, 1, 2, 1, 2, 3, 0, 3]].reshape(4, 2) for t in tracks]
+        return Detections([t.xyxy for t in tracks], [t.cls for t in tracks],
+                          [t.conf for t in tracks], self.names, polygons,
+                          [t.id for t in tracks])